@@ -0,0 +1,135 @@
+""" Times the main steps of htruc on synthetic catalogs of several sizes
+
+    python -m benchmarks.run --scale 100 --scale 1000 --output benchmarks/results/my-branch.json
+    python -m benchmarks.run --compare benchmarks/results/main.json
+
+Each benchmark is run `--repeat` times on every scale and the best time is kept. Results are saved as JSON, with the
+commit they were measured on, so that two runs can be compared with `--compare`.
+"""
+from typing import Callable, Dict, Any, List, Tuple, Optional
+import copy
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import click
+
+from htruc.utils import parse_yaml, dump_yaml, create_json_catalog
+from htruc import validator
+from htruc.schemas import recursive_update, upgrade_records
+from htruc.schemas.store import warm
+from htruc.catalog import get_statistics, group_per_year
+from benchmarks.synthetic import generate_catalog, Schemas
+
+
+# (Setup preparing the input of a benchmark out of the catalog, Function which is timed)
+Benchmark = Tuple[Callable[[Dict[str, Any]], Any], Callable[[Any], Any]]
+
+
+def _dumped_records(catalog):
+    out = []
+    for record in catalog.values():
+        dumped = io.StringIO()
+        dump_yaml(record, dumped)
+        out.append(dumped.getvalue())
+    return out
+
+
+def _local_schemas(catalog):
+    """ Records whose schema is available without network access, as validation downloads the other ones """
+    available = set(uri for uri, path in zip(Schemas.values(), warm(Schemas.values(), offline=True).values()) if path)
+    return [record for record in catalog.values() if record["schema"] in available]
+
+
+def _upgrade(records):
+    for record in records:
+        recursive_update(record)
+
+
+def _json_catalog(catalog):
+    with tempfile.TemporaryDirectory() as directory:
+        create_json_catalog(catalog, ids_files=os.path.join(directory, "ids.json"))
+
+
+Benchmarks: Dict[str, Benchmark] = {
+    "parse_yaml": (_dumped_records, lambda texts: [parse_yaml(text) for text in texts]),
+    "parse_yaml.round_trip": (_dumped_records, lambda texts: [parse_yaml(text, round_trip=True) for text in texts]),
+    "validator.run": (_local_schemas, lambda records: list(validator.run(records))),
+    "recursive_update": (lambda catalog: copy.deepcopy(list(catalog.values())), _upgrade),
+    "upgrade_records": (copy.deepcopy, upgrade_records),
+    "get_statistics": (lambda catalog: catalog, get_statistics),
+    "group_per_year": (get_statistics, group_per_year),
+    "dump_yaml": (lambda catalog: copy.deepcopy(list(catalog.values())),
+                  lambda records: dump_yaml(records, io.StringIO(), sort_keys=False)),
+    "create_json_catalog": (lambda catalog: catalog, _json_catalog),
+}
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scales: List[int], names: List[str], repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    """ Best time in seconds of each benchmark, per scale """
+    results: Dict[str, Dict[str, float]] = {name: {} for name in names}
+    for scale in scales:
+        catalog = generate_catalog(scale, invalid_ratio=0.1)
+        for name in names:
+            setup, function = Benchmarks[name]
+            timings = []
+            for _ in range(repeat):
+                data = setup(catalog)
+                start = time.perf_counter()
+                function(data)
+                timings.append(time.perf_counter() - start)
+            results[name][str(scale)] = min(timings)
+            click.echo(f"{name:>20} {scale:>8} records: {min(timings):.4f}s")
+    return results
+
+
+@click.command()
+@click.option("--scale", "scales", type=int, multiple=True, default=(100, 1000), show_default=True,
+              help="Number of synthetic records, repeat to run several scales")
+@click.option("--benchmark", "names", type=click.Choice(list(Benchmarks)), multiple=True,
+              help="Benchmark to run, all by default")
+@click.option("--repeat", type=click.IntRange(min=1), default=3, show_default=True,
+              help="Number of runs of each benchmark, the best one is kept")
+@click.option("--output", type=click.Path(dir_okay=False), default=None,
+              help="JSON file where results are saved, benchmarks/results/<commit>.json by default")
+@click.option("--compare", type=click.File(), default=None,
+              help="Results of a previous run to compare with")
+def main(scales, names, repeat, output, compare):
+    """ Run htruc benchmarks on synthetic catalogs """
+    commit = _commit()
+    # Records made invalid on purpose would log a warning on every run
+    logging.disable(logging.WARNING)
+    results = run_benchmarks(list(scales), list(names or Benchmarks), repeat=repeat)
+
+    output = output or os.path.join(os.path.dirname(__file__), "results", f"{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"commit": commit, "python": platform.python_version(), "results": results}, f, indent=2)
+    click.echo(f"Results saved to {output}")
+
+    if compare:
+        previous = json.load(compare)
+        click.echo(f"Compared with {previous.get('commit')}")
+        for name, timings in results.items():
+            for scale, timing in timings.items():
+                before = previous["results"].get(name, {}).get(scale)
+                if before:
+                    click.echo(f"{name:>20} {scale:>8} records: {before:.4f}s -> {timing:.4f}s "
+                               f"({(timing - before) / before * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+""" Synthetic catalog records, for benchmarks and tests
+
+>>> records = generate_records(3, schema="2023-06-27", seed=1)
+>>> [record["schema"] for record in records] == [Schemas["2023-06-27"]] * 3
+True
+>>> all(isinstance(script, dict) for record in records for script in record["script"])
+True
+"""
+from typing import List, Optional, Sequence
+import random
+
+from htruc.schemas.upgrade_path import upgrade_2021_10_15_to_2022_04_15, upgrade_2022_04_15_to_2023_06_27
+from htruc.types import CatalogRecord, Catalog
+
+
+Schemas = {
+    "2021-10-15": "https://htr-united.github.io/schema/2021-10-15/schema.json",
+    "2022-04-15": "https://htr-united.github.io/schema/2022-04-15/schema.json",
+    "2023-06-27": "https://htr-united.github.io/schema/2023-06-27/schema.json",
+}
+
+# (Languages, Script) combinations, weighted by how often they appear in the HTR-United catalog
+_Corpora = (
+    (("fro", ), "Latn", 6), (("lat", ), "Latn", 6), (("fra", ), "Latn", 8), (("lat", "fro"), "Latn", 3),
+    (("deu", ), "Latn", 3), (("eng", ), "Latn", 2), (("ita", ), "Latn", 2), (("spa", ), "Latn", 2),
+    (("grc", ), "Grek", 1), (("ara", ), "Arab", 1), (("heb", ), "Hebr", 1), (("rus", ), "Cyrl", 1),
+)
+_ScriptTypes = ("only-manuscript", "only-typed", "mainly-manuscript", "mainly-typed", "evenly-mixed")
+_HandCounts = ("1", "1-per-file", "1-per-folder", "less-than-11", "more-than-10", "unknown")
+_Roles = ("transcriber", "aligner", "project-manager", "support", "digitization", "quality-control")
+_Licenses = (
+    {"name": "CC-BY 4.0", "url": "https://creativecommons.org/licenses/by/4.0/"},
+    {"name": "CC-BY-SA 4.0", "url": "https://creativecommons.org/licenses/by-sa/4.0/"},
+    {"name": "CC0", "url": "https://creativecommons.org/publicdomain/zero/1.0/"},
+)
+
+
+def _volume(rng: random.Random) -> List[dict]:
+    """ Volumes with consistent orders of magnitude: about 30 lines a page and 40 characters a line """
+    pages = int(rng.lognormvariate(5, 1.2)) + 1
+    lines = pages * rng.randint(15, 45)
+    counts = {
+        "pages": pages,
+        "images": pages,
+        "files": pages,
+        "regions": pages * rng.randint(1, 6),
+        "lines": lines,
+        "characters": lines * rng.randint(25, 60),
+    }
+    metrics = ["lines"] + rng.sample(["pages", "images", "files", "regions", "characters"], rng.randint(1, 4))
+    return [{"count": counts[metric], "metric": metric} for metric in metrics]
+
+
+def _record(position: int, rng: random.Random) -> CatalogRecord:
+    languages, script, _ = rng.choices(_Corpora, weights=[weight for _, _, weight in _Corpora])[0]
+    not_before = rng.randint(800, 1950)
+    name = f"synthetic-{position:06}"
+    return {
+        "schema": Schemas["2021-10-15"],
+        "title": f"Synthetic dataset {position}",
+        "url": f"https://github.com/htr-united/{name}",
+        "description": f"Synthetic ground truth number {position}, generated for benchmarks.",
+        "authors": [
+            {"name": f"Name{rng.randint(0, 500)}", "surname": f"Surname{rng.randint(0, 500)}",
+             "roles": rng.sample(_Roles, rng.randint(1, 3))}
+            for _ in range(rng.randint(1, 3))
+        ],
+        "language": list(languages),
+        "script": [script],
+        "script-type": rng.choice(_ScriptTypes),
+        "time": {"notBefore": f"{not_before:04}", "notAfter": f"{min(not_before + rng.randint(0, 300), 2020):04}"},
+        "hands": {"count": rng.choice(_HandCounts), "precision": rng.choice(("exact", "estimated"))},
+        "license": [dict(rng.choice(_Licenses))],
+        "format": rng.choice(("Alto-XML", "Page-XML")),
+        "volume": _volume(rng),
+    }
+
+
+def _invalidate(record: CatalogRecord, rng: random.Random) -> CatalogRecord:
+    """ Breaks a record the way real records are usually broken """
+    mistake = rng.randrange(4)
+    if mistake == 0:
+        del record["format"]
+    elif mistake == 1:
+        record["format"] = "TEI"
+    elif mistake == 2:
+        record["time"]["notBefore"] = "12th century"
+    else:
+        record["volume"][0]["count"] = 0
+    return record
+
+
+def generate_records(
+        count: int,
+        schema: str = "2021-10-15",
+        invalid_ratio: float = 0.0,
+        seed: Optional[int] = 0
+) -> List[CatalogRecord]:
+    """ Generate count synthetic records following a schema
+
+    :param count: Number of records
+    :param schema: Schema version of the records, see `Schemas`
+    :param invalid_ratio: Share of records which are made invalid
+    :param seed: Seed of the random generator, None for a random one
+    """
+    rng = random.Random(seed)
+    records = []
+    for position in range(count):
+        record = _record(position, rng)
+        if schema != "2021-10-15":
+            record = upgrade_2021_10_15_to_2022_04_15(record, verbose=False)
+        if schema == "2023-06-27":
+            record = upgrade_2022_04_15_to_2023_06_27(record, verbose=False)
+        if rng.random() < invalid_ratio:
+            record = _invalidate(record, rng)
+        records.append(record)
+    return records
+
+
+def generate_catalog(
+        count: int,
+        schemas: Sequence[str] = tuple(Schemas),
+        invalid_ratio: float = 0.0,
+        seed: Optional[int] = 0
+) -> Catalog:
+    """ Generate a catalog of count records spread evenly over schemas, keyed by their URL """
+    catalog: Catalog = {}
+    for position, schema in enumerate(schemas):
+        share = count // len(schemas) + int(position < count % len(schemas))
+        for record in generate_records(share, schema=schema, invalid_ratio=invalid_ratio,
+                                       seed=None if seed is None else seed + position):
+            # Records of each schema are numbered from 0: the schema makes their URL unique
+            record["url"] = f"{record['url']}-{schema}"
+            catalog[record["url"]] = record
+    return catalog
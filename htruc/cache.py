@@ -0,0 +1,214 @@
+from typing import Optional, Dict, Callable, Tuple
+from contextlib import nullcontext
+from dataclasses import dataclass, asdict
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+from htruc.throttle import HostThrottle
+from htruc.metrics import BuildMetrics
+
+
+# A sender receives a URL and request headers and returns the status code, the response headers and the body
+Sender = Callable[[str, Dict[str, str]], Tuple[int, Dict[str, str], str]]
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    status_code: int
+    text: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    stored_at: float = 0.0
+    from_cache: bool = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+
+def _header(headers: Dict[str, str], name: str) -> Optional[str]:
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _requests_sender(session: requests.Session) -> Sender:
+    def send(url: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], str]:
+        req = session.get(url, headers=headers)
+        return req.status_code, dict(req.headers), req.text
+    return send
+
+
+class HTTPCache:
+    """ On-disk cache of HTTP responses revalidated with ETag and Last-Modified
+
+    Entries younger than `ttl` seconds are served without any request, older ones are revalidated with
+    If-None-Match / If-Modified-Since: a 304 answer (free on Github's rate limit) refreshes the entry. The cache
+    removes the least recently used entries once its size goes over `max_size` bytes.
+
+    :param directory: Directory where responses are stored
+    :param ttl: Number of seconds during which an entry is trusted without revalidation
+    :param max_size: Maximum size in bytes of the cache directory
+    :param session: Requests session used for plain HTTP fetches
+    """
+    def __init__(
+            self,
+            directory: str,
+            ttl: float = 0,
+            max_size: int = 256 * 1024 * 1024,
+            session: Optional[requests.Session] = None
+    ):
+        self.directory: str = directory
+        self.ttl: float = ttl
+        self.max_size: int = max_size
+        self.session: requests.Session = session or requests.Session()
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(url: str, headers: Optional[Dict[str, str]] = None) -> str:
+        """ Entries are keyed by URL and requested content type, as Zenodo and DOI answer per Accept header """
+        accept = _header(headers, "accept") or ""
+        return hashlib.sha256(f"{accept} {url}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key: str) -> Optional[CachedResponse]:
+        try:
+            with open(self._path(key)) as f:
+                return CachedResponse(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def save(self, key: str, response: CachedResponse):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({**asdict(response), "from_cache": False}, f)
+        with self._lock:
+            self._ensure_size()
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self._size += os.path.getsize(path)
+            if self._size > self.max_size:
+                self._evict()
+
+    def _ensure_size(self):
+        if self._size is None:
+            self._size = sum(entry.stat().st_size for entry in os.scandir(self.directory)
+                             if entry.name.endswith(".json"))
+
+    def _evict(self):
+        """ Remove the least recently used entries until the cache fits in half its maximum size """
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in entries:
+            if self._size <= self.max_size // 2:
+                break
+            size = entry.stat().st_size
+            os.remove(entry.path)
+            self._size -= size
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return time.time() - entry.stored_at < self.ttl
+
+    def fetch(
+            self,
+            url: str,
+            headers: Optional[Dict[str, str]] = None,
+            send: Optional[Sender] = None,
+            throttle: Optional[HostThrottle] = None,
+            metrics: Optional[BuildMetrics] = None
+    ) -> CachedResponse:
+        """ Get a URL through the cache
+
+        :param url: URL to retrieve
+        :param headers: Request headers
+        :param send: Function doing the actual request (Defaults to the requests session of the cache)
+        :param throttle: Per host limits applied to the request, if it is not served from the cache
+        :param metrics: Metrics recording the requests and the cache hits
+        """
+        send = send or _requests_sender(self.session)
+        headers = dict(headers or {})
+        key = self.key(url, headers)
+        entry = self.load(key)
+
+        if entry:
+            if self.is_fresh(entry):
+                try:
+                    os.utime(self._path(key))
+                except OSError:  # Evicted in the meantime
+                    pass
+                entry.from_cache = True
+                if metrics:
+                    metrics.cache_hit(url)
+                return entry
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        status, response_headers, text = _send(url, headers, send, throttle, metrics)
+        if status == 304 and entry:
+            entry.stored_at = time.time()
+            self.save(key, entry)
+            entry.from_cache = True
+            if metrics:
+                metrics.cache_hit(url)
+            return entry
+
+        response = CachedResponse(
+            url=url,
+            status_code=status,
+            text=text,
+            etag=_header(response_headers, "etag"),
+            last_modified=_header(response_headers, "last-modified"),
+            stored_at=time.time()
+        )
+        if status < 400:
+            self.save(key, response)
+        return response
+
+
+def _send(
+        url: str,
+        headers: Dict[str, str],
+        send: Sender,
+        throttle: Optional[HostThrottle] = None,
+        metrics: Optional[BuildMetrics] = None
+) -> Tuple[int, Dict[str, str], str]:
+    """ Sends a request within the limits of its host and records it """
+    with throttle(url) if throttle else nullcontext():
+        status, response_headers, text = send(url, headers)
+    if metrics:
+        metrics.request(url, status=status, size=len(text.encode()) if text else 0)
+    return status, response_headers, text
+
+
+def cached_get(
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        cache: Optional[HTTPCache] = None,
+        send: Optional[Sender] = None,
+        throttle: Optional[HostThrottle] = None,
+        metrics: Optional[BuildMetrics] = None
+) -> CachedResponse:
+    """ Get a URL through the cache if one is given, directly otherwise """
+    if cache is not None:
+        return cache.fetch(url, headers=headers, send=send, throttle=throttle, metrics=metrics)
+    if send is None:
+        send = _requests_sender(requests)
+    status, _, text = _send(url, dict(headers or {}), send, throttle, metrics)
+    return CachedResponse(url=url, status_code=status, text=text)
@@ -1,15 +1,26 @@
-from typing import Optional, Dict, Any, List, Tuple, Iterable, Union
+from typing import Optional, Dict, Any, List, Tuple, Iterable, Iterator, Set, Union
 import os
 import logging
+import numpy
 import pandas
 import cffconvert
-import requests
 import re
-
-from htruc.repos import get_github_repo_yaml, get_htr_united_repos, get_github_repo_cff
-from htruc.utils import parse_yaml
+import threading
+
+from htruc.repos import get_github_repo_yaml, iter_htr_united_repos, get_github_repo_cff, RateLimitScheduler, \
+    list_htr_united_repos
+from htruc.repos._scheduler import GithubClient
+from htruc.repos._graphql import GraphQLRepository
+from htruc.utils import parse_yaml, threaded_map, threaded_chain, process_map
+from htruc.cache import HTTPCache, cached_get
+from htruc.throttle import HostThrottle, get_host
 from htruc import validator
-from htruc.schemas import recursive_update
+from htruc.schemas import upgrade_records, format_upgrade_summary, UpgradeOrder
+from htruc.manifest import BuildManifest, file_fingerprint, record_fingerprint
+from htruc.metrics import BuildMetrics
+from htruc.pipeline import Pipeline, Stage
+from htruc.volumes import update_volume, MetricLists
+from htruc.identity import RepositoryIndex, merge_record, repository_owner
 from htruc.types import CatalogRecord, Catalog
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -17,14 +28,15 @@ logger.setLevel(logging.INFO)
 _ZenodoRecord: re.Pattern = re.compile(r"zenodo\.org/record/([0-9]+)")
 
 
-def _clean_a_dict(catalog: Catalog) -> Catalog:
+def _clean_a_dict(catalog: Catalog, offline: Optional[bool] = None) -> Catalog:
     invalid: List[str] = []
 
-    for schema in catalog:
-        for status in validator.run([catalog[schema]], schema_path="auto"):
-            if not status.status:  # If the schema is invalid
-                invalid.append(schema)
-                logging.warning(f"Invalid schema file for {schema}")
+    keys = list(catalog)
+    records = [catalog[key] for key in keys]
+    for schema, status in zip(keys, validator.run(records, schema_path="auto", offline=offline)):
+        if not status.status:  # If the schema is invalid
+            invalid.append(schema)
+            logging.warning(f"Invalid schema file for {schema}")
 
     for key in invalid:
         del catalog[key]
@@ -32,50 +44,148 @@ def _clean_a_dict(catalog: Catalog) -> Catalog:
     return catalog
 
 
-def _upgrade_a_dict(catalog: Catalog) -> Catalog:
-    for schema in catalog:
-        new_version, nb_upgrade = recursive_update(catalog[schema])
-        if nb_upgrade:
-            catalog[schema] = new_version
+def _parse_local_file(path: str) -> Tuple[Optional[CatalogRecord], Optional[str]]:
+    """ Parse a local file, returns the record or the error message """
+    try:
+        return parse_yaml(path), None
+    except Exception as E:
+        return None, str(E)
 
-    return catalog
 
+def _find_local_files(directory: str) -> List[str]:
+    return sorted(
+        os.path.join(root, file)
+        for root, dirs, files in os.walk(directory)
+        for file in files
+        if file.endswith(".yml") or file.endswith(".yaml")
+    )
+
+
+def _load_local_sources(
+        directory: str,
+        manifest: BuildManifest,
+        jobs: int = 1
+) -> List[Tuple[str, CatalogRecord]]:
+    """ Reads the local files which changed since the manifest was written, reuses the others.
+
+    :returns: List of (source token, record) in path order
+    """
+    paths = _find_local_files(directory)
+    fingerprints = {path: file_fingerprint(path) for path in paths}
+    records: Dict[str, CatalogRecord] = {}
+    changed: List[str] = []
+    for path in paths:
+        if manifest.is_unchanged(f"local:{path}", fingerprints[path]):
+            records[path] = manifest.get_source(f"local:{path}")
+        else:
+            changed.append(path)
+
+    for path, (data, error) in zip(changed, process_map(_parse_local_file, changed, jobs=jobs)):
+        if error is not None:
+            logging.warning(f"Impossible to parse and understand {os.path.basename(path)}")
+            logger.info(error)
+            continue
+        manifest.set_source(f"local:{path}", fingerprints[path], data)
+        records[path] = data
+
+    return [(f"local:{path}@{fingerprints[path]}", records[path]) for path in paths if path in records]
 
-def get_local_yaml(directory: str, keep_valid_only: bool = True) -> Catalog:
+
+def get_local_yaml(directory: str, keep_valid_only: bool = True, jobs: int = 1) -> Catalog:
     """ Reads all local YAML file in a given directory and parses them as Catalog Record.
 
     :param directory: Directory to scan
     :param keep_valid_only: Only keeps passing HTR-United files
-
+    :param jobs: Number of processes parsing the files. Files are read in path order whatever the number of jobs.
+    :returns: Records keyed by URL. When several files describe the same repository (See
+        `htruc.identity.repository_identity`), the last one is kept, under the URL of the first one.
     """
     out = {}
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith(".yml") or file.endswith(".yaml"):
-                try:
-                    data = parse_yaml(os.path.join(root, file))
-                    out[data.get("url")] = data
-                except Exception as E:
-                    logging.warning(f"Impossible to parse and understand {file}")
-                    logger.info(str(E))
+    index = RepositoryIndex()
+    for _, data in _load_local_sources(directory, BuildManifest(), jobs=jobs):
+        merge_record(out, index, data.get("url"), data, fields=None)
     if keep_valid_only:
         _clean_a_dict(out)
     return out
 
 
 def clever_catalog_update(catalog1: Dict, catalog2: Dict) -> Dict:
-    for repository in catalog2:
-        if repository in catalog1:
-            for key in ["characters", "volume"]:
-                if key in catalog2[repository]:
-                    catalog1[repository][key] = catalog2[repository][key]
-        else:
-            catalog1[repository] = catalog2[repository]
+    """ Adds the records of catalog2 to catalog1, only updating the characters and volume of the repositories
+    catalog1 already has. Repositories are matched by identity, whether they are keyed by URL or `owner/name` (See
+    `htruc.identity.repository_identity`).
+
+    >>> clever_catalog_update(
+    ...     {"https://github.com/htr-united/a": {"title": "A", "volume": [1]}},
+    ...     {"htr-united/a": {"title": "A", "volume": [2]}, "htr-united/b": {"title": "B"}})
+    {'https://github.com/htr-united/a': {'title': 'A', 'volume': [2]}, 'htr-united/b': {'title': 'B'}}
+    """
+    index = RepositoryIndex()
+    for key in catalog1:
+        index.add(key)
+    for key, record in catalog2.items():
+        merge_record(catalog1, index, key, record)
     return catalog1
 
 
+def _iter_remote_sources(
+        organization: str,
+        manifest: BuildManifest,
+        exclude: Optional[Iterable[str]] = None,
+        jobs: int = 1,
+        client: Optional[GithubClient] = None,
+        cache: Optional[HTTPCache] = None,
+        backend: str = "rest",
+        citations: Optional[Dict[str, Optional[str]]] = None,
+        metrics: Optional[BuildMetrics] = None,
+        mirror_directory: Optional[str] = None,
+        index: Optional[RepositoryIndex] = None
+) -> Iterator[Tuple[str, str, CatalogRecord]]:
+    """ Fetches the repositories of an organization which were pushed since the manifest was written, reuses the
+    others.
+
+    :param backend: `rest`, `graphql` or `git` (See `get_htr_united_repos`)
+    :param citations: Dictionary filled with the CITATION.cff files the `graphql` and `git` backends retrieved
+    :param index: Repositories already claimed in the index, by another organization or a link, are skipped
+    :returns: (source token, catalog key, record) of the reused repositories, then of the fetched ones as soon as each
+        of them is fetched, in listing order
+    """
+    repos = list_htr_united_repos(main_organization=organization, exclude=exclude, client=client, backend=backend)
+    if index is not None:
+        repos = [repo for repo in repos if index.claim(repo.full_name)]
+    if citations is not None:
+        citations.update({
+            repo.full_name.lower(): repo.cff_text
+            for repo in repos
+            if isinstance(repo, GraphQLRepository)
+        })
+    fingerprints = {repo.full_name: repo.pushed_at.isoformat() if repo.pushed_at else "" for repo in repos}
+    changed = [
+        repo
+        for repo in repos
+        if not manifest.is_unchanged(f"remote:{repo.full_name}", fingerprints[repo.full_name])
+    ]
+    unchanged = {repo.full_name for repo in repos} - {repo.full_name for repo in changed}
+    for repo in repos:
+        if repo.full_name in unchanged:
+            record = manifest.get_source(f"remote:{repo.full_name}")
+            # Repositories without htr-united.yml are kept with a None record, so that they are not fetched again
+            if record is not None:
+                yield f"remote:{repo.full_name}@{fingerprints[repo.full_name]}", repo.full_name, record
+
+    # Repositories without catalog record are not yielded
+    missing = set()
+    for full_name, record in iter_htr_united_repos(jobs=jobs, client=client, cache=cache, repos=changed,
+                                                   backend=backend, citations=citations, metrics=metrics,
+                                                   mirror_directory=mirror_directory, missing=missing):
+        manifest.set_source(f"remote:{full_name}", fingerprints[full_name], record)
+        yield f"remote:{full_name}@{fingerprints[full_name]}", full_name, record
+    # The ones which failed are fetched again by the next build
+    for full_name in missing:
+        manifest.set_source(f"remote:{full_name}", fingerprints[full_name], None)
+
+
 def get_all_catalogs(
-    access_token: Optional[str] = None,
+    access_token: Optional[Union[str, Iterable[str]]] = None,
     local_directory: Optional[str] = None,
     get_distant: bool = True,
     organizations: Optional[Union[str, Iterable[str]]] = "htr-united",
@@ -83,11 +193,25 @@ def get_all_catalogs(
     ignore_orgs_gits: List[str] = None,
     keep_valid_only: bool = True,
     auto_upgrade: bool = False,
-    citation_cff: bool = False
+    citation_cff: bool = False,
+    jobs: int = 1,
+    cache_directory: Optional[str] = None,
+    cache_ttl: float = 0,
+    cache_max_size: int = 256 * 1024 * 1024,
+    manifest: Optional[str] = None,
+    host_limits: Optional[Dict[str, Tuple[int, float]]] = None,
+    remote_backend: str = "rest",
+    metrics: Optional[BuildMetrics] = None,
+    mirror_directory: Optional[str] = None,
+    offline: Optional[bool] = None
 ) -> Catalog:
     """ Retrieve repositories from various location (online, locally) and create a catalog out of the records.
 
-    :param access_token: Github Access Token to retrieve information ~ without limit from Github.com
+    Records are validated, upgraded and enriched (See `catalog_stages`) while the other sources are still loaded: a
+    record goes through the stages as soon as no other source can update it anymore.
+
+    :param access_token: Github Access Token to retrieve information ~ without limit from Github.com. When several
+        tokens are given, requests rotate between them depending on their remaining rate limit
     :param local_directory: Local directory to scan for files
     :param get_distant: Retrieves data from organisations on Github (Scan all their repositories)
     :param organizations: Organizations to scan
@@ -97,78 +221,373 @@ def get_all_catalogs(
     :param keep_valid_only: Only Keeps valid catalog record
     :param auto_upgrade: Upgrade automatically all schemas to the latest version (Only applied if keep_valid_only is
         True)
+    :param citation_cff: Retrieve the citation of each record and store it as `_bibtex` and `_apa`
+    :param jobs: Number of remote repositories fetched at the same time. Organizations are scanned concurrently, each
+        with its own pool of `jobs` workers, and merged in the order they were given; an organization which cannot be
+        scanned is logged and skipped. It is also the number of processes parsing the local directory.
+    :param cache_directory: Directory of the HTTP cache. Responses from Github, Zenodo and DOI are kept there and
+        revalidated on the following runs instead of being downloaded again
+    :param cache_ttl: Number of seconds during which a cached response is used without revalidation
+    :param cache_max_size: Size in bytes above which the least recently used responses are evicted
+    :param manifest: Path to the build manifest. Local files whose modification time and size did not change, and
+        remote repositories which were not pushed to since the previous build, are not parsed or fetched again;
+        records built from unchanged sources are reused without validation, upgrade or citation lookup.
+    :param host_limits: Number of concurrent requests and delay in seconds between two requests per host during
+        citation retrieval (e.g. `{"doi.org": (2, 0.5)}`), completing `htruc.throttle.DefaultLimits`
+    :param remote_backend: `rest` fetches the files of each repository with its own requests, `graphql` retrieves the
+        htr-united.yml and CITATION.cff of a whole organization in a few batched queries (requires an access token),
+        `git` reads them from local mirrors of the repositories, updated with a single fetch each
+    :param metrics: Filled with the timings of each stage, the number of records processed and rejected, and the
+        requests sent to each host (See `htruc.metrics.BuildMetrics`)
+    :param mirror_directory: Directory of the mirrors of the `git` backend (See `htruc.repos.default_mirror_directory`)
+    :param offline: Fails instead of downloading the schemas the records refer to, defaults to `$HTRUC_OFFLINE` (See
+        `htruc.schemas.store`)
     """
+    metrics = metrics or BuildMetrics()
     data: Catalog = {}
-    if local_directory:
-        data.update(get_local_yaml(directory=local_directory, keep_valid_only=False))
-        if check_link:
-            for uri in data:
+    # Every source merges its records through the index: a repository is kept, fetched and enriched once
+    index = RepositoryIndex()
+    citations: Dict[str, Optional[str]] = {}
+    # For each catalog key, the sources it was built from, as `identifier@fingerprint`
+    origins: Dict[str, List[str]] = {}
+    throttle = HostThrottle(host_limits)
+    client = RateLimitScheduler(
+        (access_token, ) if isinstance(access_token, str) or access_token is None else tuple(access_token),
+        pool_size=max(jobs, throttle.limit("api.github.com")[0])
+    )
+    cache = HTTPCache(cache_directory, ttl=cache_ttl, max_size=cache_max_size) if cache_directory else None
+    build = BuildManifest(manifest, options={
+        "keep_valid_only": keep_valid_only,
+        "auto_upgrade": auto_upgrade,
+        "citation_cff": citation_cff,
+        "schema": UpgradeOrder[-1]
+    })
+    if isinstance(organizations, str):
+        organizations = (organizations, )
+    # Organization names are case-insensitive: each organization is scanned once
+    unique: Dict[str, str] = {}
+    for orga in (organizations or ()) if get_distant else ():
+        unique.setdefault(orga.lower(), orga)
+    organizations = tuple(unique.values())
+
+    # A record goes through the stages once every source which may update it is known: local records of a scanned
+    # organization wait for the end of its scan, the others are sent right away, and are no longer kept here.
+    pending: Dict[str, List[str]] = {orga: [] for orga in unique}
+    released: Set[str] = set()
+    built: List[str] = []
+    reused: Catalog = {}
+
+    def release(key: str) -> Iterator[Tuple[str, CatalogRecord]]:
+        released.add(key)
+        record = data.pop(key)
+        if build.is_built(key, origins[key]):
+            if build.get_record(key) is not None:
+                reused[key] = build.get_record(key)
+        else:
+            built.append(key)
+            yield key, record
+
+    def _fetch_link(uri: str) -> Optional[CatalogRecord]:
+        print(f"Fetching {uri} remotely to update metrics")
+        return get_github_repo_yaml(address=uri, client=client, cache=cache, metrics=metrics)
+
+    def _scan(orga: str) -> Iterator[Tuple[str, Optional[Tuple[str, str, CatalogRecord]]]]:
+        # An organization which cannot be scanned is reported, the others are still merged. None marks the end.
+        try:
+            for source in _iter_remote_sources(
+                    orga,
+                    build,
+                    exclude=ignore_orgs_gits,
+                    jobs=jobs,
+                    client=client,
+                    cache=cache,
+                    backend=remote_backend,
+                    citations=citations,
+                    metrics=metrics,
+                    mirror_directory=mirror_directory,
+                    index=index
+            ):
+                yield orga, source
+        except Exception as error:
+            logger.error(f"Unable to scan the organization {orga}: {error}")
+        yield orga, None
+
+    def sources() -> Iterator[Tuple[str, CatalogRecord]]:
+        linked = []
+        if local_directory:
+            with metrics.stage("local"):
+                for token, record in _load_local_sources(local_directory, build, jobs=jobs):
+                    key, _ = merge_record(data, index, record.get("url"), record, fields=None)
+                    origins.setdefault(key, []).append(token)
+            metrics.count("records.local", len(data))
+            if check_link:
                 # We update the catalog if needs be by checking each repo
-                if "github.com" in uri:
-                    print(f"Fetching {uri} remotely to update metrics")
-                    results = get_github_repo_yaml(address=uri, access_token=access_token)
-                    if results:
-                        data[uri] = results
-    if get_distant:
-        if isinstance(organizations, str):
-            organizations = (organizations, )
-        for orga in organizations:
-            data = clever_catalog_update(
-                data,
-                get_htr_united_repos(
-                    access_token=access_token,
-                    main_organization=orga,
-                    exclude=ignore_orgs_gits
-                )
-            )
-    if keep_valid_only:
-        _clean_a_dict(data)
+                linked = [uri for uri in data if uri and "github.com" in uri and index.claim(uri)]
+
+        # Organizations are scanned in the background from now on, and merged in the order they were given
+        remote = threaded_chain(_scan, organizations, jobs=len(organizations) if jobs > 1 else 1)
+        fetched = zip(linked, threaded_map(_fetch_link, linked, jobs=jobs))
+        for uri, results in metrics.timed("links", fetched) if linked else ():
+            if results:
+                data[uri] = results
+            origins[uri].append(f"link:{uri}@{record_fingerprint(results)}")
+            yield from release(uri)
+        for key in list(data):
+            if repository_owner(key or "") in pending:
+                pending[repository_owner(key)].append(key)
+            else:
+                yield from release(key)
+
+        for orga, source in metrics.timed("remote", remote) if organizations else ():
+            if source is None:
+                for key in pending.pop(orga.lower()):
+                    yield from release(key)
+                continue
+            token, key, record = source
+            metrics.count("records.remote")
+            if index.get(key) in released:
+                logger.warning(f"{key} was already built from another source, its record from {orga} is ignored")
+                continue
+            key, merged = merge_record(data, index, key, record)
+            origins.setdefault(key, []).append(token)
+            if not merged:
+                yield from release(key)
+
+    upgrades: Dict[Tuple[str, str], int] = {}
+    stages = catalog_stages(
+        keep_valid_only=keep_valid_only,
+        auto_upgrade=auto_upgrade and keep_valid_only,
+        citation_cff=citation_cff,
+        client=client,
+        cache=cache,
+        throttle=throttle,
+        prefetched=citations,
+        metrics=metrics,
+        upgrades=upgrades,
+        offline=offline
+    )
+    # Only the records whose sources changed go through validation, upgrade and citation
+    out: Catalog = {}
+    for key, record in Pipeline(*stages, metrics=metrics).run(sources()):
+        build.set_record(key, origins[key], record)
+        out[key] = record
+    for key in built:
+        if key not in out:  # Dropped by the stages
+            build.set_record(key, origins[key], None)
+    logger.info(f"{len(built)} records processed, {len(released) - len(built)} reused from the previous build")
+    metrics.count("records.processed", len(built))
+    metrics.count("records.reused", len(released) - len(built))
     if auto_upgrade and keep_valid_only:
-        _upgrade_a_dict(data)
+        logger.info(f"Schema upgrades: {format_upgrade_summary(upgrades)}")
+
+    out.update(reused)
+    build.prune(keys=list(origins))
+    build.save()
+    metrics.github.update(calls=client.calls, rate_limit_wait=client.waited)
+    return dict(sorted(out.items()))
+
+
+def _citation_host(catalog_record: CatalogRecord) -> Optional[str]:
+    """ Host the citation lookup of a record starts with, None if there is nothing to look up
+
+    >>> _citation_host({"url": "https://github.com/HTR-United/cremma-medieval"})
+    'api.github.com'
+    >>> _citation_host({"url": "https://doi.org/10.5281/zenodo.1234"})
+    'doi.org'
+    >>> _citation_host({"title": "No URL"}) is None
+    True
+    """
+    url = catalog_record.get("url") or ""
+    if "citation-file-link" in catalog_record:
+        return get_host(catalog_record["citation-file-link"])
+    elif "github.com" in url:
+        return "api.github.com"
+    elif _ZenodoRecord.search(url):
+        return "zenodo.org"
+    elif "doi.org" in url:
+        return "doi.org"
+    return None
+
+
+def _citation_stage(
+        client: Optional[GithubClient] = None,
+        cache: Optional[HTTPCache] = None,
+        throttle: Optional[HostThrottle] = None,
+        prefetched: Optional[Dict[str, Optional[str]]] = None,
+        metrics: Optional[BuildMetrics] = None
+) -> Stage:
+    """ Stage retrieving the Bibtex and APA citation of a record
+
+    Records are split per host their lookup starts with, and each host gets its own lane of workers sized after its
+    concurrency limit: a slow host does not hold up the lookups of the others. Every request also goes through the
+    throttle, which enforces per-host limits and politeness delays when a lookup falls back on another host.
+    """
+    throttle = throttle or HostThrottle()
+
+    def enrich(item: Tuple[str, CatalogRecord]) -> Tuple[str, CatalogRecord]:
+        key, record = item
+        try:
+            up = _get_bibtex_and_apa(record, client=client, cache=cache, throttle=throttle,
+                                     prefetched=prefetched, metrics=metrics)
+        except Exception as E:
+            logger.error(f"Unable to retrieve the citation of {key}: {E}")
+            up = None
+        if up:
+            logger.info(f"Successfully retrieved Bibtex or/and APA for {key}")
+            record.update(up)
+        if metrics:
+            metrics.count("citations.found" if up else "citations.missing")
+        return item
+
+    return Stage(
+        "citations",
+        enrich,
+        workers=lambda host: throttle.limit(host)[0],
+        lane=lambda item: _citation_host(item[1])
+    )
+
+
+def catalog_stages(
+        keep_valid_only: bool = True,
+        auto_upgrade: bool = False,
+        citation_cff: bool = False,
+        client: Optional[GithubClient] = None,
+        cache: Optional[HTTPCache] = None,
+        throttle: Optional[HostThrottle] = None,
+        prefetched: Optional[Dict[str, Optional[str]]] = None,
+        metrics: Optional[BuildMetrics] = None,
+        upgrades: Optional[Dict[Tuple[str, str], int]] = None,
+        offline: Optional[bool] = None
+) -> List[Stage]:
+    """ Stages `get_all_catalogs` moves the records through once they are loaded: validation, upgrade and citation
+    retrieval, to be run with `htruc.pipeline.Pipeline`
+
+    :param keep_valid_only: Drops the records which are not valid
+    :param auto_upgrade: Upgrades the records to the latest schema
+    :param citation_cff: Retrieves the citation of each record and store it as `_bibtex` and `_apa`
+    :param upgrades: Dictionary filled with the number of records upgraded per (original version, latest version),
+        see `htruc.schemas.upgrade_records`
+    :param offline: Fails instead of downloading the schemas the records refer to (See `htruc.schemas.store`)
+
+    >>> records = {"a": {"schema": UpgradeOrder[1]}, "b": {"schema": UpgradeOrder[0], "script": ["Latn"]}}
+    >>> upgrades = {}
+    >>> out = dict(Pipeline(*catalog_stages(keep_valid_only=False, auto_upgrade=True, upgrades=upgrades)).run(
+    ...     records.items()))
+    >>> out["a"]["schema"] == out["b"]["schema"] == UpgradeOrder[-1], out["b"]["script"]
+    (True, [{'iso': 'Latn'}])
+    >>> format_upgrade_summary(upgrades)
+    '1 records 2022-04-15→2023-06-27, 1 records 2021-10-15→2023-06-27'
+    """
+    lock = threading.Lock()
+    upgrades = upgrades if upgrades is not None else {}
+
+    def validate(item: Tuple[str, CatalogRecord]) -> Optional[Tuple[str, CatalogRecord]]:
+        if _clean_a_dict(dict([item]), offline=offline):
+            return item
+        if metrics:
+            metrics.count("records.rejected")
+        return None
+
+    def upgrade(items: List[Tuple[str, CatalogRecord]]) -> List[Tuple[str, CatalogRecord]]:
+        # The records waiting for the stage are upgraded together, grouped per schema version
+        catalog = dict(items)
+        summary = upgrade_records(catalog)
+        with lock:
+            for versions, count in summary.items():
+                upgrades[versions] = upgrades.get(versions, 0) + count
+        if metrics:
+            metrics.count("records.upgraded", sum(summary.values()))
+        return list(catalog.items())
+
+    stages = []
+    if keep_valid_only:
+        stages.append(Stage("validation", validate))
+    if auto_upgrade:
+        stages.append(Stage("upgrade", upgrade, batch=64))
     if citation_cff:
-        for key in data:
-            up = _get_bibtex_and_apa(data[key], access_token=access_token)
-            if up:
-                logger.info(f"Successfully retrieved Bibtex or/and APA for {key}")
-                data[key].update(up)
-    return dict(sorted(data.items()))
+        stages.append(_citation_stage(client=client, cache=cache, throttle=throttle, prefetched=prefetched,
+                                      metrics=metrics))
+    return stages
+
+
+def _broadcast(values: List[Any], rows: numpy.ndarray) -> numpy.ndarray:
+    """ Column of `values[row]` for each row, kept as Python objects """
+    return numpy.array(values, dtype=object)[rows]
 
 
 def get_statistics(repositories: Catalog) -> pandas.DataFrame:
     """ Retrieve statistics from a diction of repositories
 
+    The table has one row per volume entry. metric is categorical, start, end and count use the smallest integer type
+    which holds them, uri, title, format and script-type are kept as objects so that the table can be summed, e.g.
+    `get_statistics(catalog).groupby(by="metric").sum()`. Records which could not be parsed are skipped as a whole,
+    and listed as {"uri": ..., "error": ...} dictionaries in `df.attrs["skipped"]`.
+
     :param repositories: Dictionary of Repositories records
 
-    >>> #x = get_all_catalogs(local_directory="/home/thibault/dev/htr-united", check_link=False, get_distant=False)
-    >>> #get_statistics(x).groupby(by="metric").sum()
+    >>> df = get_statistics({
+    ...     "a": {"title": "A", "time": {"notBefore": 1300, "notAfter": 1399}, "format": "Alto-XML",
+    ...           "script-type": "only-manuscript", "volume": [{"metric": "Lines", "count": 120}]},
+    ...     "b": {"title": "B", "volume": [{"metric": "lines", "count": 20}]}})
+    >>> df[["uri", "start", "end", "metric", "count"]]
+      uri  start   end metric  count
+    0   a   1300  1399  lines    120
+    >>> df.attrs["skipped"]
+    [{'uri': 'b', 'error': "KeyError('time')"}]
     """
-    df = [
+    # Record level columns
+    uris, titles, formats, scripts, begins, ends = [], [], [], [], [], []
+    # Volume level columns, `rows` being the index of the record of each volume
+    rows, metrics, counts = [], [], []
+    skipped: List[Dict[str, str]] = []
 
-    ]
     for repository, entry in repositories.items():
         try:
-            begin, end = entry["time"]["notBefore"], entry["time"]["notAfter"]
-            for a_volume in entry.get("volume", []):
-                df.append({
-                    "uri": repository,
-                    "title": entry["title"],
-                    "start": int(begin),
-                    "end": int(end),
-                    "metric": a_volume["metric"].lower(),
-                    "count": int(a_volume["count"]),
-                    "format": entry["format"],
-                    "script-type": entry["script-type"]
-                })
-        except KeyError:
-            logger.warning(f"Unable to parse {repository} for statistics")
-        except TypeError:
-            logger.warning(f"Unable to parse {repository} for statistics")
-    return pandas.DataFrame(df)
+            begin, end = int(entry["time"]["notBefore"]), int(entry["time"]["notAfter"])
+            volumes = [
+                (a_volume["metric"].lower(), int(a_volume["count"]))
+                for a_volume in entry.get("volume", [])
+            ]
+            title, format_, script = entry["title"], entry["format"], entry["script-type"]
+        except (KeyError, TypeError) as error:
+            skipped.append({"uri": repository, "error": repr(error)})
+            continue
+        uris.append(repository)
+        titles.append(title)
+        formats.append(format_)
+        scripts.append(script)
+        begins.append(begin)
+        ends.append(end)
+        rows.extend([len(uris) - 1] * len(volumes))
+        metrics.extend(metric for metric, _ in volumes)
+        counts.extend(count for _, count in volumes)
+
+    if skipped:
+        logger.warning(
+            f"Unable to parse {len(skipped)} records for statistics: {', '.join(skip['uri'] for skip in skipped)}"
+        )
+
+    rows = numpy.array(rows, dtype=numpy.intp)
+    df = pandas.DataFrame({
+        "uri": _broadcast(uris, rows),
+        "title": _broadcast(titles, rows),
+        "start": pandas.to_numeric(numpy.array(begins, dtype=numpy.int64)[rows], downcast="integer"),
+        "end": pandas.to_numeric(numpy.array(ends, dtype=numpy.int64)[rows], downcast="integer"),
+        "metric": pandas.Categorical(metrics),
+        "count": pandas.to_numeric(numpy.array(counts, dtype=numpy.int64), downcast="integer"),
+        "format": _broadcast(formats, rows),
+        "script-type": _broadcast(scripts, rows)
+    })
+    df.attrs["skipped"] = skipped
+    return df
 
 
 def group_per_year(df: pandas.DataFrame, column: Optional[str] = "metric", period: int = 50):
     """ Group a column per year
 
+    Each record is counted in every period of `period` years its [start, end] interval overlaps. Records are binned in
+    a single pass, whatever the number of periods.
+
     >>> group_per_year(pandas.DataFrame([
     ... {"start": 1300, "end": 1399, "metric": "line", "count": 134},
     ... {"start": 1300, "end": 1399, "metric": "characters", "count": 234},
@@ -185,62 +604,63 @@ def group_per_year(df: pandas.DataFrame, column: Optional[str] = "metric", perio
     5  1550           0    37
 
     """
-    new_df = [
-        {
-            "year": range_start,
-            **df[
-                df.start.between(range_start, range_start+period-1) | \
-                df.end.between(range_start, range_start+period-1) | \
-                ((df.start < range_start) & (range_start+period-1 < df.end))
-            ].groupby(column)["count"].sum()
-        }
-        for range_start in range(
-            df.start.min() // period * period,
-            period * (df.end.max() // period) + int(bool(df.end.max() % period)),
-            period
-        )
-    ]
-    return pandas.DataFrame(new_df).fillna(0).astype(int)
-
-
-MetricLists = List[Dict[str, int]]
-
-
-def update_volume(original_volume: MetricLists, metrics: MetricLists) -> Tuple[MetricLists, MetricLists]:
-    """ Compute the new metrics for a catalog, returns a difference list as a second output
-
-    >>> old = [{"metric": "pages", "count": 5}, {"metric": "documents", "count": 5}]
-    >>> new = [{"metric": "pages", "count": 10}, {"metric": "line", "count": 105}]
-    >>> out = update_volume(old, new)
-    >>> out == (
-    ...    [{"metric": "documents", "count": 5}, {"metric": "line", "count": 105}, {"metric": "pages", "count": 10}],
-    ...    [{"metric": "pages", "count": 5}],
-    ... )
-    True
-
-    """
-    old = {vol["metric"]: vol["count"] for vol in original_volume}
-    new = {vol["metric"]: vol["count"] for vol in metrics}
-    all_keys = sorted(list(set(old.keys()).union(set(new.keys()))))
-    diff = {key: new.get(key) - old.get(key) for key in all_keys if key in old and key in new}
-    return (
-        [{"metric": key, "count": new.get(key, old.get(key))} for key in all_keys],
-        [{"metric": key, "count": diff.get(key)} for key in diff]
+    start = df["start"].to_numpy(dtype=numpy.int64)
+    end = df["end"].to_numpy(dtype=numpy.int64)
+    count = df["count"].to_numpy(dtype=numpy.int64)
+    codes, categories = pandas.factorize(df[column], sort=True)
+
+    first_year = start.min() // period * period
+    years = numpy.arange(
+        first_year,
+        period * (end.max() // period) + int(bool(end.max() % period)),
+        period
     )
-
-
-def _get_bibtex_and_apa(catalog_record: CatalogRecord, access_token: Optional[str]=None) -> Dict[str, str]:
+    # Each record covers the bins from the one of its start to the one of its end: counts are scattered at both
+    #   ends of this span, and a cumulative sum over the bins spreads them in between
+    first_bin = (start - first_year) // period
+    last_bin = numpy.minimum((end - first_year) // period, len(years) - 1)
+    kept = (first_bin <= last_bin) & (codes >= 0)
+    first_bin, last_bin, codes, count = first_bin[kept], last_bin[kept], codes[kept], count[kept]
+
+    shape = (len(years) + 1, len(categories))
+    totals, presence = numpy.zeros(shape, dtype=numpy.int64), numpy.zeros(shape, dtype=numpy.int64)
+    numpy.add.at(totals, (first_bin, codes), count)
+    numpy.add.at(totals, (last_bin + 1, codes), -count)
+    numpy.add.at(presence, (first_bin, codes), 1)
+    numpy.add.at(presence, (last_bin + 1, codes), -1)
+    totals, presence = totals.cumsum(axis=0)[:-1], presence.cumsum(axis=0)[:-1] > 0
+
+    # Columns are ordered by the first period they appear in, then alphabetically
+    present = numpy.flatnonzero(presence.any(axis=0))
+    present = sorted(present, key=lambda code: (presence[:, code].argmax(), code))
+    return pandas.DataFrame({
+        "year": years,
+        **{categories[code]: totals[:, code] for code in present}
+    }).astype(int)
+
+
+def _get_bibtex_and_apa(
+        catalog_record: CatalogRecord,
+        access_token: Optional[str] = None,
+        client: Optional[GithubClient] = None,
+        cache: Optional[HTTPCache] = None,
+        throttle: Optional[HostThrottle] = None,
+        prefetched: Optional[Dict[str, Optional[str]]] = None,
+        metrics: Optional[BuildMetrics] = None
+) -> Dict[str, str]:
     """
 
     """
-    through_github = _get_github_citation_file(catalog_record, access_token)
+    through_github = _get_github_citation_file(catalog_record, access_token, client=client, cache=cache,
+                                               throttle=throttle, prefetched=prefetched, metrics=metrics)
     if through_github:
         return through_github
 
     if _ZenodoRecord.search(catalog_record["url"]):
         record = _ZenodoRecord.findall(catalog_record["url"])[0]
         try:
-            req = requests.get(f"https://zenodo.org/api/records/{record}", headers={"Accept": "application/x-bibtex"})
+            req = cached_get(f"https://zenodo.org/api/records/{record}", headers={"Accept": "application/x-bibtex"},
+                             cache=cache, throttle=throttle, metrics=metrics)
             req.raise_for_status()
             return {"_bibtex": req.text}
         except Exception as E:
@@ -248,7 +668,8 @@ def _get_bibtex_and_apa(catalog_record: CatalogRecord, access_token: Optional[st
 
     if "doi.org" in catalog_record["url"]:
         try:
-            req = requests.get(catalog_record["url"], headers={"Accept": "application/x-bibtex"})
+            req = cached_get(catalog_record["url"], headers={"Accept": "application/x-bibtex"}, cache=cache,
+                             throttle=throttle, metrics=metrics)
             req.raise_for_status()
             return {"_bibtex": req.text}
         except Exception as E:
@@ -257,16 +678,26 @@ def _get_bibtex_and_apa(catalog_record: CatalogRecord, access_token: Optional[st
     return {}
 
 
-def _get_github_citation_file(catalog_record: CatalogRecord, access_token: Optional[str] = None) -> Dict[str, str]:
+def _get_github_citation_file(
+        catalog_record: CatalogRecord,
+        access_token: Optional[str] = None,
+        client: Optional[GithubClient] = None,
+        cache: Optional[HTTPCache] = None,
+        throttle: Optional[HostThrottle] = None,
+        prefetched: Optional[Dict[str, Optional[str]]] = None,
+        metrics: Optional[BuildMetrics] = None
+) -> Dict[str, str]:
     if "citation-file-link" not in catalog_record and "github.com" not in catalog_record["url"]:
         return {}
     elif "citation-file-link" not in catalog_record:
-        citation_file_content = get_github_repo_cff(catalog_record["url"], access_token=access_token)
+        citation_file_content = get_github_repo_cff(catalog_record["url"], access_token=access_token, client=client,
+                                                    cache=cache, throttle=throttle, prefetched=prefetched,
+                                                    metrics=metrics)
         if not citation_file_content:
             return {}
     else:  # We got a URI
         try:
-            req = requests.get(catalog_record["citation-file-link"])
+            req = cached_get(catalog_record["citation-file-link"], cache=cache, throttle=throttle, metrics=metrics)
             req.raise_for_status()
             citation_file_content = req.text
             if "</html>" in citation_file_content.lower():
@@ -277,7 +708,9 @@ def _get_github_citation_file(catalog_record: CatalogRecord, access_token: Optio
             logger.error(f"Error retrieving CITATION File for {catalog_record['citation-file-link']}: {str(E)}")
             if "github.com" in catalog_record["url"]:
                 logger.error(f"Trying to reach github directly")
-                return _get_github_citation_file({"url": catalog_record["url"]}, access_token=access_token)
+                return _get_github_citation_file({"url": catalog_record["url"]}, access_token=access_token,
+                                                 client=client, cache=cache, throttle=throttle,
+                                                 prefetched=prefetched, metrics=metrics)
             return {}
 
     try:
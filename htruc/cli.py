@@ -1,13 +1,26 @@
 import sys
 import click
 import os.path
-from ruamel.yaml import YAML
 import json
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple, Any
 
-from htruc.validator import run
-from htruc.catalog import get_all_catalogs, get_statistics, group_per_year, update_volume, _get_bibtex_and_apa
-from htruc.utils import parse_yaml, create_json_catalog, get_local_or_download, dump_yaml
+from htruc.utils import parse_yaml, dump_yaml
+
+# Subcommands import what they use when they run: the validation and upgrade commands should not pay for pandas,
+#   PyGithub or cffconvert, which `make` needs (See tests/test_startup.py)
+
+
+def _parse_host_limits(ctx, param, values) -> Dict[str, Tuple[int, float]]:
+    """ Parses HOST=N[:DELAY] values """
+    limits = {}
+    for value in values:
+        try:
+            host, limit = value.split("=")
+            concurrency, _, delay = limit.partition(":")
+            limits[host] = (int(concurrency), float(delay or 0))
+        except ValueError:
+            raise click.BadParameter(f"`{value}` is not formatted as HOST=N[:DELAY]")
+    return limits
 
 
 def _error(message):
@@ -18,37 +31,77 @@ def _error(message):
 
 
 @click.group()
-def cli():
+@click.option("--offline", is_flag=True, default=False,
+              help="Fail instead of downloading schemas which are not stored yet, see `htruc schemas warm`")
+@click.pass_context
+def cli(ctx: click.Context, offline: bool):
     """ Interface for HTRUC """
+    # Given to the schema store by the subcommands, None falls back on $HTRUC_OFFLINE
+    ctx.ensure_object(dict)["offline"] = True if offline else None
 
 
 @cli.command("test")
-@click.argument("files", type=click.File(), nargs=-1)
+@click.argument("files", type=click.Path(exists=True, dir_okay=False, allow_dash=True), nargs=-1)
 @click.option(
     "--version", type=str, default="auto", show_default=True,
     help="Date of the schema version"
 )
 @click.option("--force-download", is_flag=True, help="Download the schema using the version provided")
-def test(files, version: str, force_download: bool):
-    """ Test catalog files """
+@click.option("-j", "--jobs", default=1, type=click.IntRange(min=1), show_default=True,
+              help="Number of processes parsing and validating files")
+@click.pass_obj
+def test(options: Dict[str, Any], files, version: str, force_download: bool, jobs: int):
+    """ Test catalog files, `-` reading a file from the standard input """
+    from htruc.validator import run
+    from htruc.utils import get_local_or_download
+    from htruc.schemas.store import SchemaUnavailable
     click.echo(f"{len(files)} to be tested")
-    statuses = []
-    if version != "auto":
-        version = get_local_or_download(version, force_download=force_download)
-    for status in run(files, schema_path=version):
-        statuses.append(status.status)
-        if status.status is False:
-            _error(f"☒ File `{status.filename}` testing failed")
-            for message in status.messages:
-                _error(f"  {message}")
+    files = [click.open_file(file) if file == "-" else file for file in files]
+    passed, total = 0, 0
+    try:
+        if version != "auto":
+            version = get_local_or_download(version, force_download=force_download, offline=options["offline"])
+        for status in run(files, schema_path=version, jobs=jobs, offline=options["offline"]):
+            total += 1
+            if status.status:
+                passed += 1
+            else:
+                _error(f"☒ File `{status.filename}` testing failed")
+                for message in status.messages:
+                    _error(f"  {message}")
+    except SchemaUnavailable as error:
+        _error(str(error))
+        sys.exit(-1)
     click.echo()
     click.echo(
         click.style(
-            f"{statuses.count(True)/len(statuses)*100:.2f}% of schema passed ({statuses.count(True)}/{len(statuses)})",
-            fg="red" if False in statuses else "green"
+            f"{passed/total*100:.2f}% of schema passed ({passed}/{total})",
+            fg="red" if passed != total else "green"
         )
     )
-    sys.exit(-1 if False in statuses else 0)
+    sys.exit(-1 if passed != total else 0)
+
+
+@cli.group("schemas")
+def schemas():
+    """ Manage the local store of schemas """
+
+
+@schemas.command("warm")
+@click.option("--force-download", is_flag=True, help="Download again the schemas already stored")
+@click.pass_obj
+def schemas_warm(options: Dict[str, Any], force_download: bool):
+    """ Store every supported schema version, so that later runs can be offline """
+    from htruc.schemas.store import warm, store_directory
+    missing = 0
+    for version, path in warm(force_download=force_download, offline=options["offline"]).items():
+        if path:
+            click.echo(f"{version}: {path}")
+        else:
+            missing += 1
+            _error(f"{version}: not available offline")
+    click.echo(f"Schema store: {store_directory()}")
+    sys.exit(-1 if missing else 0)
 
 
 @cli.command("make")
@@ -68,25 +121,51 @@ def test(files, version: str, force_download: bool):
               help="For each github repository documented in the local files, tries to download a `htr-united.yaml`"
                    " file from it.")
 @click.option("--output", default="catalog.yaml", show_default=True,
-              help="Dumps the agglutinated catalog as YAML")
+              help="Dumps the agglutinated catalog as YAML, gzip compressed if the path ends with .gz")
 @click.option("--json", default=None, show_default=True,
-              help="Dumps the whole catalog as JSON too")
+              help="Dumps the whole catalog as JSON too, gzip compressed if the path ends with .gz")
+@click.option("--sqlite", default=None, type=click.Path(dir_okay=False), show_default=True,
+              help="Dumps the catalog into an indexed SQLite database too, see `htruc query`")
 @click.option("--graph", default=None, show_default=True,
               help="Produce a graph at the path given (PNG Files please) with the amount of metrics"
                    "at different times")
 @click.option("--graph-csv", default=None, show_default=True,
               help="Outputs the data behind the graph into a CSV file")
-@click.option("--access_token", default=None, show_default=True,
-              help="Github Access token")
+@click.option("--access_token", default=None, multiple=True, show_default=True,
+              help="Github Access token, repeat the option to rotate between several tokens")
 @click.option("--statistics", default=None, show_default=True,
               help="Produce a recap CSV file with different statistics about the period covered by the dataset")
 @click.option("--ignore-repo", default=["htr-united", "template-htr-united-datarepo", "template-depot"], multiple=True, show_default=True,
               help="Repos of the main organization that can be ignored")
 @click.option("--ids", default="ids.json", type=click.Path(dir_okay=False), show_default=True,
               help="JSON file with IDs that maps each repository URLs")
-def make(directory, organization: str, access_token: Optional[str] = None, remote: bool = True,
+@click.option("-j", "--jobs", default=1, type=click.IntRange(min=1), show_default=True,
+              help="Number of remote repositories fetched at the same time and of processes parsing local files")
+@click.option("--cache-dir", default=None, type=click.Path(file_okay=False), show_default=True,
+              help="Directory where HTTP responses are cached and revalidated between runs")
+@click.option("--cache-ttl", default=0, type=float, show_default=True,
+              help="Number of seconds during which a cached response is reused without revalidation")
+@click.option("--cache-max-size", default=256, type=int, show_default=True,
+              help="Maximum size of the HTTP cache in megabytes")
+@click.option("--manifest", default=None, type=click.Path(dir_okay=False), show_default=True,
+              help="Build manifest: only sources which changed since the build that wrote it are processed again")
+@click.option("--backend", type=click.Choice(["rest", "graphql", "git"]), default="rest", show_default=True,
+              help="How the organizations' files are retrieved: graphql retrieves them in batches but requires an "
+                   "access token, git reads them from local mirrors updated with one fetch per repository")
+@click.option("--mirror-dir", default=None, type=click.Path(file_okay=False), show_default=True,
+              help="Directory of the repository mirrors of the git backend, ~/.cache/htruc/mirrors by default")
+@click.option("--host-limit", multiple=True, callback=_parse_host_limits, metavar="HOST=N[:DELAY]",
+              help="Concurrent requests and delay in seconds between requests to a host during citation retrieval, "
+                   "e.g. doi.org=2:0.5")
+@click.option("--metrics-out", default=None, type=click.Path(dir_okay=False), show_default=True,
+              help="JSON report with the time spent in each stage, the requests sent to each host, the number of "
+                   "rejected records and the peak memory")
+@click.pass_obj
+def make(options: Dict[str, Any], directory, organization: str, access_token: Optional[Tuple[str, ...]] = None,
+         remote: bool = True,
          check_link: bool = False, output: str = "catalog.yaml",
          json: Optional[str] = None,
+         sqlite: Optional[str] = None,
          graph: Optional[str] = None,
          statistics: Optional[str] = None,
          graph_csv: Optional[str] = None,
@@ -94,12 +173,27 @@ def make(directory, organization: str, access_token: Optional[str] = None, remot
          ids: click.File = None,
          auto_upgrade: bool = True,
          clean: bool = True,
-         citation: bool = True):
+         citation: bool = True,
+         jobs: int = 1,
+         cache_dir: Optional[str] = None,
+         cache_ttl: float = 0,
+         cache_max_size: int = 256,
+         manifest: Optional[str] = None,
+         host_limit: Optional[Dict[str, Tuple[int, float]]] = None,
+         backend: str = "rest",
+         mirror_dir: Optional[str] = None,
+         metrics_out: Optional[str] = None):
     """ Generate a catalog from a main repository and an organization
 
     """
+    from htruc.catalog import get_all_catalogs, get_statistics, group_per_year
+    from htruc.utils import get_catalog_ids
+    from htruc.writers import open_output, write_yaml_catalog, write_json_catalog
+    from htruc.store import write_sqlite_catalog
+    from htruc.metrics import BuildMetrics
+    metrics = BuildMetrics()
     catalog = get_all_catalogs(
-        access_token=access_token,
+        access_token=access_token or None,
         organizations=organization,
         local_directory=directory,
         get_distant=remote,
@@ -107,48 +201,117 @@ def make(directory, organization: str, access_token: Optional[str] = None, remot
         ignore_orgs_gits=ignore_repo,
         keep_valid_only=clean,
         auto_upgrade=auto_upgrade,
-        citation_cff=citation
+        citation_cff=citation,
+        jobs=jobs,
+        cache_directory=cache_dir,
+        cache_ttl=cache_ttl,
+        cache_max_size=cache_max_size * 1024 * 1024,
+        manifest=manifest,
+        host_limits=host_limit,
+        remote_backend=backend,
+        metrics=metrics,
+        mirror_directory=mirror_dir,
+        offline=options["offline"]
     )
     click.echo(f"Dumping YAML output into {output}")
-    with open(output, "w") as f:
-        dump_yaml(list(catalog.values()), f, sort_keys=False)
+    with metrics.stage("yaml"), open_output(output) as f:
+        write_yaml_catalog(catalog.values(), f)
 
     if json:
         click.echo(f"Dumping JSON output into {json}")
-        from json import dump
-        with open(json, "w") as f:
-            dump(create_json_catalog(catalog, ids_files=ids), f)
+        with metrics.stage("json"):
+            catalog_ids = get_catalog_ids(catalog, ids_files=ids)
+            with open_output(json) as f:
+                write_json_catalog(((catalog_ids[key], record) for key, record in catalog.items()), f)
+    if sqlite:
+        click.echo(f"Dumping SQLite output into {sqlite}")
+        with metrics.stage("sqlite"):
+            write_sqlite_catalog(catalog.items(), sqlite)
     if graph or statistics or graph_csv:
-        stats = get_statistics(catalog)
-        if statistics:
-            click.echo(f"Writing stats to {statistics}")
-            stats.to_csv(statistics)
-        if graph or graph_csv:
-            data = group_per_year(stats)
-            if graph_csv:
-                click.echo(f"Plotting stats to {graph_csv}")
-                data.to_csv(graph_csv)
-            if graph:
-                click.echo(f"Plotting {len(data.columns)-1} files with {graph} basename")
-                basedir, basename = os.path.dirname(graph), os.path.basename(graph)
-                basename = ".".join(basename.split(".")[:-1])
-                import matplotlib.pyplot as plot
-
-                num_axes = len(data.columns) - 1
-                nrows = num_axes // 2 + int(bool(num_axes % 2))
-                fig, axes = plot.subplots(
-                    nrows=nrows,
-                    ncols=2,
-                    sharex=True,
-                    squeeze=True,
-                    figsize=(10, 5 * nrows),
-                    dpi=300
-                )
-                cols = [col for col in data.columns if col != "year"]
-                for metric, ax in zip(cols, [c for r in axes for c in r]):
-                    data.plot.line(x="year", y=metric, ax=ax)
-                fig.savefig(graph)
-                click.echo(f"Saved {graph}")
+        with metrics.stage("statistics"):
+            stats = get_statistics(catalog)
+            if statistics:
+                click.echo(f"Writing stats to {statistics}")
+                stats.to_csv(statistics)
+            if graph or graph_csv:
+                data = group_per_year(stats)
+                if graph_csv:
+                    click.echo(f"Plotting stats to {graph_csv}")
+                    data.to_csv(graph_csv)
+                if graph:
+                    click.echo(f"Plotting {len(data.columns)-1} files with {graph} basename")
+                    basedir, basename = os.path.dirname(graph), os.path.basename(graph)
+                    basename = ".".join(basename.split(".")[:-1])
+                    import matplotlib.pyplot as plot
+
+                    num_axes = len(data.columns) - 1
+                    nrows = num_axes // 2 + int(bool(num_axes % 2))
+                    fig, axes = plot.subplots(
+                        nrows=nrows,
+                        ncols=2,
+                        sharex=True,
+                        squeeze=True,
+                        figsize=(10, 5 * nrows),
+                        dpi=300
+                    )
+                    cols = [col for col in data.columns if col != "year"]
+                    for metric, ax in zip(cols, [c for r in axes for c in r]):
+                        data.plot.line(x="year", y=metric, ax=ax)
+                    fig.savefig(graph)
+                    click.echo(f"Saved {graph}")
+
+    if metrics_out:
+        click.echo(f"Writing metrics to {metrics_out}")
+        metrics.save(metrics_out)
+
+
+@cli.command("query")
+@click.argument("database", type=click.Path(exists=True, dir_okay=False))
+@click.option("--language", multiple=True, help="Language code (ISO-639), repeat to match any of several")
+@click.option("--script", multiple=True, help="Script code (ISO-15924), repeat to match any of several")
+@click.option("--format", "formats", multiple=True, help="Format, e.g. Alto-XML, repeat to match any of several")
+@click.option("--script-type", multiple=True, help="Script type, e.g. only-manuscript")
+@click.option("--url", multiple=True, help="URL of a repository")
+@click.option("--start", type=int, default=None, help="Keeps records whose period ends at or after this year")
+@click.option("--end", type=int, default=None, help="Keeps records whose period begins at or before this year")
+@click.option("--json", "as_json", is_flag=True, default=False,
+              help="Outputs the matching records as JSON lines instead of their URL and title")
+def query(database, language, script, formats, script_type, url, start, end, as_json):
+    """ Query the DATABASE produced by `htruc make --sqlite` """
+    from htruc.store import query_catalog
+    for key, record in query_catalog(database, languages=language, scripts=script, formats=formats,
+                                     script_types=script_type, urls=url, start=start, end=end):
+        if as_json:
+            click.echo(json.dumps(record))
+        else:
+            click.echo(f"{record.get('url', key)}\t{record.get('title', '')}")
+
+
+@cli.command("search")
+@click.argument("catalog-file", type=click.File())
+@click.option("--language", multiple=True, help="Language code (ISO-639), repeat to match any of several")
+@click.option("--script", multiple=True, help="Script code (ISO-15924), repeat to match any of several")
+@click.option("--format", "formats", multiple=True, help="Format, e.g. Alto-XML, repeat to match any of several")
+@click.option("--script-type", multiple=True, help="Script type, e.g. only-manuscript")
+@click.option("--license", multiple=True, help="License name, e.g. CC-BY 4.0")
+@click.option("--start", type=int, default=None, help="Keeps records whose period ends at or after this year")
+@click.option("--end", type=int, default=None, help="Keeps records whose period begins at or before this year")
+@click.option("--json", "as_json", is_flag=True, default=False,
+              help="Outputs the matching records as JSON lines instead of their URL and title")
+def search(catalog_file, language, script, formats, script_type, license, start, end, as_json):
+    """ Search the CATALOG-FILE produced by `htruc make`, as YAML or JSON """
+    from htruc.index import CatalogIndex
+    content = parse_yaml(catalog_file)
+    if isinstance(content, list):
+        content = {record.get("url", str(position)): record for position, record in enumerate(content)}
+    index = CatalogIndex(content)
+    for key in index.search(languages=language, scripts=script, formats=formats, script_types=script_type,
+                            licenses=license, start=start, end=end):
+        record = index.catalog[key]
+        if as_json:
+            click.echo(json.dumps(record))
+        else:
+            click.echo(f"{record.get('url', key)}\t{record.get('title', '')}")
 
 
 @cli.command("update-volumes")
@@ -160,11 +323,9 @@ def make(directory, organization: str, access_token: Optional[str] = None, remot
 )
 def catalog_volume_update(catalog_file, metrics_json, inplace):
     """ Update the metrics of a file """
-    record = parse_yaml(catalog_file)
-    parsed_metrics = json.load(metrics_json)
-    metrics_volume = parsed_metrics["volume"]
-    updated, difference = update_volume(record.get("volume", []), metrics_volume)
-    record["volume"] = updated
+    from htruc.volumes import update_record_volume, auto_update_path, write_record
+    record = parse_yaml(catalog_file, round_trip=True)
+    difference = update_record_volume(record, json.load(metrics_json))
     for metric in difference:
         if metric["count"] < 0:
             click.echo(click.style(f"> The category `{metric['metric']}` decreased by {abs(metric['count'])}",
@@ -175,18 +336,35 @@ def catalog_volume_update(catalog_file, metrics_json, inplace):
     # Close the original file
     catalog_file.close()
 
-    if record["schema"] != "2021-10-15" and "characters" in parsed_metrics:
-        if "characters" not in record:
-            record["characters"] = {}
-        record["characters"].update(parsed_metrics["characters"])
-
-    filename = f"{catalog_file.name}"
-    if not inplace:
-        filename = filename.split(".")
-        filename = ".".join([*filename[:-1], "auto-update", filename[-1]])
+    filename = catalog_file.name if inplace else auto_update_path(catalog_file.name)
     click.echo(f"Writing the update volumes in {filename}")
-    with open(filename, "w") as f:
-        dump_yaml(record, f, sort_keys=False)
+    write_record(record, filename)
+
+
+@cli.command("update-volumes-batch")
+@click.argument("source", type=click.Path(exists=True))
+@click.option(
+    "--inplace", type=bool, is_flag=True, default=False, show_default=True,
+    help="Saves the modified catalogs inside the original files"
+)
+@click.option("-j", "--jobs", default=1, type=click.IntRange(min=1), show_default=True,
+              help="Number of processes updating files")
+def catalog_volume_update_batch(source, inplace, jobs):
+    """ Update the metrics of many files at once. SOURCE is either a directory, where each NAME.yml is updated with
+    the NAME.json next to it, or a JSON manifest listing {"catalog": path, "metrics": path} objects """
+    from htruc.volumes import find_pairs, update_volumes, combine_differences
+    updates = list(update_volumes(find_pairs(source), inplace=inplace, jobs=jobs))
+    failed = [update for update in updates if update.error]
+    for update in failed:
+        _error(f"☒ File `{update.catalog}` could not be updated with `{update.metrics}`: {update.error}")
+    click.echo(f"{len(updates) - len(failed)} files updated, {len(failed)} failed")
+    for metric, total in sorted(combine_differences(updates).items()):
+        if total["increase"]:
+            click.echo(click.style(f"> The category `{metric}` increased by {total['increase']}", fg="green"))
+        if total["decrease"]:
+            click.echo(click.style(f"> The category `{metric}` decreased by {total['decrease']}", fg="yellow"))
+        click.echo(f"  (changed in {total['files']} files)")
+    sys.exit(-1 if failed else 0)
 
 
 @cli.command("upgrade")
@@ -195,9 +373,9 @@ def upgrade(files):
     """ Upgrade [FILES] to the latest supported schema """
     for file in files:
         click.echo(click.style(f"Upgrading {file.name}", fg="green"))
-        catalog = parse_yaml(file)
+        catalog = parse_yaml(file, round_trip=True)
         from htruc.schemas import recursive_update
-        catalog, upgrade_order = recursive_update(catalog)
+        catalog, upgrade_order = recursive_update(catalog, verbose=True)
         if not upgrade_order:
             click.echo(click.style(f"--> No upgrade required", fg="yellow"))
             continue
@@ -0,0 +1,135 @@
+from typing import Dict, Optional, Set, Iterable, Tuple
+import re
+import threading
+
+from htruc.types import Catalog, CatalogRecord
+
+
+_Scheme = re.compile(r"^[a-z][a-z0-9+.-]*://", re.IGNORECASE)
+_SSH = re.compile(r"^[^@/]+@([^:/]+):(.+)$")
+# Hosts whose paths are case-insensitive, and which accept `owner/name` as a short address
+_CaseInsensitiveHosts = ("github.com", )
+
+
+def repository_identity(address: str) -> str:
+    """ Canonical identity of a repository, given its URL, its clone URL or its Github `owner/name`: the scheme,
+    `www.`, credentials, `.git` suffixes, trailing slashes, query and fragment are dropped, and the address is lower
+    cased where the host ignores case.
+
+    >>> repository_identity("https://github.com/HTR-United/cremma-medieval")
+    'github.com/htr-united/cremma-medieval'
+    >>> repository_identity("git@github.com:htr-united/cremma-medieval.git")
+    'github.com/htr-united/cremma-medieval'
+    >>> repository_identity("HTR-United/Cremma-Medieval")
+    'github.com/htr-united/cremma-medieval'
+    >>> repository_identity("HTTP://www.GitHub.com/htr-united/cremma-medieval.git/")
+    'github.com/htr-united/cremma-medieval'
+    >>> repository_identity("https://Zenodo.org/record/5/")
+    'zenodo.org/record/5'
+    """
+    address = address.strip()
+    ssh = _SSH.match(address)
+    if ssh and not _Scheme.match(address):
+        address = f"{ssh.group(1)}/{ssh.group(2)}"
+    address = _Scheme.sub("", address)
+    address = re.split(r"[?#]", address, maxsplit=1)[0].rstrip("/")
+    if address.endswith(".git"):
+        address = address[:-4].rstrip("/")
+
+    host, _, path = address.partition("/")
+    host = host.rpartition("@")[2].lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if "." not in host and path.count("/") == 0 and path:
+        # Github `owner/name`
+        host, path = "github.com", address
+    if host in _CaseInsensitiveHosts:
+        path = path.lower()
+    return f"{host}/{path}" if path else host
+
+
+def repository_owner(address: str) -> Optional[str]:
+    """ Lower cased owner of a Github repository, None for other hosts
+
+    >>> repository_owner("https://github.com/HTR-United/cremma-medieval")
+    'htr-united'
+    >>> repository_owner("https://zenodo.org/record/5") is None
+    True
+    """
+    host, _, path = repository_identity(address).partition("/")
+    if host != "github.com" or not path:
+        return None
+    return path.split("/")[0]
+
+
+class RepositoryIndex:
+    """ Catalog keys indexed by repository identity (See `repository_identity`), so that the records of a same
+    repository, whichever source and spelling they come from, are merged under a single key: the first one seen.
+
+    It also records which repositories were claimed by a fetch, so that a repository listed by several organizations
+    or already fetched as a link is fetched once. Claims are thread-safe.
+
+    >>> index = RepositoryIndex()
+    >>> index.add("https://github.com/htr-united/cremma-medieval")
+    'https://github.com/htr-united/cremma-medieval'
+    >>> index.add("HTR-United/cremma-medieval")
+    'https://github.com/htr-united/cremma-medieval'
+    >>> index.claim("htr-united/cremma-medieval.git"), index.claim("HTR-United/cremma-medieval")
+    (True, False)
+    """
+    def __init__(self):
+        self.keys: Dict[str, str] = {}
+        self._claimed: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        """ Key under which the repository of key was added, if any """
+        return self.keys.get(repository_identity(key or ""))
+
+    def add(self, key: Optional[str]) -> Optional[str]:
+        """ Registers key for its repository, and returns the key the repository is kept under """
+        return self.keys.setdefault(repository_identity(key or ""), key)
+
+    def claim(self, address: str) -> bool:
+        """ True the first time a repository is claimed, False afterwards """
+        identity = repository_identity(address)
+        with self._lock:
+            if identity in self._claimed:
+                return False
+            self._claimed.add(identity)
+            return True
+
+
+def merge_record(
+        catalog: Catalog,
+        index: RepositoryIndex,
+        key: Optional[str],
+        record: CatalogRecord,
+        fields: Optional[Iterable[str]] = ("characters", "volume")
+) -> Tuple[Optional[str], bool]:
+    """ Adds record to catalog under key, or, if its repository is already there whatever the spelling of its key,
+    updates the fields of the existing record. Keys are repository URLs or Github `owner/name`.
+
+    :param index: Index of the keys of catalog, which is kept up to date
+    :param fields: Fields taken from record when the repository is already in catalog, None to replace the whole record
+    :returns: The key the record is kept under, and whether it was merged into an existing record
+
+    >>> catalog, index = {}, RepositoryIndex()
+    >>> merge_record(catalog, index, "https://github.com/htr-united/a", {"title": "A", "volume": [1]})
+    ('https://github.com/htr-united/a', False)
+    >>> merge_record(catalog, index, "HTR-United/a", {"title": "A (remote)", "volume": [2]})
+    ('https://github.com/htr-united/a', True)
+    >>> catalog
+    {'https://github.com/htr-united/a': {'title': 'A', 'volume': [2]}}
+    """
+    existing = index.add(key)
+    if existing not in catalog:
+        catalog[existing] = record
+        return existing, False
+    if fields is None:
+        catalog[existing] = record
+    else:
+        for field in fields:
+            if field in record:
+                catalog[existing][field] = record[field]
+    return existing, True
@@ -0,0 +1,141 @@
+from typing import Dict, Set, List, Optional, Sequence, Iterable, Tuple, Any
+from collections import defaultdict
+
+from htruc.types import Catalog, CatalogRecord
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _values(record: CatalogRecord, field: str) -> Iterable[str]:
+    """ Indexed values of a field: scripts are reduced to their ISO code, licenses to their name """
+    value = record.get(field)
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        return [value]
+    out = []
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get("iso" if field == "script" else "name")
+        if item is not None:
+            out.append(item)
+    return out
+
+
+class IntervalTree:
+    """ Static interval tree: intervals are sorted by start and laid out as an implicit balanced binary tree, each
+    node knowing the largest end of its subtree. Overlap queries run in O(log n + k).
+
+    >>> tree = IntervalTree([("a", 1200, 1400), ("b", 1500, 1600), ("c", 1350, 1360)])
+    >>> sorted(tree.overlapping(1380, 1550))
+    ['a', 'b']
+    """
+    def __init__(self, intervals: Iterable[Tuple[str, int, int]]):
+        intervals = sorted(intervals, key=lambda interval: interval[1])
+        self.keys: List[str] = [key for key, _, _ in intervals]
+        self.starts: List[int] = [start for _, start, _ in intervals]
+        self.ends: List[int] = [end for _, _, end in intervals]
+        self.max_ends: List[int] = list(self.ends)
+        self._build(0, len(intervals))
+
+    def _build(self, low: int, high: int) -> int:
+        """ Computes the largest end of the subtree covering [low, high) and returns it """
+        if low >= high:
+            return -2 ** 63
+        middle = (low + high) // 2
+        self.max_ends[middle] = max(self.ends[middle], self._build(low, middle), self._build(middle + 1, high))
+        return self.max_ends[middle]
+
+    def overlapping(self, start: int, end: int) -> List[str]:
+        """ Keys of the intervals which overlap [start, end] """
+        found: List[str] = []
+        stack = [(0, len(self.keys))]
+        while stack:
+            low, high = stack.pop()
+            if low >= high:
+                continue
+            middle = (low + high) // 2
+            if self.max_ends[middle] < start:
+                continue
+            stack.append((low, middle))
+            # Intervals on the right begin after this one: none of them overlaps if this one begins too late
+            if self.starts[middle] <= end:
+                if self.ends[middle] >= start:
+                    found.append(self.keys[middle])
+                stack.append((middle + 1, high))
+        return found
+
+
+class CatalogIndex:
+    """ Search index over a catalog, built once: inverted indexes on language, script ISO code, script type, format
+    and license name, and an interval tree on the time span (notBefore, notAfter) of each record.
+
+    :param catalog: Catalog to index, kept as `self.catalog`
+
+    >>> index = CatalogIndex({
+    ...     "a": {"language": ["fro"], "script": [{"iso": "Latn"}], "format": "Page-XML",
+    ...           "time": {"notBefore": "1200", "notAfter": "1400"}},
+    ...     "b": {"language": ["fro", "lat"], "script": ["Latn"], "format": "Alto-XML",
+    ...           "time": {"notBefore": "1450", "notAfter": "1500"}}})
+    >>> index.search(scripts=["Latn"], start=1300, end=1460)
+    ['a', 'b']
+    >>> index.search(languages=["lat", "grc"], formats=["Alto-XML"])
+    ['b']
+    """
+    Fields: Dict[str, str] = {
+        "languages": "language",
+        "scripts": "script",
+        "script_types": "script-type",
+        "formats": "format",
+        "licenses": "license"
+    }
+
+    def __init__(self, catalog: Catalog):
+        self.catalog: Catalog = catalog
+        self.inverted: Dict[str, Dict[str, Set[str]]] = {parameter: defaultdict(set) for parameter in self.Fields}
+        intervals: List[Tuple[str, int, int]] = []
+        for key, record in catalog.items():
+            for parameter, field in self.Fields.items():
+                for value in _values(record, field):
+                    self.inverted[parameter][value].add(key)
+            time = record.get("time") or {}
+            start, end = _as_int(time.get("notBefore")), _as_int(time.get("notAfter"))
+            if start is not None and end is not None:
+                intervals.append((key, start, end))
+        self.inverted = {parameter: dict(values) for parameter, values in self.inverted.items()}
+        self.time: IntervalTree = IntervalTree(intervals)
+
+    def search(
+            self,
+            languages: Sequence[str] = (),
+            scripts: Sequence[str] = (),
+            script_types: Sequence[str] = (),
+            formats: Sequence[str] = (),
+            licenses: Sequence[str] = (),
+            start: Optional[int] = None,
+            end: Optional[int] = None
+    ) -> List[str]:
+        """ Sorted keys of the records matching every filter. Several values for the same filter match any of them.
+
+        :param start: Keeps records whose time span ends at or after start
+        :param end: Keeps records whose time span begins at or before end
+        """
+        candidates: List[Set[str]] = []
+        for parameter, values in (("languages", languages), ("scripts", scripts), ("script_types", script_types),
+                                  ("formats", formats), ("licenses", licenses)):
+            if values:
+                candidates.append(set().union(*(self.inverted[parameter].get(value, ()) for value in values)))
+        if start is not None or end is not None:
+            candidates.append(set(self.time.overlapping(
+                start if start is not None else -2 ** 63,
+                end if end is not None else 2 ** 63
+            )))
+        if not candidates:
+            return sorted(self.catalog)
+        candidates.sort(key=len)
+        return sorted(candidates[0].intersection(*candidates[1:]))
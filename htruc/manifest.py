@@ -0,0 +1,97 @@
+from typing import Optional, Dict, Any, List, Set
+import copy
+import hashlib
+import json
+import os
+
+from htruc.types import CatalogRecord
+
+
+_ManifestVersion = 1
+
+
+def _jsonable(record: Optional[CatalogRecord]) -> Optional[CatalogRecord]:
+    """ Detached copy of a record, as stored in the manifest """
+    if record is None:
+        return None
+    return json.loads(json.dumps(record, default=str))
+
+
+def file_fingerprint(path: str) -> str:
+    """ Fingerprint of a local file, based on its modification time and size """
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def record_fingerprint(record: Optional[CatalogRecord]) -> str:
+    """ Fingerprint of a record content, for sources which do not expose any revision """
+    return hashlib.sha256(json.dumps(record, default=str, sort_keys=True).encode()).hexdigest()
+
+
+class BuildManifest:
+    """ Records what a catalog build was made of, so that the next build only processes what changed
+
+    For each source (a local file, a remote repository, etc.), the manifest keeps its fingerprint and the record it
+    produced before any processing. For each catalog key, it keeps the sources it was built from and the record
+    after validation, upgrade and citation enrichment (`None` if it was rejected). A key is processed again only
+    when the set of its sources or one of their fingerprints changed.
+
+    :param path: Path of the JSON manifest, None keeps it in memory only
+    :param options: Build options, any change in them invalidates the whole manifest
+    """
+    def __init__(self, path: Optional[str] = None, options: Optional[Dict[str, Any]] = None):
+        self.path: Optional[str] = path
+        self.options: str = record_fingerprint(options or {})
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self._seen: Set[str] = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                content = json.load(f)
+            if content.get("version") == _ManifestVersion and content.get("options") == self.options:
+                self.sources = content["sources"]
+                self.records = content["records"]
+
+    def is_unchanged(self, identifier: str, fingerprint: str) -> bool:
+        """ Checks that a source was already seen with the same fingerprint """
+        self._seen.add(identifier)
+        source = self.sources.get(identifier)
+        return source is not None and source["fingerprint"] == fingerprint
+
+    def get_source(self, identifier: str) -> Optional[CatalogRecord]:
+        """ Returns a copy of the record a source produced, which can be modified freely """
+        return copy.deepcopy(self.sources[identifier]["record"])
+
+    def set_source(self, identifier: str, fingerprint: str, record: Optional[CatalogRecord]):
+        self._seen.add(identifier)
+        self.sources[identifier] = {"fingerprint": fingerprint, "record": _jsonable(record)}
+
+    def is_built(self, key: str, sources: List[str]) -> bool:
+        """ Checks that a catalog key was already processed from the very same sources """
+        record = self.records.get(key)
+        return record is not None and record["sources"] == sources
+
+    def get_record(self, key: str) -> Optional[CatalogRecord]:
+        """ Returns the processed record of a key, None if it was rejected """
+        return self.records[key]["record"]
+
+    def set_record(self, key: str, sources: List[str], record: Optional[CatalogRecord]):
+        self.records[key] = {"sources": sources, "record": _jsonable(record)}
+
+    def prune(self, keys: List[str]):
+        """ Forget every source and record which were not part of the current build """
+        keys = set(keys)
+        self.sources = {identifier: value for identifier, value in self.sources.items() if identifier in self._seen}
+        self.records = {key: value for key, value in self.records.items() if key in keys}
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {"version": _ManifestVersion, "options": self.options, "sources": self.sources,
+                 "records": self.records},
+                f
+            )
+        os.replace(tmp_path, self.path)
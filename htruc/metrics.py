@@ -0,0 +1,110 @@
+from typing import Dict, Any, Optional, Iterable, Iterator, TypeVar
+from collections import defaultdict
+from contextlib import contextmanager
+import json
+import sys
+import threading
+import time
+
+from htruc.throttle import get_host
+
+
+_T = TypeVar("_T")
+_End = object()
+
+
+def peak_memory() -> Optional[int]:
+    """ Peak resident memory of the process in bytes, None where the platform does not report it """
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class BuildMetrics:
+    """ Timings and counters of a catalog build, filled by `get_all_catalogs` and the `make` command
+
+    - stages: wall time in seconds spent in each stage (local files, remote repositories, validation, etc.). Stages
+      may overlap, e.g. serialization stages are measured inside the `make` command, around the build.
+    - counters: number of records loaded, reused from the manifest, processed, rejected by validation, upgraded...
+    - hosts: for each host, the requests actually sent, the bytes received, the responses served from the HTTP cache
+      (either fresh or revalidated with a 304) and the error responses.
+    - github: calls made through the rate limit scheduler, including the ones counted in hosts, and the time spent
+      waiting for a rate limit reset.
+
+    All methods are thread-safe.
+
+    >>> metrics = BuildMetrics()
+    >>> with metrics.stage("validation"):
+    ...     metrics.count("records.rejected", 2)
+    >>> metrics.request("https://zenodo.org/api/records/1", status=200, size=120)
+    >>> report = metrics.to_dict()
+    >>> report["counters"], report["hosts"]["zenodo.org"]["bytes"]
+    ({'records.rejected': 2}, 120)
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started: float = time.perf_counter()
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.hosts: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"requests": 0, "bytes": 0, "cache_hits": 0, "errors": 0}
+        )
+        self.github: Dict[str, float] = {"calls": 0, "rate_limit_wait": 0.}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """ Adds the wall time of the block to the stage name """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages[name] += time.perf_counter() - start
+
+    def timed(self, name: str, items: Iterable[_T]) -> Iterator[_T]:
+        """ Yields the items of iterable, adding the time spent waiting for each of them to the stage name, but not the
+        time the consumer spends on them """
+        items = iter(items)
+        while True:
+            with self.stage(name):
+                item = next(items, _End)
+            if item is _End:
+                return
+            yield item
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def request(self, url: str, status: int, size: int):
+        """ Records a request sent to the host of url """
+        with self._lock:
+            host = self.hosts[get_host(url)]
+            host["requests"] += 1
+            host["bytes"] += size
+            if status >= 400:
+                host["errors"] += 1
+
+    def cache_hit(self, url: str):
+        """ Records a response served from the cache for the host of url """
+        with self._lock:
+            self.hosts[get_host(url)]["cache_hits"] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "wall_time": time.perf_counter() - self._started,
+                "peak_memory": peak_memory(),
+                "stages": dict(self.stages),
+                "counters": dict(self.counters),
+                "hosts": {host: dict(values) for host, values in self.hosts.items()},
+                "github": dict(self.github)
+            }
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
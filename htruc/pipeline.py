@@ -0,0 +1,187 @@
+from typing import Callable, Optional, Iterable, Iterator, Tuple, Union, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import queue
+import threading
+
+from htruc.metrics import BuildMetrics
+from htruc.types import CatalogRecord
+
+
+Item = Tuple[str, CatalogRecord]
+_Done = object()
+
+
+@dataclass
+class Stage:
+    """ Step of a `Pipeline`
+
+    :param name: Name of the stage, under which its time is recorded in the metrics
+    :param function: Processes a (key, record) item and returns it, or None to drop it. When batch is above 1, it
+        processes a list of items and returns the items it keeps.
+    :param workers: Number of threads running the function, or a function giving it for each lane
+    :param lane: Splits items between lanes, each with its own workers, so that a slow lane (e.g. a slow host) does not
+        hold up the others. Items whose lane is None skip the stage.
+    :param batch: Largest number of items of a lane given at once to the function. Batches are made of the items
+        already waiting for the stage: a batch is never held back to wait for more items.
+    """
+    name: str
+    function: Union[Callable[[Item], Optional[Item]], Callable[[List[Item]], Iterable[Item]]]
+    workers: Union[int, Callable[[str], int]] = 1
+    lane: Optional[Callable[[Item], Optional[str]]] = None
+    batch: int = 1
+
+
+class Pipeline:
+    """ Moves (key, record) items through stages running concurrently: an item goes to the next stage as soon as it
+    is processed, so that slow network stages overlap with the others. At most `depth` items are waiting or being
+    processed in each stage, which bounds the memory the pipeline uses whatever the size of its source.
+
+    Items come out in the order they are ready, not in the order of the source.
+
+    :param stages: Stages, in order
+    :param depth: Number of items each stage holds at most
+    :param metrics: Metrics where the processing time of each stage is added
+
+    >>> pipeline = Pipeline(
+    ...     Stage("double", lambda item: (item[0], {"value": item[1]["value"] * 2}), workers=2),
+    ...     Stage("odd", lambda item: None if item[1]["value"] % 4 else item)
+    ... )
+    >>> sorted(key for key, _ in pipeline.run((str(i), {"value": i}) for i in range(6)))
+    ['0', '2', '4']
+    """
+    def __init__(self, *stages: Stage, depth: int = 64, metrics: Optional[BuildMetrics] = None):
+        self.stages: Tuple[Stage, ...] = stages
+        self.depth: int = depth
+        self.metrics: BuildMetrics = metrics or BuildMetrics()
+        self._cancelled = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        """ Waits for room in target, unless the pipeline is cancelled """
+        while not self._cancelled.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _feed(self, source: Iterable[Item], target: queue.Queue):
+        try:
+            for item in source:
+                if not self._put(target, item):
+                    return
+        except BaseException as error:
+            self._fail(error)
+        self._put(target, _Done)
+
+    def _fail(self, error: BaseException):
+        self._errors.append(error)
+        self._cancelled.set()
+
+    def _run_stage(self, stage: Stage, source: queue.Queue, target: queue.Queue):
+        """ Dispatches the items of source between the lanes of the stage, and sends their results to target """
+        slots = threading.BoundedSemaphore(self.depth)
+        lanes: Dict[str, ThreadPoolExecutor] = {}
+        # Items of each lane waiting to be sent as a batch
+        batches: Dict[str, List[Item]] = {}
+
+        def process(work: Union[Item, List[Item]]):
+            try:
+                if self._cancelled.is_set():
+                    return
+                with self.metrics.stage(stage.name):
+                    results = stage.function(work) if stage.batch > 1 else [stage.function(work)]
+                for result in results:
+                    if result is not None:
+                        self._put(target, result)
+            except BaseException as error:
+                self._fail(error)
+            finally:
+                for _ in (work if stage.batch > 1 else [work]):
+                    slots.release()
+
+        def submit(lane: str, work: Union[Item, List[Item]]):
+            if lane not in lanes:
+                workers = stage.workers(lane) if callable(stage.workers) else stage.workers
+                lanes[lane] = ThreadPoolExecutor(max_workers=max(1, workers))
+            lanes[lane].submit(process, work)
+
+        def flush():
+            for lane, batch in batches.items():
+                submit(lane, batch)
+            batches.clear()
+
+        try:
+            while True:
+                try:
+                    # Pending batches are sent as soon as no other item is waiting
+                    item = source.get_nowait() if batches else source.get(timeout=0.1)
+                except queue.Empty:
+                    if batches:
+                        flush()
+                    elif self._cancelled.is_set():
+                        return
+                    continue
+                if item is _Done:
+                    flush()
+                    break
+                lane = stage.lane(item) if stage.lane else ""
+                if lane is None:
+                    self._put(target, item)
+                    continue
+                if not slots.acquire(blocking=False):
+                    flush()
+                    slots.acquire()
+                if stage.batch <= 1:
+                    submit(lane, item)
+                    continue
+                batches.setdefault(lane, []).append(item)
+                if len(batches[lane]) >= stage.batch:
+                    submit(lane, batches.pop(lane))
+        except BaseException as error:
+            # e.g. the lane or the number of workers of an item cannot be computed
+            self._fail(error)
+            return
+        finally:
+            for executor in lanes.values():
+                executor.shutdown(wait=True)
+        self._put(target, _Done)
+
+    def run(self, source: Iterable[Item]) -> Iterator[Item]:
+        """ Yields the items of source which went through every stage
+
+        :raises: The first exception raised by the source or a stage, once the pipeline is stopped
+        """
+        self._cancelled.clear()
+        self._errors = []
+        queues = [queue.Queue(maxsize=self.depth) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(source, queues[0]), daemon=True)]
+        threads.extend(
+            threading.Thread(target=self._run_stage, args=(stage, queues[index], queues[index + 1]), daemon=True)
+            for index, stage in enumerate(self.stages)
+        )
+        for thread in threads:
+            thread.start()
+        finished = False
+        try:
+            while True:
+                try:
+                    item = queues[-1].get(timeout=0.1)
+                except queue.Empty:
+                    if self._cancelled.is_set():
+                        break
+                    continue
+                if item is _Done:
+                    finished = True
+                    break
+                yield item
+        finally:
+            # The consumer stopped early or something failed: the other threads stop waiting for room or items
+            if not finished:
+                self._cancelled.set()
+            for thread in threads:
+                thread.join()
+        if self._errors:
+            raise self._errors[0]
@@ -1,2 +1,7 @@
 from ._generic import get_a_yaml
-from ._github import get_htr_united_repos, get_github_repo_yaml, get_github_repo_cff
+from ._client import get_client
+from ._scheduler import RateLimitScheduler, RateLimitRetriesExceeded
+from ._github import get_htr_united_repos, iter_htr_united_repos, get_github_repo_yaml, get_github_repo_cff, \
+    list_htr_united_repos
+from ._graphql import list_htr_united_repos_graphql, GraphQLRepository
+from ._git import MirrorRepository, GitError, sync_mirror, mirror_repository, default_mirror_directory
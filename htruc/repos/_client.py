@@ -0,0 +1,32 @@
+from typing import Optional, Union
+
+from github import Github, Auth
+from urllib3 import Retry
+
+
+def get_client(
+        access_token: Optional[str] = None,
+        per_page: int = 100,
+        pool_size: Optional[int] = None,
+        seconds_between_requests: Optional[float] = None,
+        base_url: str = "https://api.github.com",
+        retry: Optional[Union[int, Retry]] = None) -> Github:
+    """ Create the Github client shared by every call of a run, so that its connection pool is reused
+
+    :param access_token: Github Access Token
+    :param per_page: Number of items per page when listing (100 is the maximum allowed by Github)
+    :param pool_size: Size of the connection pool, should be at least the number of concurrent jobs
+    :param seconds_between_requests: Minimal delay between two requests of this client, PyGithub sets it to
+        0.25 by default which would serialize concurrent jobs
+    :param base_url: URL of the Github API
+    :param retry: Retry policy of the connections, None keeps PyGithub's default which sleeps on rate limits
+    """
+    kwargs = {} if retry is None else {"retry": retry}
+    return Github(
+        auth=Auth.Token(access_token) if access_token else None,
+        per_page=per_page,
+        pool_size=pool_size,
+        seconds_between_requests=seconds_between_requests,
+        base_url=base_url,
+        **kwargs
+    )
@@ -1,13 +1,16 @@
 from typing import Optional, Dict, Any
-import requests
 from htruc.utils import parse_yaml
+from htruc.cache import HTTPCache, cached_get
 
 
 Catalog = Dict[str, Any]
 
 
-def get_a_yaml(address: str, raise_on_parse_error: bool = False) -> Optional[Catalog]:
-    req = requests.get(address)
+def get_a_yaml(
+        address: str,
+        raise_on_parse_error: bool = False,
+        cache: Optional[HTTPCache] = None) -> Optional[Catalog]:
+    req = cached_get(address, cache=cache)
     if req.status_code >= 400:
         return None
 
@@ -0,0 +1,114 @@
+from typing import Optional, Any
+from dataclasses import dataclass
+import logging
+import os
+import re
+import shutil
+import subprocess
+
+from htruc.metrics import BuildMetrics
+from htruc.repos._graphql import GraphQLRepository
+
+
+Logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MirrorRepository(GraphQLRepository):
+    """ Repository whose catalog and citation files were read from a local mirror (See `mirror_repository`). As for
+    the GraphQL backend, its files come along with it and need no other request. """
+    mirror: Optional[str] = None
+
+
+class GitError(Exception):
+    """ A git command failed """
+
+
+def default_mirror_directory() -> str:
+    """ Directory of the mirrors when none is given: `$XDG_CACHE_HOME/htruc/mirrors` or `~/.cache/htruc/mirrors` """
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache, "htruc", "mirrors")
+
+
+def _git(*args: str, cwd: Optional[str] = None) -> str:
+    try:
+        process = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True)
+    except OSError as error:
+        raise GitError(f"git is not available: {error}")
+    if process.returncode:
+        raise GitError(f"`git {' '.join(args)}` failed: {process.stderr.strip()}")
+    return process.stdout
+
+
+def _mirror_path(directory: str, full_name: str) -> str:
+    return os.path.join(directory, f"{re.sub(r'[^A-Za-z0-9._-]', '_', full_name.lower())}.git")
+
+
+def sync_mirror(
+        clone_url: str,
+        path: str,
+        depth: Optional[int] = 1,
+        metrics: Optional[BuildMetrics] = None
+) -> str:
+    """ Clones the default branch of a repository as a bare repository at path, or updates it with a single fetch if
+    it was already cloned.
+
+    :param depth: Number of commits kept in the mirror, None for the whole history. The files are read from the last
+        commit only, so shallow mirrors are cheaper to clone and to update.
+    :param metrics: Counts the clones (`mirrors.cloned`) and the fetches (`mirrors.fetched`)
+    :raises GitError: When the repository cannot be cloned or fetched
+    """
+    shallow = [f"--depth={depth}"] if depth else []
+    if os.path.exists(os.path.join(path, "HEAD")):
+        branch = _git("symbolic-ref", "HEAD", cwd=path).strip()
+        _git("fetch", "--quiet", *shallow, "origin", f"+HEAD:{branch}", cwd=path)
+        if metrics:
+            metrics.count("mirrors.fetched")
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        shutil.rmtree(f"{path}.tmp", ignore_errors=True)
+        # Cloned next to its final path and moved there: an interrupted clone leaves no half-made mirror
+        _git("clone", "--quiet", "--bare", "--single-branch", *shallow, clone_url, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        if metrics:
+            metrics.count("mirrors.cloned")
+    return path
+
+
+def read_mirror_file(path: str, filename: str) -> Optional[str]:
+    """ Content of a file at the root of the last commit of a mirror, None if there is no such file """
+    try:
+        return _git("cat-file", "blob", f"HEAD:{filename}", cwd=path)
+    except GitError:
+        return None
+
+
+def mirror_repository(
+        repo: Any,
+        directory: str,
+        depth: Optional[int] = 1,
+        metrics: Optional[BuildMetrics] = None
+) -> Optional[MirrorRepository]:
+    """ Synchronizes the mirror of a listed repository and reads its htr-united.yml and CITATION.cff
+
+    :param repo: Repository as listed by `list_htr_united_repos`: anything with a `name`, `full_name`, `clone_url` and
+        `pushed_at`
+    :param directory: Directory of the mirrors, each repository being kept in `<owner>_<name>.git`
+    :returns: None when the repository cannot be mirrored, which is logged
+    """
+    try:
+        path = sync_mirror(repo.clone_url, _mirror_path(directory, repo.full_name), depth=depth, metrics=metrics)
+        files = _git("ls-tree", "--name-only", "HEAD", cwd=path).splitlines()
+    except GitError as error:
+        Logger.warning(f"Unable to mirror {repo.full_name}: {error}")
+        return None
+    citation = next((name for name in files if name.lower() == "citation.cff"), None)
+    return MirrorRepository(
+        name=repo.name,
+        full_name=repo.full_name,
+        clone_url=repo.clone_url,
+        pushed_at=repo.pushed_at,
+        catalog_text=read_mirror_file(path, "htr-united.yml") if "htr-united.yml" in files else None,
+        cff_text=read_mirror_file(path, citation) if citation else None,
+        mirror=path
+    )
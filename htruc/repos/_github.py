@@ -1,42 +1,143 @@
-from typing import Optional, Dict, Any, Iterable
+from typing import Optional, Dict, Any, Iterable, Iterator, Tuple, List, Set, Union
+import json
 import re
 
+import logging
+
 import github
 from ruamel.yaml import YAML, parser
-from github import Github
-from github.GithubException import UnknownObjectException
-from htruc.utils import parse_yaml
+from github import Github, RateLimitExceededException
+from github.Repository import Repository
+from htruc.utils import parse_yaml, threaded_map
+from htruc.cache import HTTPCache, cached_get
+from htruc.metrics import BuildMetrics
+from htruc.throttle import HostThrottle
+from htruc.repos._client import get_client
+from htruc.repos._scheduler import GithubClient, with_client, RateLimitScheduler, RateLimitRetriesExceeded
+from htruc.repos._graphql import list_htr_united_repos_graphql, GraphQLRepository
+from htruc.repos._git import mirror_repository, default_mirror_directory
+
+
+Logger = logging.getLogger(__name__)
 
 
 Catalog = Dict[str, Any]
 
 
+def _split_address(address: str) -> Tuple[str, str]:
+    user, repo_name = re.findall("github.com/([^/]+)/([^/]+)", address)[0]
+    if repo_name.endswith(".git"):
+        repo_name = repo_name[:-4]
+    return user, repo_name
+
+
+def _base_url(client: GithubClient) -> str:
+    if isinstance(client, RateLimitScheduler):
+        return client.client.requester.base_url
+    return client.requester.base_url
+
+
+def _is_rate_limited(status: int, headers: Dict[str, Any], body: str) -> bool:
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    return headers.get("x-ratelimit-remaining") == "0" or "rate limit" in body.lower()
+
+
+def _get_contents(
+        client: GithubClient,
+        full_name: str,
+        path: str,
+        cache: Optional[HTTPCache] = None,
+        raw: bool = True,
+        throttle: Optional[HostThrottle] = None,
+        metrics: Optional[BuildMetrics] = None,
+        missing: Optional[Set[str]] = None) -> Optional[str]:
+    """ Retrieve a file (raw=True) or a directory listing (raw=False) of a repository in a single request,
+    revalidated against the cache if one is given.
+
+    A missing file (404) returns None, other errors are logged with their status and return None as well.
+
+    :param missing: Set the full name of the repository is added to when the file does not exist
+
+    :raises RateLimitExceededException: When Github refuses the request because of its rate limit
+    :raises GithubException: On server errors (5xx), once the scheduler retried them
+    """
+    def send(url: str, headers: Dict[str, str]):
+        def request(g: Github):
+            status, response_headers, body = g.requester.requestJson("GET", url, headers=headers)
+            if _is_rate_limited(status, response_headers, body):
+                raise RateLimitExceededException(status, body, response_headers)
+            if status >= 500:
+                # Raised so that the scheduler retries it
+                raise github.GithubException(status, body, response_headers)
+            return status, response_headers, body
+        return with_client(client, request)
+
+    response = cached_get(
+        f"{_base_url(client)}/repos/{full_name}/contents/{path}",
+        headers={"Accept": "application/vnd.github.raw+json" if raw else "application/vnd.github+json"},
+        cache=cache,
+        send=send,
+        throttle=throttle,
+        metrics=metrics
+    )
+    if response.status_code == 404:
+        if missing is not None:
+            missing.add(full_name)
+        return None
+    if response.status_code >= 400:
+        Logger.warning(f"Unable to retrieve {path or 'the file list'} from {full_name}: "
+                       f"status {response.status_code}")
+        return None
+    return response.text
+
+
 def get_github_repo_yaml(
         address: str,
         access_token: Optional[str] = None,
-        raise_on_parse_error: bool = False) -> Optional[Catalog]:
+        raise_on_parse_error: bool = False,
+        client: Optional[GithubClient] = None,
+        cache: Optional[HTTPCache] = None,
+        metrics: Optional[BuildMetrics] = None,
+        missing: Optional[Set[str]] = None) -> Optional[Catalog]:
     """
+    :param client: Shared client (See `get_client`) or scheduler (See `RateLimitScheduler`), a new client is created
+        from access_token otherwise
+    :param cache: HTTP Cache used to revalidate the file instead of downloading it again
+    :param metrics: Metrics recording the requests
+    :param missing: Set `user/repository` is added to when the repository has no htr-united.yml, as opposed to
+        a request which failed
+    :raises RateLimitExceededException: When Github refuses the request because of its rate limit and client is not
+        a scheduler. When the scheduler gives up after its retries, the repository is logged and skipped.
+
     >>> get_github_repo_yaml("github.com/htr-united/cremma-medieval.git")["title"]
     'Cremma Medieval'
     """
 
-    user, repo_name = re.findall("github.com/([^/]+)/([^/]+)", address)[0]
-    if repo_name.endswith(".git"):
-        repo_name = repo_name[:-4]
-    g = Github(access_token)
+    user, repo_name = _split_address(address)
+    g = client or get_client(access_token)
     try:
-        repo = g.get_repo(f"{user}/{repo_name}")
-        text = repo.get_contents("htr-united.yml").decoded_content.decode()
-        print("--- Found htr-united.yml")
-    except UnknownObjectException as e:
+        text = _get_contents(g, f"{user}/{repo_name}", "htr-united.yml", cache=cache, metrics=metrics,
+                             missing=missing)
+    except RateLimitExceededException:
+        raise
+    except (github.GithubException, RateLimitRetriesExceeded) as e:
+        Logger.warning(f"Unable to retrieve htr-united.yml from {user}/{repo_name}: {e}")
         return None
-    except github.GithubException as e:
+    return _parse_catalog(text, f"{user}/{repo_name}", raise_on_parse_error=raise_on_parse_error)
+
+
+def _parse_catalog(text: Optional[str], full_name: str, raise_on_parse_error: bool = False) -> Optional[Catalog]:
+    if text is None:
         return None
+    print("--- Found htr-united.yml")
 
     try:
         return parse_yaml(text)
     except parser.ParserError:
-        print(f"Parse error on {user}/{repo_name}")
+        print(f"Parse error on {full_name}")
         if raise_on_parse_error:
             raise
         return None
@@ -44,43 +145,141 @@ def get_github_repo_yaml(
 
 def get_github_repo_cff(
         address: str,
-        access_token: Optional[str] = None) -> Optional[str]:
+        access_token: Optional[str] = None,
+        client: Optional[GithubClient] = None,
+        cache: Optional[HTTPCache] = None,
+        throttle: Optional[HostThrottle] = None,
+        prefetched: Optional[Dict[str, Optional[str]]] = None,
+        metrics: Optional[BuildMetrics] = None) -> Optional[str]:
     """
+    :param client: Shared client (See `get_client`) or scheduler (See `RateLimitScheduler`), a new client is created
+        from access_token otherwise
+    :param cache: HTTP Cache used to revalidate the file instead of downloading it again
+    :param throttle: Per host limits applied to the requests
+    :param prefetched: Citation files already retrieved, keyed by lowercase `owner/repository` (See the `citations`
+        parameter of `get_htr_united_repos`)
+    :param metrics: Metrics recording the requests
 
     >>> get_github_repo_yaml("github.com/htr-united/cremma-medieval.git")["title"]
     'Cremma Medieval'
     """
 
-    user, repo_name = re.findall("github.com/([^/]+)/([^/]+)", address)[0]
-    if repo_name.endswith(".git"):
-        repo_name = repo_name[:-4]
-    g = Github(access_token)
-    repo = g.get_repo(f"{user}/{repo_name}")
-    for github_content in repo.get_contents(""):
-        if github_content.name.lower() == "citation.cff":
-            try:
-                text = repo.get_contents(github_content.name).decoded_content.decode()
-                return text
-            except UnknownObjectException as e:
-                return None
+    user, repo_name = _split_address(address)
+    if prefetched is not None and f"{user}/{repo_name}".lower() in prefetched:
+        return prefetched[f"{user}/{repo_name}".lower()]
+    g = client or get_client(access_token)
+    listing = _get_contents(g, f"{user}/{repo_name}", "", cache=cache, raw=False, throttle=throttle,
+                            metrics=metrics)
+    if not listing:
+        return None
+    for github_content in json.loads(listing):
+        if github_content["name"].lower() == "citation.cff":
+            return _get_contents(g, f"{user}/{repo_name}", github_content["name"], cache=cache, throttle=throttle,
+                                 metrics=metrics)
+
+
+def list_htr_united_repos(
+        access_token: Optional[str] = None,
+        main_organization: str = "htr-united",
+        exclude: Iterable[str] = ("htr-united", "template-htr-united-datarepo", ),
+        client: Optional[GithubClient] = None,
+        backend: str = "rest"
+) -> List[Union[Repository, GraphQLRepository]]:
+    """ List the public repositories of an organization
+
+    :param backend: `rest` and `git` list the repositories without their content, `graphql` retrieves their
+        htr-united.yml and CITATION.cff along (See `list_htr_united_repos_graphql`)
+    """
+    if backend == "graphql":
+        return list_htr_united_repos_graphql(
+            access_token=access_token, main_organization=main_organization, exclude=exclude, client=client
+        )
+    return with_client(
+        client or get_client(access_token),
+        lambda g: [
+            repo
+            for repo in g.get_organization(main_organization).get_repos(type="public")
+            if repo.name not in (exclude or ())
+        ]
+    )
 
 
 def get_htr_united_repos(
         access_token: Optional[str] = None,
         main_organization: str = "htr-united",
-        exclude: Iterable[str] = ("htr-united", "template-htr-united-datarepo", )
+        exclude: Iterable[str] = ("htr-united", "template-htr-united-datarepo", ),
+        jobs: int = 1,
+        client: Optional[GithubClient] = None,
+        cache: Optional[HTTPCache] = None,
+        repos: Optional[Iterable[Union[Repository, GraphQLRepository]]] = None,
+        backend: str = "rest",
+        citations: Optional[Dict[str, Optional[str]]] = None,
+        metrics: Optional[BuildMetrics] = None,
+        mirror_directory: Optional[str] = None
 ) -> Dict[str, Catalog]:
     """ Get a single repo specific tokens
 
+    :param jobs: Number of repositories fetched at the same time. The output order follows the order of the
+        organization listing whatever the number of jobs.
+    :param client: Shared client (See `get_client`) or scheduler (See `RateLimitScheduler`), a new client is created
+        from access_token otherwise
+    :param cache: HTTP Cache used to revalidate the files instead of downloading them again
+    :param repos: Repositories to fetch (See `list_htr_united_repos`), the whole organization is listed otherwise
+    :param backend: `rest` fetches each htr-united.yml with its own request, `graphql` retrieves them in batches
+        with the listing, `git` reads them from local mirrors updated with one fetch per repository, without using
+        the API quota (See `mirror_repository`)
+    :param citations: Dictionary filled with the CITATION.cff retrieved by the `graphql` and `git` backends, keyed
+        by lowercase `owner/repository`, to be given to `get_github_repo_cff`
+    :param metrics: Metrics recording the requests
+    :param mirror_directory: Directory of the mirrors of the `git` backend, defaults to `default_mirror_directory()`
+
     >>> get_htr_united_repos()
     """
-    g = Github(access_token)
-    o = g.get_organization(main_organization)
-    out = {}
-    for repo in o.get_repos(type="public"):
-        if repo.name in exclude:
-            continue
-        data = get_github_repo_yaml(repo.clone_url, access_token=access_token)
+    return dict(iter_htr_united_repos(
+        access_token=access_token, main_organization=main_organization, exclude=exclude, jobs=jobs, client=client,
+        cache=cache, repos=repos, backend=backend, citations=citations, metrics=metrics,
+        mirror_directory=mirror_directory
+    ))
+
+
+def iter_htr_united_repos(
+        access_token: Optional[str] = None,
+        main_organization: str = "htr-united",
+        exclude: Iterable[str] = ("htr-united", "template-htr-united-datarepo", ),
+        jobs: int = 1,
+        client: Optional[GithubClient] = None,
+        cache: Optional[HTTPCache] = None,
+        repos: Optional[Iterable[Union[Repository, GraphQLRepository]]] = None,
+        backend: str = "rest",
+        citations: Optional[Dict[str, Optional[str]]] = None,
+        metrics: Optional[BuildMetrics] = None,
+        mirror_directory: Optional[str] = None,
+        missing: Optional[Set[str]] = None
+) -> Iterator[Tuple[str, Catalog]]:
+    """ Same as `get_htr_united_repos`, but yields each (full name, record) as soon as it is fetched, in the order
+    of the listing, so that the records can be processed while the others are fetched
+
+    :param missing: Set filled with the full names of the repositories which have no htr-united.yml, as opposed to
+        the ones which could not be fetched or parsed
+    """
+    g = client or get_client(access_token, pool_size=jobs)
+    if repos is None:
+        repos = list_htr_united_repos(main_organization=main_organization, exclude=exclude, client=g, backend=backend)
+    repos = list(repos)
+
+    def fetch(repo: Union[Repository, GraphQLRepository]) -> Optional[Catalog]:
+        if backend == "git":
+            repo = mirror_repository(repo, mirror_directory or default_mirror_directory(), metrics=metrics)
+            if repo is None:
+                return None
+        if isinstance(repo, GraphQLRepository):
+            if citations is not None:
+                citations[repo.full_name.lower()] = repo.cff_text
+            if repo.catalog_text is None and missing is not None:
+                missing.add(repo.full_name)
+            return _parse_catalog(repo.catalog_text, repo.full_name)
+        return get_github_repo_yaml(repo.clone_url, client=g, cache=cache, metrics=metrics, missing=missing)
+
+    for repo, data in zip(repos, threaded_map(fetch, repos, jobs=jobs if backend != "graphql" else 1)):
         if data:
-            out[repo.full_name] = data
-    return out
+            yield repo.full_name, data
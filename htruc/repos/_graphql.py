@@ -0,0 +1,108 @@
+from typing import Optional, Iterable, List, Dict, Any
+from dataclasses import dataclass
+import datetime
+
+from github import Github
+
+from htruc.repos._client import get_client
+from htruc.repos._scheduler import GithubClient, with_client
+
+
+# Citation files are looked up under their usual spellings, as GraphQL expressions are case-sensitive
+_CitationFileNames = ("CITATION.cff", "citation.cff", "Citation.cff")
+
+_Query = """
+query($organization: String!, $first: Int!, $cursor: String) {
+  organization(login: $organization) {
+    repositories(first: $first, after: $cursor, privacy: PUBLIC, orderBy: {field: CREATED_AT, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        nameWithOwner
+        url
+        pushedAt
+        catalog: object(expression: "HEAD:htr-united.yml") { ... on Blob { text } }
+        %s
+      }
+    }
+  }
+}
+""" % "\n        ".join(
+    f'cff{index}: object(expression: "HEAD:{name}") {{ ... on Blob {{ text }} }}'
+    for index, name in enumerate(_CitationFileNames)
+)
+
+
+@dataclass
+class GraphQLRepository:
+    """ Repository as listed by the GraphQL backend, with the content of its catalog and citation files """
+    name: str
+    full_name: str
+    clone_url: str
+    pushed_at: Optional[datetime.datetime]
+    catalog_text: Optional[str]
+    cff_text: Optional[str]
+
+
+def _blob_text(node: Dict[str, Any], alias: str) -> Optional[str]:
+    return (node.get(alias) or {}).get("text")
+
+
+def _parse_node(node: Dict[str, Any]) -> GraphQLRepository:
+    pushed_at = node.get("pushedAt")
+    return GraphQLRepository(
+        name=node["name"],
+        full_name=node["nameWithOwner"],
+        clone_url=f"{node['url']}.git",
+        pushed_at=datetime.datetime.fromisoformat(pushed_at.replace("Z", "+00:00")) if pushed_at else None,
+        catalog_text=_blob_text(node, "catalog"),
+        cff_text=next(
+            (_blob_text(node, f"cff{index}") for index in range(len(_CitationFileNames))
+             if _blob_text(node, f"cff{index}") is not None),
+            None
+        )
+    )
+
+
+def list_htr_united_repos_graphql(
+        access_token: Optional[str] = None,
+        main_organization: str = "htr-united",
+        exclude: Iterable[str] = ("htr-united", "template-htr-united-datarepo", ),
+        client: Optional[GithubClient] = None,
+        per_page: int = 50
+) -> List[GraphQLRepository]:
+    """ List the public repositories of an organization with their htr-united.yml and CITATION.cff in a few
+    batched GraphQL queries (one per page of `per_page` repositories)
+
+    :param client: Shared client (See `get_client`) or scheduler (See `RateLimitScheduler`), a new client is created
+        from access_token otherwise. The GraphQL API requires an access token. Queries go to the GraphQL endpoint of
+        the client's API (e.g. `/api/graphql` for a `/api/v3` Github Enterprise base URL).
+    :param per_page: Number of repositories per query
+    """
+    exclude = set(exclude or ())
+    client = client or get_client(access_token)
+    out: List[GraphQLRepository] = []
+    cursor: Optional[str] = None
+    while True:
+        def query(g: Github, cursor=cursor):
+            _, data = g.requester.requestJsonAndCheck(
+                "POST",
+                g.requester.graphql_url,
+                input={
+                    "query": _Query,
+                    "variables": {"organization": main_organization, "first": per_page, "cursor": cursor}
+                }
+            )
+            if data.get("errors"):
+                raise g.requester.createException(400, {}, {"message": data["errors"][0].get("message")})
+            return data["data"]["organization"]["repositories"]
+
+        page = with_client(client, query)
+        out.extend(
+            repo
+            for repo in map(_parse_node, page["nodes"])
+            if repo.name not in exclude
+        )
+        if not page["pageInfo"]["hasNextPage"]:
+            return out
+        cursor = page["pageInfo"]["endCursor"]
@@ -0,0 +1,138 @@
+from typing import Optional, Callable, Sequence, TypeVar, Union, Dict, List
+import logging
+import threading
+import time
+
+from github import Github, GithubException, RateLimitExceededException
+
+from htruc.repos._client import get_client
+
+
+Logger = logging.getLogger(__name__)
+_T = TypeVar("_T")
+
+
+class RateLimitRetriesExceeded(RuntimeError):
+    """ A call was still rate limited after every retry of the scheduler """
+
+
+class RateLimitScheduler:
+    """ Runs Github API calls while keeping track of the rate limit of one or several tokens
+
+    After each call, the scheduler reads the X-RateLimit-Remaining and X-RateLimit-Reset values of the client. Calls
+    go to the token with the largest remaining budget; once a token goes under `pace_below` of its limit, its calls
+    are spaced so that its remaining budget lasts until its reset. When a call hits the rate limit, the token is set
+    aside until its reset and the call is retried with another token, or after waiting for the first reset. Server
+    errors (5xx) are retried as well, after an exponential backoff.
+
+    :param tokens: Github access tokens, None for anonymous access
+    :param base_url: URL of the Github API
+    :param per_page: Number of items per page when listing
+    :param pool_size: Size of the connection pool of each client
+    :param pace_below: Fraction of the limit below which calls of a token are spread until its reset
+    :param max_retries: Number of rate limited or failed attempts before giving up on a call
+    :param sleep: Function used to wait
+    """
+    def __init__(
+            self,
+            tokens: Sequence[Optional[str]] = (None, ),
+            base_url: str = "https://api.github.com",
+            per_page: int = 100,
+            pool_size: Optional[int] = None,
+            pace_below: float = 0.1,
+            max_retries: int = 10,
+            sleep: Callable[[float], None] = time.sleep
+    ):
+        self.clients: List[Github] = [
+            get_client(token, per_page=per_page, pool_size=pool_size, base_url=base_url, retry=3)
+            for token in (tokens or (None, ))
+        ]
+        self.pace_below: float = pace_below
+        self.max_retries: int = max_retries
+        self.sleep: Callable[[float], None] = sleep
+        self._lock = threading.Lock()
+        # Moment before which a client should not be used, either because it is exhausted or paced
+        self._not_before: Dict[int, float] = {index: 0. for index in range(len(self.clients))}
+        self.waited: float = 0.
+        self.calls: int = 0
+
+    @property
+    def client(self) -> Github:
+        """ First client, for code which needs a plain Github object """
+        return self.clients[0]
+
+    @staticmethod
+    def _budget(client: Github) -> Optional[int]:
+        remaining, limit = client.requester.rate_limiting
+        return remaining if limit >= 0 else None
+
+    def _pick(self) -> int:
+        """ Picks the client with the largest remaining budget among the available ones, waits if there is none """
+        while True:
+            with self._lock:
+                now = time.time()
+                available = [index for index, not_before in self._not_before.items() if not_before <= now]
+                if available:
+                    index = max(
+                        available,
+                        key=lambda idx: (self._budget(self.clients[idx]) is None, self._budget(self.clients[idx]) or 0)
+                    )
+                    self._pace(index, now)
+                    return index
+                delay = min(self._not_before.values()) - now
+            Logger.warning(f"Github rate limit reached on every token, waiting {delay:.0f}s")
+            with self._lock:
+                self.waited += delay
+            self.sleep(delay)
+
+    def _pace(self, index: int, now: float):
+        """ Spaces the next call of a client whose budget is running low, over the time left before its reset """
+        requester = self.clients[index].requester
+        remaining, limit = requester.rate_limiting
+        if limit <= 0 or remaining >= limit * self.pace_below:
+            return
+        time_to_reset = max(0., requester.rate_limiting_resettime - now)
+        self._not_before[index] = now + time_to_reset / max(remaining, 1)
+
+    def _exhausted(self, index: int, error: RateLimitExceededException):
+        requester = self.clients[index].requester
+        reset = requester.rate_limiting_resettime
+        retry_after = (error.headers or {}).get("retry-after")
+        if retry_after:
+            reset = time.time() + float(retry_after)
+        with self._lock:
+            # A reset in the past means the headers were missing: wait a minute, as Github recommends
+            self._not_before[index] = reset if reset > time.time() else time.time() + 60
+        Logger.warning(f"Github rate limit reached for token #{index}, set aside until {time.ctime(reset)}")
+
+    def run(self, function: Callable[[Github], _T]) -> _T:
+        """ Runs function with the most appropriate client, retrying it if it hits the rate limit or a server error
+
+        :raises RateLimitRetriesExceeded: When every attempt was rate limited
+        :raises GithubException: When the last attempt failed with a server error, or at once for other errors
+        """
+        for attempt in range(self.max_retries):
+            index = self._pick()
+            with self._lock:
+                self.calls += 1
+            try:
+                return function(self.clients[index])
+            except RateLimitExceededException as error:
+                self._exhausted(index, error)
+            except GithubException as error:
+                if (error.status or 0) < 500 or attempt == self.max_retries - 1:
+                    raise
+                delay = min(2 ** attempt, 60)
+                Logger.warning(f"Github server error {error.status}, retrying in {delay}s")
+                self.sleep(delay)
+        raise RateLimitRetriesExceeded(f"Github rate limit still exceeded after {self.max_retries} attempts")
+
+
+GithubClient = Union[Github, RateLimitScheduler]
+
+
+def with_client(client: GithubClient, function: Callable[[Github], _T]) -> _T:
+    """ Runs function with client, through the scheduler if client is one """
+    if isinstance(client, RateLimitScheduler):
+        return client.run(function)
+    return function(client)
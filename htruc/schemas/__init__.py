@@ -1,8 +1,14 @@
-from typing import Dict, Tuple, Callable, AnyStr, Iterable
+from typing import Dict, Tuple, Callable, AnyStr, Iterable, List
+from functools import lru_cache
+import logging
+
 from htruc.schemas.upgrade_path import upgrade_2021_10_15_to_2022_04_15, upgrade_2022_04_15_to_2023_06_27
 from htruc.types import SchemaVersion, CatalogRecord
 
 
+Logger = logging.getLogger(__name__)
+
+
 # This Tuple is used to know which schema are supported
 UpgradeOrder: Tuple[SchemaVersion, ...] = (
     "https://htr-united.github.io/schema/2021-10-15/schema.json",
@@ -16,19 +22,79 @@ UpgradeFunction: Dict[str, Callable[[CatalogRecord], CatalogRecord]] = {
 }
 
 
-def recursive_update(catalog_record: CatalogRecord) -> Tuple[CatalogRecord, Iterable[SchemaVersion]]:
+@lru_cache(maxsize=None)
+def get_upgrade_chain(version: SchemaVersion) -> Tuple[SchemaVersion, ...]:
+    """ Versions a record of schema `version` goes through to reach the latest schema, each of them being upgraded
+    with its `UpgradeFunction`
+
+    >>> [chain.split("/")[-2] for chain in get_upgrade_chain(UpgradeOrder[0])]
+    ['2021-10-15', '2022-04-15']
+    >>> get_upgrade_chain(UpgradeOrder[-1])
+    ()
+    """
+    return UpgradeOrder[UpgradeOrder.index(version):-1]
+
+
+def recursive_update(
+        catalog_record: CatalogRecord,
+        verbose: bool = False
+) -> Tuple[CatalogRecord, Iterable[SchemaVersion]]:
     """ Automatically upgrade a schema
 
+    :param verbose: Prints the changes made by each upgrade
     :returns: The catalog record upgrade to the latest schema, with the list of upgrade it went through
 
     """
-    version = catalog_record["schema"]
-    # If the version is the latest, no need to upgrade
-    if version == UpgradeOrder[-1]:
-        return catalog_record, []
-    current_version_index = UpgradeOrder.index(version)
+    upgrades = get_upgrade_chain(catalog_record["schema"])
+    for version in upgrades:
+        catalog_record = UpgradeFunction[version](catalog_record, verbose=verbose)
+
+    return catalog_record, upgrades
+
+
+def _short_version(version: SchemaVersion) -> str:
+    return version.split("/")[-2]
+
+
+def upgrade_records(catalog: Dict[str, CatalogRecord]) -> Dict[Tuple[SchemaVersion, SchemaVersion], int]:
+    """ Upgrades every record of catalog to the latest schema, in place and without printing anything. Records are
+    grouped by schema version, so that the upgrade chain of each version is computed once and applied to the whole
+    group. Records whose version is not supported are left untouched.
+
+    :returns: Number of records upgraded, per (original version, latest version)
+
+    >>> catalog = {"a": {"schema": UpgradeOrder[1]}, "b": {"schema": UpgradeOrder[-1]}}
+    >>> format_upgrade_summary(upgrade_records(catalog))
+    '1 records 2022-04-15→2023-06-27'
+    >>> catalog["a"]["schema"] == UpgradeOrder[-1]
+    True
+    """
+    groups: Dict[SchemaVersion, List[str]] = {}
+    for key, record in catalog.items():
+        groups.setdefault(record.get("schema"), []).append(key)
+
+    summary: Dict[Tuple[SchemaVersion, SchemaVersion], int] = {}
+    for version, keys in groups.items():
+        if version not in UpgradeOrder:
+            Logger.warning(f"{len(keys)} records with an unsupported schema ({version}) were not upgraded")
+            continue
+        upgrades = [UpgradeFunction[step] for step in get_upgrade_chain(version)]
+        if not upgrades:
+            continue
+        for key in keys:
+            record = catalog[key]
+            for upgrade in upgrades:
+                record = upgrade(record, verbose=False)
+            catalog[key] = record
+        summary[(version, UpgradeOrder[-1])] = len(keys)
+    return summary
 
-    for version in UpgradeOrder[current_version_index:-1]:
-        catalog_record = UpgradeFunction[version](catalog_record)
 
-    return catalog_record, UpgradeOrder[current_version_index:-1]
+def format_upgrade_summary(summary: Dict[Tuple[SchemaVersion, SchemaVersion], int]) -> str:
+    """ One line summary of `upgrade_records` """
+    if not summary:
+        return "No record upgraded"
+    return ", ".join(
+        f"{count} records {_short_version(source)}→{_short_version(target)}"
+        for (source, target), count in summary.items()
+    )
@@ -0,0 +1,120 @@
+""" Versioned store of the HTR-United JSON schemas
+
+Schemas are looked up in the user store first, then among the schemas bundled with htruc (every version of
+`UpgradeOrder`), and only then downloaded into the user store: the installed package is never written to, as it is often read-only. The store directory is
+`$HTRUC_SCHEMA_DIR`, `$XDG_CACHE_HOME/htruc/schemas` or `~/.cache/htruc/schemas`.
+
+In offline mode (`offline=True`, which `htruc --offline` passes along, or `$HTRUC_OFFLINE` set), a schema which is
+neither stored nor bundled raises `SchemaUnavailable` instead of being downloaded. `warm` fills the store beforehand.
+
+>>> os.path.basename(schema_path("https://htr-united.github.io/schema/2021-10-15/schema.json", offline=True))
+'2021-10-15.json'
+>>> load_schema(schema_path("2021-10-15"))["title"]
+'GroundTruthRepository'
+"""
+from typing import Any, Dict, Iterable, Optional
+from functools import lru_cache
+import json
+import os
+
+from htruc.schemas import UpgradeOrder
+
+
+Bundled: str = os.path.dirname(os.path.abspath(__file__))
+SchemaURL: str = "https://htr-united.github.io/schema/{version}/schema.json"
+
+
+class SchemaUnavailable(LookupError):
+    """ A schema is neither stored nor bundled, and cannot be downloaded in offline mode """
+
+
+def store_directory() -> str:
+    """ Directory of the user store, which is not created until a schema is downloaded """
+    if os.environ.get("HTRUC_SCHEMA_DIR"):
+        return os.environ["HTRUC_SCHEMA_DIR"]
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache, "htruc", "schemas")
+
+
+def is_offline() -> bool:
+    return os.environ.get("HTRUC_OFFLINE", "").lower() not in ("", "0", "false", "no")
+
+
+def schema_version(version: str) -> str:
+    """ Version (date) of a schema, given either its version or its URI
+
+    >>> schema_version("https://htr-united.github.io/schema/2023-06-27/schema.json")
+    '2023-06-27'
+    """
+    if "/" in version:
+        return version.split("/")[-2]
+    return version
+
+
+def _download(version: str) -> str:
+    """ Downloads a schema into the store, checking it is a valid JSON schema before it replaces a stored one """
+    import requests
+    from jsonschema import Draft7Validator
+
+    req = requests.get(SchemaURL.format(version=version))
+    req.raise_for_status()
+    schema = req.json()
+    Draft7Validator.check_schema(schema)
+
+    directory = store_directory()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{version}.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(schema, f)
+    os.replace(f"{path}.tmp", path)
+    # The schema and the validators compiled from the previous file are stale
+    from htruc import validator
+    load_schema.cache_clear()
+    validator.get_validator.cache_clear()
+    validator.get_validator_for_uri.cache_clear()
+    return path
+
+
+def schema_path(version: str, force_download: bool = False, offline: Optional[bool] = None) -> str:
+    """ Path to the schema of version, downloading it if it is neither stored nor bundled
+
+    :param version: Version (date) of the schema, or its URI
+    :param force_download: Downloads the schema again even if it is available locally
+    :param offline: Raises SchemaUnavailable instead of downloading, defaults to `$HTRUC_OFFLINE`
+    """
+    version = schema_version(version)
+    if not force_download:
+        for directory in (store_directory(), Bundled):
+            path = os.path.join(directory, f"{version}.json")
+            if os.path.exists(path):
+                return path
+    if offline if offline is not None else is_offline():
+        raise SchemaUnavailable(
+            f"Schema {version} is not available offline, run `htruc schemas warm` with network access first"
+        )
+    return _download(version)
+
+
+@lru_cache(maxsize=32)
+def load_schema(path: str) -> Dict[str, Any]:
+    """ Parsed schema at path, once per process """
+    with open(path) as f:
+        return json.load(f)
+
+
+def warm(
+        versions: Iterable[str] = UpgradeOrder,
+        force_download: bool = False,
+        offline: Optional[bool] = None
+) -> Dict[str, Optional[str]]:
+    """ Makes every version available offline
+
+    :returns: Path of each version, None for the ones which are not available in offline mode
+    """
+    paths = {}
+    for version in versions:
+        try:
+            paths[schema_version(version)] = schema_path(version, force_download=force_download, offline=offline)
+        except SchemaUnavailable:
+            paths[schema_version(version)] = None
+    return paths
@@ -0,0 +1,149 @@
+from typing import Iterable, Tuple, Iterator, Optional, Sequence, List, Any
+import json
+import os
+import sqlite3
+
+from htruc.types import CatalogRecord
+
+
+_Schema = """
+CREATE TABLE records (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    url TEXT,
+    title TEXT,
+    format TEXT,
+    script_type TEXT,
+    not_before INTEGER,
+    not_after INTEGER,
+    record TEXT NOT NULL
+);
+CREATE TABLE languages (record_id INTEGER NOT NULL REFERENCES records(id), language TEXT NOT NULL);
+CREATE TABLE scripts (record_id INTEGER NOT NULL REFERENCES records(id), iso TEXT NOT NULL);
+CREATE TABLE volumes (record_id INTEGER NOT NULL REFERENCES records(id), metric TEXT NOT NULL, count INTEGER);
+CREATE INDEX records_url ON records(url);
+CREATE INDEX records_format ON records(format);
+CREATE INDEX records_time ON records(not_before, not_after);
+CREATE INDEX languages_language ON languages(language, record_id);
+CREATE INDEX scripts_iso ON scripts(iso, record_id);
+CREATE INDEX volumes_record ON volumes(record_id);
+"""
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _script_iso(script: Any) -> Optional[str]:
+    """ ISO code of a script, which is a plain string before the 2022-04-15 schema and an object after """
+    if isinstance(script, dict):
+        return script.get("iso")
+    return script
+
+
+def write_sqlite_catalog(records: Iterable[Tuple[str, CatalogRecord]], path: str) -> int:
+    """ Writes (key, record) pairs into a SQLite database, one record at a time, and returns the number of records
+    written. Records are normalized into `records`, `languages`, `scripts` and `volumes` tables, the complete record
+    being kept as JSON in `records.record`. The database is built next to path and replaces it once complete.
+
+    :param records: (catalog key, record) pairs
+    :param path: Path of the database
+    """
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    written = 0
+    try:
+        with connection:
+            connection.executescript(_Schema)
+            for key, record in records:
+                time = record.get("time") or {}
+                cursor = connection.execute(
+                    "INSERT INTO records (key, url, title, format, script_type, not_before, not_after, record) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, record.get("url"), record.get("title"), record.get("format"), record.get("script-type"),
+                     _as_int(time.get("notBefore")), _as_int(time.get("notAfter")),
+                     json.dumps(record, default=str))
+                )
+                record_id = cursor.lastrowid
+                connection.executemany(
+                    "INSERT INTO languages VALUES (?, ?)",
+                    [(record_id, language) for language in record.get("language") or []]
+                )
+                connection.executemany(
+                    "INSERT INTO scripts VALUES (?, ?)",
+                    [(record_id, _script_iso(script)) for script in record.get("script") or []
+                     if _script_iso(script)]
+                )
+                connection.executemany(
+                    "INSERT INTO volumes VALUES (?, ?, ?)",
+                    [(record_id, volume["metric"], _as_int(volume.get("count")))
+                     for volume in record.get("volume") or [] if volume.get("metric")]
+                )
+                written += 1
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
+    return written
+
+
+def _any_of(column: str, values: Sequence[str]) -> str:
+    return f"{column} IN ({', '.join('?' * len(values))})"
+
+
+def query_catalog(
+        path: str,
+        languages: Sequence[str] = (),
+        scripts: Sequence[str] = (),
+        formats: Sequence[str] = (),
+        script_types: Sequence[str] = (),
+        urls: Sequence[str] = (),
+        start: Optional[int] = None,
+        end: Optional[int] = None
+) -> Iterator[Tuple[str, CatalogRecord]]:
+    """ Yields the (key, record) pairs of a database written by `write_sqlite_catalog` matching every filter, in
+    key order. Several values for the same filter match any of them.
+
+    :param path: Path of the database
+    :param languages: Language codes (ISO-639)
+    :param scripts: Script codes (ISO-15924)
+    :param formats: Formats
+    :param script_types: Script types
+    :param urls: URLs of the repositories
+    :param start: Keeps records whose time span ends at or after start
+    :param end: Keeps records whose time span begins at or before end
+    """
+    conditions: List[str] = []
+    parameters: List[Any] = []
+    for column, values in (("format", formats), ("script_type", script_types), ("url", urls)):
+        if values:
+            conditions.append(_any_of(column, values))
+            parameters.extend(values)
+    if languages:
+        conditions.append(f"id IN (SELECT record_id FROM languages WHERE {_any_of('language', languages)})")
+        parameters.extend(languages)
+    if scripts:
+        conditions.append(f"id IN (SELECT record_id FROM scripts WHERE {_any_of('iso', scripts)})")
+        parameters.extend(scripts)
+    if end is not None:
+        conditions.append("not_before <= ?")
+        parameters.append(end)
+    if start is not None:
+        conditions.append("not_after >= ?")
+        parameters.append(start)
+
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = connection.execute(
+            f"SELECT key, record FROM records {'WHERE ' + ' AND '.join(conditions) if conditions else ''} "
+            f"ORDER BY key",
+            parameters
+        )
+        for key, record in rows:
+            yield key, json.loads(record)
+    finally:
+        connection.close()
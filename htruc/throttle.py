@@ -0,0 +1,69 @@
+from typing import Optional, Dict, Tuple, Iterator
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import threading
+import time
+
+
+# Host: (Number of concurrent requests, Minimal delay in seconds between two requests)
+DefaultLimits: Dict[str, Tuple[int, float]] = {
+    "api.github.com": (8, 0.0),
+    "zenodo.org": (2, 0.5),
+    "doi.org": (2, 0.5),
+}
+DefaultLimit: Tuple[int, float] = (4, 0.1)
+
+
+def get_host(url: str) -> str:
+    """ Host of a URL, as used to look up its limits
+
+    >>> get_host("https://www.zenodo.org/record/1234")
+    'zenodo.org'
+    >>> get_host("https://dx.doi.org/10.5281/zenodo.1234")
+    'doi.org'
+    """
+    host = (urlparse(url).hostname or "").lower()
+    for prefix in ("www.", "dx."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return host
+
+
+class HostThrottle:
+    """ Limits the number of concurrent requests to each host and spaces them by a politeness delay
+
+    :param limits: Mapping of host to (concurrent requests, delay in seconds), completing `DefaultLimits`
+    :param default: Limit of the hosts which are not in `limits`
+    """
+    def __init__(
+            self,
+            limits: Optional[Dict[str, Tuple[int, float]]] = None,
+            default: Tuple[int, float] = DefaultLimit
+    ):
+        self.limits: Dict[str, Tuple[int, float]] = {**DefaultLimits, **(limits or {})}
+        self.default: Tuple[int, float] = default
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+        self._next_request: Dict[str, float] = {}
+
+    def limit(self, host: str) -> Tuple[int, float]:
+        return self.limits.get(host, self.default)
+
+    def _semaphore(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.limit(host)[0])
+            return self._semaphores[host]
+
+    @contextmanager
+    def __call__(self, url: str) -> Iterator[None]:
+        """ Holds a slot of the host of url for the duration of the request """
+        host = get_host(url)
+        delay = self.limit(host)[1]
+        with self._semaphore(host):
+            if delay:
+                with self._lock:
+                    start = max(time.monotonic(), self._next_request.get(host, 0))
+                    self._next_request[host] = start + delay
+                time.sleep(max(0., start - time.monotonic()))
+            yield
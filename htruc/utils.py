@@ -1,11 +1,84 @@
-from typing import Union, TextIO, Dict, Any, List, Optional
+from typing import Union, TextIO, Dict, Any, List, Optional, Callable, Iterable, Iterator, TypeVar
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import os.path
+import queue
+import threading
 from ruamel.yaml import YAML
 from ruamel.yaml.comments import CommentedMap
-import requests
 import json
 
 
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+
+def threaded_map(function: Callable[[_T], _R], iterable: Iterable[_T], jobs: int = 1) -> Iterator[_R]:
+    """ Apply function to every item of iterable using a bounded pool of threads, results keep the input order
+
+    >>> list(threaded_map(lambda x: x * 2, [1, 2, 3], jobs=2))
+    [2, 4, 6]
+    """
+    if jobs <= 1:
+        yield from map(function, iterable)
+        return
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(function, iterable)
+
+
+def threaded_chain(function: Callable[[_T], Iterable[_R]], iterable: Iterable[_T], jobs: int = 1) -> Iterator[_R]:
+    """ Chains the iterables function returns for every item of iterable, each of them being consumed by its own
+    thread of a bounded pool. With more than one job, the threads start as soon as it is called, not when the results
+    are first asked for. Results keep the input order: those of the first item are yielded as soon as they are
+    available, while the following items are consumed in the background.
+
+    >>> list(threaded_chain(lambda x: range(x), [1, 2, 3], jobs=2))
+    [0, 0, 1, 0, 1, 2]
+    """
+    if jobs <= 1:
+        return (result for item in iterable for result in function(item))
+    done = object()
+
+    def consume(item: _T, results: queue.Queue):
+        try:
+            for result in function(item):
+                results.put((result, None))
+        except BaseException as error:
+            results.put((None, error))
+        results.put((done, None))
+
+    def drain() -> Iterator[_R]:
+        try:
+            for results in queues:
+                while True:
+                    result, error = results.get()
+                    if error is not None:
+                        raise error
+                    if result is done:
+                        break
+                    yield result
+        finally:
+            executor.shutdown(wait=True)
+
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    queues = []
+    for item in iterable:
+        queues.append(queue.Queue())
+        executor.submit(consume, item, queues[-1])
+    return drain()
+
+
+def process_map(function: Callable[[_T], _R], iterable: Iterable[_T], jobs: int = 1) -> Iterator[_R]:
+    """ Apply a picklable function to every item of iterable in a pool of worker processes, results keep the input
+    order and are yielded as soon as they are available.
+    """
+    if jobs <= 1:
+        yield from map(function, iterable)
+        return
+    items = list(iterable)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(function, items, chunksize=max(1, min(64, len(items) // (jobs * 4))))
+
+
 def _yaml_rec_sort(d):
     if isinstance(d, dict):
         res = CommentedMap()
@@ -26,11 +99,32 @@ def dump_yaml(document: Any, file: TextIO, sort_keys: bool = True):
         yaml.dump(_yaml_rec_sort(document), file)
 
 
-def parse_yaml(file: Union[str, TextIO]) -> Dict[str, Any]:
+# YAML instances are reused between calls, but cannot be shared between threads
+_Loaders = threading.local()
+
+
+def _loader(round_trip: bool) -> YAML:
+    attribute = "round_trip" if round_trip else "safe"
+    yaml = getattr(_Loaders, attribute, None)
+    if yaml is None:
+        # The safe loader uses the C parser of ruamel.yaml.clib when it is installed
+        yaml = YAML(typ=['rt', 'string']) if round_trip else YAML(typ='safe')
+        setattr(_Loaders, attribute, yaml)
+    return yaml
+
+
+def parse_yaml(file: Union[str, TextIO], round_trip: bool = False) -> Dict[str, Any]:
     """ Parse a yaml file
 
+    :param file: Path, content or opened file
+    :param round_trip: Keeps the comments, the order and the style of the document (as `CommentedMap` and
+        `CommentedSeq`) so that it can be written back as it was. Only ask for it when the document is written back:
+        by default, plain dictionaries and lists are built by the much faster safe loader.
+
     >>> parse_yaml(os.path.dirname(__file__)+'/../tests/test_data/simple_yaml.yml')
     {'test': 'yes'}
+    >>> type(parse_yaml("test: yes # Comment", round_trip=True)).__name__
+    'CommentedMap'
     """
     if isinstance(file, str):
         if os.path.isfile(file) and os.path.exists(file):
@@ -41,38 +135,36 @@ def parse_yaml(file: Union[str, TextIO]) -> Dict[str, Any]:
     else:
         content = file.read()
 
-    yaml = YAML(typ=['rt', 'string'])
-    return yaml.load(content) or {}
+    return _loader(round_trip).load(content) or {}
 
 
-def create_json_catalog(catalog: Dict[str, Dict], ids_files: Optional[str]) -> Dict[str, Dict]:
+def get_catalog_ids(keys: Iterable[str], ids_files: str) -> Dict[str, str]:
+    """ Identifiers of catalog keys, stored in ids_files: new keys get the next free identifier and the file is
+    updated
+    """
     ids = {}
     if os.path.exists(ids_files):
         with open(ids_files) as f:
             ids = json.load(f)
-    for key in catalog:
+    for key in keys:
         if key not in ids:
             ids[key] = f"repo-{str(len(ids)).zfill(5)}"
 
     with open(ids_files, "w") as f:
         json.dump(ids, f)
 
+    return ids
+
+
+def create_json_catalog(catalog: Dict[str, Dict], ids_files: Optional[str]) -> Dict[str, Dict]:
+    ids = get_catalog_ids(catalog, ids_files)
     return {
         ids[key]: catalog[key]
         for key in catalog
     }
 
 
-def get_local_or_download(version, force_download: bool = False, is_uri: bool = False):
-    if is_uri:
-        version = version.split("/")[-2]
-    basedir = os.path.dirname(__file__)
-    local_path = os.path.join(basedir, "schemas", f"{version}.json")
-    if not force_download and os.path.exists(local_path):
-        return local_path
-    else:
-        req = requests.get(f"https://htr-united.github.io/schema/{version}/schema.json")
-        req.raise_for_status()
-        with open(local_path, "w") as f:
-            f.write(req.text)
-        return local_path
+def get_local_or_download(version, force_download: bool = False, is_uri: bool = False, offline: Optional[bool] = None):
+    """ Path to a schema given its version or, with is_uri, its URI. See `htruc.schemas.store` """
+    from htruc.schemas.store import schema_path
+    return schema_path(version, force_download=force_download, offline=offline)
@@ -1,11 +1,20 @@
-from typing import Iterable, List, TextIO, Dict, Any, Optional, Union
+from typing import Iterable, Iterator, List, TextIO, Dict, Any, Optional, Union
 from dataclasses import dataclass
-import json
+from functools import lru_cache, partial
+import os
 
 from jsonschema import Draft7Validator
-from ruamel.yaml.parser import ParserError
+from ruamel.yaml import YAMLError
 
-from htruc.utils import parse_yaml, get_local_or_download
+from htruc.utils import parse_yaml, get_local_or_download, process_map
+from htruc.schemas.store import load_schema
+
+
+@dataclass
+class _Content:
+    """ Content of a file which cannot be reopened by its name, e.g. the standard input """
+    filename: str
+    content: str
 
 
 @dataclass
@@ -25,58 +34,92 @@ def _elipse(msg: str) -> str:
     return msg
 
 
+@lru_cache(maxsize=32)
+def get_validator(schema_path: str) -> Draft7Validator:
+    """ Load and compile the schema at schema_path, once per process
+
+    >>> get_validator("./htruc/schemas/2021-10-15.json") is get_validator("./htruc/schemas/2021-10-15.json")
+    True
+    """
+    return Draft7Validator(load_schema(schema_path))
+
+
+@lru_cache(maxsize=32)
+def get_validator_for_uri(schema_uri: str, offline: Optional[bool] = None) -> Draft7Validator:
+    """ Retrieve the compiled validator of a schema URI such as the `schema` key of a record, once per process
+
+    :param offline: Fails instead of downloading a missing schema, see `htruc.schemas.store.schema_path`
+    """
+    return get_validator(get_local_or_download(schema_uri, is_uri=True, offline=offline))
+
+
+def _check(
+        file: Union[TextIO, str, Dict[str, Any], _Content],
+        schema_path: str = "auto",
+        offline: Optional[bool] = None
+) -> Status:
+    """ Parse and validate a single file """
+    # Parse the file
+    if isinstance(file, dict):  # If it's preparsed
+        filename = file.get("url", "Potential invalid SCHEMA without URI")
+        parsed = file
+    else:
+        filename = file if isinstance(file, str) else file.filename if isinstance(file, _Content) else file.name
+        try:
+            parsed = parse_yaml(file.content if isinstance(file, _Content) else file)
+        except YAMLError as e:
+            return Status(filename, False, [f"Parse error: {_reformat_errors(e)}"])
+
+    if schema_path != "auto":
+        local_validator = get_validator(schema_path)
+    elif "schema" not in parsed:
+        return Status(filename, False, [f"Schema key not found."])
+    elif parsed["schema"].startswith("https://htr-united.github.io/schema/"):
+        local_validator = get_validator_for_uri(parsed["schema"], offline=offline)
+    else:
+        return Status(filename, False, [f"Wrong schema URI ({parsed['schema']})"])
+
+    if local_validator.is_valid(parsed):
+        return Status(filename, True, [])
+
+    return Status(filename, False, [
+        f"Path `{'.'.join(map(str, error.path))}`: {_elipse(error.message)}" \
+            if error.path else _elipse(error.message)
+        for error in local_validator.iter_errors(parsed)
+    ])
+
+
+def _picklable(file: Union[TextIO, str, Dict[str, Any]]) -> Union[str, Dict[str, Any], _Content]:
+    """ Opened files cannot be sent to worker processes: they are replaced by their path, or by their content when
+    they have none (e.g. the standard input) """
+    if isinstance(file, (str, dict)):
+        return file
+    if os.path.isfile(file.name):
+        return file.name
+    return _Content(file.name, file.read())
+
+
 def run(
         files: Iterable[Union[TextIO, str, Dict[str, Any]]],
-        schema_path: str = "auto"
-):
+        schema_path: str = "auto",
+        jobs: int = 1,
+        offline: Optional[bool] = None
+) -> Iterator[Status]:
     """ Run tests on a catalog
 
     :param files: List of URIs, file IO or already parsed catalog records,
     :param schema_path: Path to the schema. `auto` will download the schema from HTR-United
+    :param jobs: Number of worker processes parsing and validating the files. Statuses are yielded in the order of
+        `files` as soon as they are available.
+    :param offline: Fails instead of downloading the schemas records refer to, defaults to `$HTRUC_OFFLINE`
     :returns: A generator of 1 Status per file
 
     >>> list(run(['tests/test_data/example.yaml'], "./htruc/schemas/2021-10-15.json"))
     [Status(filename='tests/test_data/example.yaml', status=False, messages=["Path `format`: 'ALTO' is not one of ['Alto-XML', 'Page-XML']", "'schema' is a required property"])]
     """
-    validator: Optional[Draft7Validator] = None
     if schema_path != "auto":
-        with open(schema_path) as f:
-            schema = json.load(f)
-        validator = Draft7Validator(schema)
-
-    for file in files:
-        # Parse the file
-        if isinstance(file, dict):  # If it's preparsed
-            filename = file.get("url", "Potential invalid SCHEMA without URI")
-            parsed = file
-        else:
-            filename = file if isinstance(file, str) else file.name
-            try:
-                parsed = parse_yaml(file)
-            except ParserError as e:
-                yield Status(filename, False, [f"Parse error: {_reformat_errors(e)}"])
-                continue
-
-        local_validator = validator
-        if not validator:
-            if "schema" not in parsed:
-                yield Status(filename, False, [f"Schema key not found."])
-                continue
-            elif parsed["schema"].startswith("https://htr-united.github.io/schema/"):
-                local_validator = get_local_or_download(parsed["schema"], is_uri=True)
-                with open(local_validator) as f:
-                    schema = json.load(f)
-                local_validator = Draft7Validator(schema)
-            else:
-                yield Status(filename, False, [f"Wrong schema URI ({parsed['schema']})"])
-                continue
-
-        if local_validator.is_valid(parsed):
-            yield Status(filename, True, [])
-            continue
-
-        yield Status(filename, False, [
-            f"Path `{'.'.join(map(str, error.path))}`: {_elipse(error.message)}" \
-                if error.path else _elipse(error.message)
-            for error in local_validator.iter_errors(parsed)
-        ])
+        get_validator(schema_path)  # Fails early on a wrong schema path
+
+    if jobs > 1:
+        files = [_picklable(file) for file in files]
+    yield from process_map(partial(_check, schema_path=schema_path, offline=offline), files, jobs=jobs)
@@ -0,0 +1,158 @@
+""" Updates of the volume (and characters) of catalog records with the metrics computed by HUMg, for a single file or
+for batches of files
+"""
+from typing import Dict, Any, List, Tuple, Iterable, Iterator, Optional
+from dataclasses import dataclass, field
+import json
+import glob
+import os
+
+from htruc.types import CatalogRecord
+from htruc.schemas.store import schema_version
+from htruc.utils import parse_yaml, dump_yaml, process_map
+from htruc.writers import atomic_output
+
+
+MetricLists = List[Dict[str, int]]
+
+
+def update_volume(original_volume: MetricLists, metrics: MetricLists) -> Tuple[MetricLists, MetricLists]:
+    """ Compute the new metrics for a catalog, returns a difference list as a second output
+
+    >>> old = [{"metric": "pages", "count": 5}, {"metric": "documents", "count": 5}]
+    >>> new = [{"metric": "pages", "count": 10}, {"metric": "line", "count": 105}]
+    >>> out = update_volume(old, new)
+    >>> out == (
+    ...    [{"metric": "documents", "count": 5}, {"metric": "line", "count": 105}, {"metric": "pages", "count": 10}],
+    ...    [{"metric": "pages", "count": 5}],
+    ... )
+    True
+
+    """
+    old = {vol["metric"]: vol["count"] for vol in original_volume}
+    new = {vol["metric"]: vol["count"] for vol in metrics}
+    all_keys = sorted(list(set(old.keys()).union(set(new.keys()))))
+    diff = {key: new.get(key) - old.get(key) for key in all_keys if key in old and key in new}
+    return (
+        [{"metric": key, "count": new.get(key, old.get(key))} for key in all_keys],
+        [{"metric": key, "count": diff.get(key)} for key in diff]
+    )
+
+
+def update_record_volume(record: CatalogRecord, metrics: Dict[str, Any]) -> MetricLists:
+    """ Updates the volume of record, and merges its characters, with metrics in place. Returns the difference of
+    each metric present before and after.
+
+    >>> record = {"schema": "https://htr-united.github.io/schema/2023-06-27/schema.json",
+    ...           "volume": [{"metric": "lines", "count": 10}]}
+    >>> update_record_volume(record, {"volume": [{"metric": "lines", "count": 12}], "characters": {"a": 3}})
+    [{'metric': 'lines', 'count': 2}]
+    >>> record["characters"]
+    {'a': 3}
+
+    Records of the 2021-10-15 schema have no characters:
+
+    >>> record = {"schema": "https://htr-united.github.io/schema/2021-10-15/schema.json", "volume": []}
+    >>> update_record_volume(record, {"volume": [{"metric": "lines", "count": 12}], "characters": {"a": 3}})
+    []
+    >>> "characters" in record
+    False
+    """
+    record["volume"], difference = update_volume(record.get("volume", []), metrics["volume"])
+    if schema_version(record.get("schema", "")) != "2021-10-15" and "characters" in metrics:
+        if "characters" not in record:
+            record["characters"] = {}
+        record["characters"].update(metrics["characters"])
+    return difference
+
+
+def auto_update_path(catalog_file: str) -> str:
+    """ File where the update of catalog_file is written when it is not updated in place
+
+    >>> auto_update_path("data/record.yml")
+    'data/record.auto-update.yml'
+    """
+    filename = catalog_file.split(".")
+    return ".".join([*filename[:-1], "auto-update", filename[-1]])
+
+
+def write_record(record: CatalogRecord, path: str):
+    """ Writes record atomically: the file is either left untouched or fully replaced """
+    with atomic_output(path) as f:
+        dump_yaml(record, f, sort_keys=False)
+
+
+@dataclass
+class VolumeUpdate:
+    """ Result of the update of a catalog file, the error being set instead of the difference if it failed """
+    catalog: str
+    metrics: str
+    output: str
+    difference: MetricLists = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def _update_file(task: Tuple[str, str, str]) -> VolumeUpdate:
+    catalog, metrics, output = task
+    try:
+        record = parse_yaml(catalog, round_trip=True)
+        with open(metrics) as f:
+            difference = update_record_volume(record, json.load(f))
+        write_record(record, output)
+    except Exception as error:
+        return VolumeUpdate(catalog, metrics, output, error=f"{type(error).__name__}: {error}")
+    return VolumeUpdate(catalog, metrics, output, difference=difference)
+
+
+def find_pairs(source: str) -> List[Tuple[str, str]]:
+    """ (catalog file, metrics JSON) pairs to update
+
+    :param source: Either a directory, where each `<name>.yml` (or `.yaml`) is paired with the `<name>.json` next to
+        it, or a JSON manifest listing `{"catalog": path, "metrics": path}` objects, whose relative paths start from the
+        manifest's directory
+    """
+    if os.path.isdir(source):
+        pairs = []
+        for catalog in sorted(glob.glob(os.path.join(source, "**", "*.y*ml"), recursive=True)):
+            stem, extension = os.path.splitext(catalog)
+            if extension not in (".yml", ".yaml") or stem.endswith(".auto-update"):
+                continue
+            if os.path.exists(f"{stem}.json"):
+                pairs.append((catalog, f"{stem}.json"))
+        return pairs
+    with open(source) as f:
+        manifest = json.load(f)
+    base = os.path.dirname(source)
+    return [(os.path.join(base, entry["catalog"]), os.path.join(base, entry["metrics"])) for entry in manifest]
+
+
+def update_volumes(pairs: Iterable[Tuple[str, str]], inplace: bool = False, jobs: int = 1) -> Iterator[VolumeUpdate]:
+    """ Updates the volumes of many catalog files with their metrics, in the order of pairs
+
+    :param pairs: (catalog file, metrics JSON) pairs, see `find_pairs`
+    :param inplace: Overwrites the catalog files instead of writing `auto_update_path(catalog)`
+    :param jobs: Number of worker processes
+    """
+    tasks = [(catalog, metrics, catalog if inplace else auto_update_path(catalog)) for catalog, metrics in pairs]
+    yield from process_map(_update_file, tasks, jobs=jobs)
+
+
+def combine_differences(updates: Iterable[VolumeUpdate]) -> Dict[str, Dict[str, int]]:
+    """ Total increase and decrease of each metric over several updates, with the number of files where it changed
+
+    >>> combine_differences([
+    ...     VolumeUpdate("a.yml", "a.json", "a.yml", [{"metric": "lines", "count": 5}]),
+    ...     VolumeUpdate("b.yml", "b.json", "b.yml", [{"metric": "lines", "count": -2},
+    ...                                               {"metric": "pages", "count": 0}])
+    ... ])
+    {'lines': {'increase': 5, 'decrease': 2, 'files': 2}}
+    """
+    combined: Dict[str, Dict[str, int]] = {}
+    for update in updates:
+        for metric in update.difference:
+            if not metric["count"]:
+                continue
+            total = combined.setdefault(metric["metric"], {"increase": 0, "decrease": 0, "files": 0})
+            total["increase" if metric["count"] > 0 else "decrease"] += abs(metric["count"])
+            total["files"] += 1
+    return combined
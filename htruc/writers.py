@@ -0,0 +1,77 @@
+from typing import Iterable, Iterator, Tuple, TextIO, Optional
+from contextlib import contextmanager
+import gzip
+import json
+import os
+
+from ruamel.yaml import YAML
+
+from htruc.types import CatalogRecord
+from htruc.utils import _yaml_rec_sort
+
+
+def open_output(path: str, compress: Optional[bool] = None) -> TextIO:
+    """ Opens a text file for writing, gzip compressed if compress is True or, by default, if path ends with .gz
+
+    :param path: Path of the file
+    :param compress: Forces or disables compression, None decides from the file extension
+    """
+    if compress is None:
+        compress = path.endswith(".gz")
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w")
+
+
+@contextmanager
+def atomic_output(path: str, compress: Optional[bool] = None) -> Iterator[TextIO]:
+    """ Opens a temporary file next to path (See `open_output`) which replaces path once the block succeeded. If the
+    block fails, path is left untouched. """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open_output(tmp_path, compress=path.endswith(".gz") if compress is None else compress) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_yaml_catalog(records: Iterable[CatalogRecord], file: TextIO, sort_keys: bool = True) -> int:
+    """ Writes records as a YAML sequence, one record at a time, and returns the number of records written
+
+    Only the record being written is copied (to sort its keys): the output is the same as dumping the whole list at
+    once, without building it.
+
+    :param records: Records to write, any iterable
+    :param file: Output file
+    :param sort_keys: Sorts the keys of each record recursively
+    """
+    yaml = YAML()
+    written = 0
+    for record in records:
+        yaml.dump([_yaml_rec_sort(record) if sort_keys else record], file)
+        written += 1
+    if not written:
+        yaml.dump([], file)
+    return written
+
+
+def write_json_catalog(records: Iterable[Tuple[str, CatalogRecord]], file: TextIO) -> int:
+    """ Writes (identifier, record) pairs as a JSON object, one record at a time, and returns the number of records
+    written. The output is the same as `json.dump` on the whole dictionary.
+
+    :param records: (identifier, record) pairs, see `get_catalog_ids` for identifiers
+    :param file: Output file
+    """
+    written = 0
+    file.write("{")
+    for identifier, record in records:
+        if written:
+            file.write(", ")
+        file.write(json.dumps(identifier))
+        file.write(": ")
+        file.write(json.dumps(record))
+        written += 1
+    file.write("}")
+    return written
@@ -106,8 +106,8 @@ setup(
     python_requires=REQUIRES_PYTHON,
     url=URL,
     # If your package is a single module, use this instead of 'packages':
-    packages=find_packages(exclude=["tests"]),
-    package_data={'htruc': ['tests/*.json']},
+    packages=find_packages(exclude=["tests", "benchmarks"]),
+    package_data={'htruc': ['tests/*.json', 'schemas/*.json']},
     include_package_data=True,
     entry_points={
         'console_scripts': ['htruc=htruc.cli:cli'],
@@ -0,0 +1,79 @@
+from unittest import TestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import tempfile
+import threading
+import os
+
+from htruc.cache import HTTPCache, cached_get
+from htruc.metrics import BuildMetrics
+
+
+class _ETagHandler(BaseHTTPRequestHandler):
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append((self.path, self.headers.get("If-None-Match")))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = f"content of {self.path}".encode()
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTPCache(TestCase):
+    def setUp(self) -> None:
+        _ETagHandler.requests_seen = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ETagHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def test_revalidation(self):
+        """[Cache] Tests that a second fetch revalidates with If-None-Match and reuses the stored body"""
+        cache = HTTPCache(self.directory.name)
+        first = cache.fetch(f"{self.url}/htr-united.yml")
+        self.assertEqual(first.text, "content of /htr-united.yml")
+        self.assertFalse(first.from_cache)
+
+        second = HTTPCache(self.directory.name).fetch(f"{self.url}/htr-united.yml")
+        self.assertEqual(second.text, "content of /htr-united.yml")
+        self.assertTrue(second.from_cache)
+        self.assertEqual(_ETagHandler.requests_seen, [("/htr-united.yml", None), ("/htr-united.yml", '"v1"')])
+
+    def test_ttl(self):
+        """[Cache] Tests that fresh entries are served without any request"""
+        cache = HTTPCache(self.directory.name, ttl=3600)
+        cache.fetch(f"{self.url}/a")
+        self.assertTrue(cache.fetch(f"{self.url}/a").from_cache)
+        self.assertEqual(len(_ETagHandler.requests_seen), 1)
+
+    def test_eviction(self):
+        """[Cache] Tests that the cache stays under its maximum size"""
+        cache = HTTPCache(self.directory.name, max_size=1000)
+        for i in range(20):
+            cache.fetch(f"{self.url}/{i}")
+        size = sum(os.path.getsize(os.path.join(self.directory.name, f)) for f in os.listdir(self.directory.name))
+        self.assertLessEqual(size, 1000)
+
+    def test_metrics(self):
+        """[Cache] Tests that requests, bytes and cache hits are recorded per host"""
+        metrics = BuildMetrics()
+        cache = HTTPCache(self.directory.name)
+        cached_get(f"{self.url}/a", cache=cache, metrics=metrics)
+        cached_get(f"{self.url}/a", cache=cache, metrics=metrics)
+        cached_get(f"{self.url}/b", metrics=metrics)
+        self.assertEqual(metrics.to_dict()["hosts"]["127.0.0.1"],
+                         {"requests": 3, "bytes": 2 * len("content of /a"), "cache_hits": 1, "errors": 0})
@@ -0,0 +1,212 @@
+from unittest import TestCase, mock
+from dataclasses import dataclass
+from typing import Optional
+import datetime
+import os
+import tempfile
+import threading
+
+from htruc import catalog
+from htruc.manifest import BuildManifest
+from htruc.pipeline import Pipeline
+from htruc.repos import RateLimitScheduler, _scheduler
+
+
+@dataclass
+class _Listed:
+    """ Repository as listed by the REST API """
+    name: str
+    full_name: str
+    pushed_at: Optional[datetime.datetime] = None
+
+
+class TestLocalSources(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.files = []
+        for number in range(12):
+            self.files.append(self._write(
+                f"record-{number:02}.yml",
+                f"title: Record {number}\nurl: https://github.com/htr-united/record-{number}\n"
+            ))
+        self.broken = self._write("record-05-broken.yml", "title: [Broken\nurl: nowhere\n")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _write(self, filename: str, content: str) -> str:
+        path = os.path.join(self.directory.name, filename)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def load(self, jobs: int):
+        with self.assertLogs(level="WARNING") as logs:
+            sources = catalog._load_local_sources(self.directory.name, BuildManifest(), jobs=jobs)
+        return sources, logs.output
+
+    def test_order(self):
+        """[Local sources] Tests that records come in path order whatever the number of jobs"""
+        sequential, _ = self.load(jobs=1)
+        parallel, _ = self.load(jobs=3)
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(
+            [record["title"] for _, record in parallel],
+            [f"Record {number}" for number in range(12)]
+        )
+        self.assertEqual(
+            [token.split("@")[0] for token, _ in parallel],
+            [f"local:{path}" for path in self.files]
+        )
+
+    def test_parse_error(self):
+        """[Local sources] Tests that a file which cannot be parsed is reported and skipped"""
+        for jobs in (1, 3):
+            sources, logs = self.load(jobs=jobs)
+            self.assertEqual(len(sources), 12)
+            self.assertNotIn(f"local:{self.broken}", [token.split("@")[0] for token, _ in sources])
+            self.assertEqual(len(logs), 1)
+            self.assertIn("record-05-broken.yml", logs[0])
+
+
+class TestOrganizations(TestCase):
+    """ The per-organization scan is stubbed: each organization finishes once the one before it in `finish` did """
+    Sources = {
+        "orga-a": [("remote:a@1", "orga-a/shared", {"url": "https://github.com/orga-a/shared", "volume": [2]})],
+        "orga-b": None,  # Fails
+        "orga-c": [("remote:c@1", "orga-c/own", {"url": "https://github.com/orga-c/own", "volume": [3]})],
+        "orga-d": [("remote:d@1", "orga-d/own", {"url": "https://github.com/orga-d/own", "volume": [4]})],
+    }
+
+    def build(self, finish):
+        done = {orga: threading.Event() for orga in finish}
+        previous = dict(zip(finish[1:], finish))
+
+        def load(organization, manifest, **kwargs):
+            if organization in previous:
+                self.assertTrue(done[previous[organization]].wait(timeout=5))
+            done[organization].set()
+            if self.Sources[organization] is None:
+                raise ConnectionError("Github is down")
+            return [(token, key, dict(record)) for token, key, record in self.Sources[organization]]
+
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(catalog, "_iter_remote_sources", load), \
+                self.assertLogs(level="ERROR") as logs:
+            with open(os.path.join(directory, "shared.yml"), "w") as f:
+                f.write("url: https://github.com/ORGA-A/shared\ntitle: Shared\nvolume: [1]\n")
+            out = catalog.get_all_catalogs(
+                local_directory=directory, organizations=list(self.Sources), keep_valid_only=False, jobs=4
+            )
+        return out, logs.output
+
+    def test_finish_order(self):
+        """[Organizations] Tests that the catalog does not depend on the order organizations are scanned in"""
+        expected, _ = self.build(["orga-a", "orga-b", "orga-c", "orga-d"])
+        self.assertEqual(expected, {
+            "https://github.com/ORGA-A/shared": {"url": "https://github.com/ORGA-A/shared", "title": "Shared",
+                                                 "volume": [2]},
+            "orga-c/own": {"url": "https://github.com/orga-c/own", "volume": [3]},
+            "orga-d/own": {"url": "https://github.com/orga-d/own", "volume": [4]}
+        })
+        for finish in (["orga-d", "orga-c", "orga-b", "orga-a"], ["orga-c", "orga-a", "orga-d", "orga-b"]):
+            out, _ = self.build(finish)
+            self.assertEqual(list(out.items()), list(expected.items()))
+
+    def test_failure(self):
+        """[Organizations] Tests that an organization which cannot be scanned is reported without losing the others"""
+        out, logs = self.build(["orga-b", "orga-d", "orga-a", "orga-c"])
+        self.assertEqual(len(out), 3)
+        self.assertEqual(len(logs), 1)
+        self.assertIn("orga-b", logs[0])
+        self.assertIn("Github is down", logs[0])
+
+
+class TestStreaming(TestCase):
+    def test_overlap(self):
+        """[Streaming] Tests that records are validated while the organization is still being fetched"""
+        validated = threading.Event()
+
+        def load(organization, manifest, **kwargs):
+            yield "remote:first@1", "orga-a/first", {"url": "https://github.com/orga-a/first"}
+            # The scan only goes on once the first record went through validation
+            self.assertTrue(validated.wait(timeout=5))
+            yield "remote:second@1", "orga-a/second", {"url": "https://github.com/orga-a/second"}
+
+        def validate(records, **kwargs):
+            validated.set()
+            return records
+
+        with mock.patch.object(catalog, "_iter_remote_sources", load), \
+                mock.patch.object(catalog, "_clean_a_dict", validate):
+            out = catalog.get_all_catalogs(organizations="orga-a")
+        self.assertEqual(list(out), ["orga-a/first", "orga-a/second"])
+
+
+class TestClient(TestCase):
+    def test_shared(self):
+        """[Client] Tests that every Github call of a build goes through a single pooled client"""
+        clients = []
+        created = []
+        get_client = _scheduler.get_client
+
+        def create(*args, **kwargs):
+            created.append(kwargs)
+            return get_client(*args, **kwargs)
+
+        def listing(main_organization, client=None, **kwargs):
+            clients.append(client)
+            return [_Listed("remote", f"{main_organization}/remote")]
+
+        def fetching(repos, client=None, **kwargs):
+            clients.append(client)
+            for repo in repos:
+                yield repo.full_name, {"url": f"https://github.com/{repo.full_name}"}
+
+        def fetching_link(address, client=None, **kwargs):
+            clients.append(client)
+            return {"url": address}
+
+        def citing(url, client=None, **kwargs):
+            clients.append(client)
+            return None
+
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(_scheduler, "get_client", create), \
+                mock.patch.object(catalog, "list_htr_united_repos", listing), \
+                mock.patch.object(catalog, "iter_htr_united_repos", fetching), \
+                mock.patch.object(catalog, "get_github_repo_yaml", fetching_link), \
+                mock.patch.object(catalog, "get_github_repo_cff", citing):
+            with open(os.path.join(directory, "local.yml"), "w") as f:
+                f.write("url: https://github.com/htr-united/local\n")
+            out = catalog.get_all_catalogs(
+                local_directory=directory, organizations=["orga-a", "orga-b"], check_link=True,
+                keep_valid_only=False, citation_cff=True, jobs=4
+            )
+
+        self.assertEqual(len(out), 3)
+        # Two listings, two fetches, one link and three citations
+        self.assertEqual(len(clients), 8)
+        self.assertEqual(len({id(client) for client in clients}), 1)
+        self.assertIsInstance(clients[0], RateLimitScheduler)
+        self.assertEqual(len(created), 1)
+        self.assertGreaterEqual(created[0]["pool_size"], 4)
+
+
+class TestCitations(TestCase):
+    def test_without_url(self):
+        """[Citations] Tests that records without URL go through the citation stage without lookup"""
+        looked_up = []
+
+        def lookup(record, **kwargs):
+            looked_up.append(record["url"])
+            return {"_bibtex": record["url"]}
+
+        records = [("no-url", {"title": "No URL"}), ("github", {"url": "https://github.com/htr-united/a"})]
+        with mock.patch.object(catalog, "_get_bibtex_and_apa", lookup):
+            out = dict(Pipeline(catalog._citation_stage()).run(records))
+        self.assertEqual(out, {
+            "no-url": {"title": "No URL"},
+            "github": {"url": "https://github.com/htr-united/a", "_bibtex": "https://github.com/htr-united/a"}
+        })
+        self.assertEqual(looked_up, ["https://github.com/htr-united/a"])
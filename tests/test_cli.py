@@ -1,6 +1,7 @@
 from unittest import TestCase
 from ruamel.yaml import YAML
 import json
+import os
 from click.testing import CliRunner
 
 
@@ -19,6 +20,46 @@ class TestCLI(TestCase):
     def invoke(self, *args, **kwargs):
         return self.runner.invoke(cli, *args, **kwargs)
 
+    def test_jobs(self):
+        """[CLI] Tests that test reports the files in the same order and with the same exit code whatever the jobs"""
+        files = ["tests/test_data/cremma-medieval.yml", "tests/test_data/example.yaml",
+                 "tests/test_data/simple_yaml.yml", "tests/test_data/cremma-medieval.yml"]
+        sequential = self.invoke(["test", "--version", "2021-10-15", "-j", "1", *files])
+        parallel = self.invoke(["test", "--version", "2021-10-15", "-j", "2", *files])
+        self.assertNotEqual(sequential.exit_code, 0)
+        self.assertEqual(parallel.exit_code, sequential.exit_code)
+        self.assertEqual(parallel.output, sequential.output)
+        self.assertLess(
+            sequential.output.index("File `tests/test_data/example.yaml`"),
+            sequential.output.index("File `tests/test_data/simple_yaml.yml`")
+        )
+        self.assertIn("50.00% of schema passed (2/4)", parallel.output)
+
+    def test_stdin(self):
+        """[CLI] Tests that test reads `-` from the standard input, sequentially or not"""
+        with open("tests/test_data/cremma-medieval.yml") as f:
+            content = f.read()
+        for jobs in ("1", "2"):
+            rs = self.invoke(["test", "--version", "2021-10-15", "-j", jobs, "-", "tests/test_data/example.yaml"],
+                             input=content)
+            self.assertIn("50.00% of schema passed (1/2)", rs.output)
+            self.assertNotIn("<stdin>", rs.output)
+
+    def test_yaml_errors(self):
+        """[CLI] Tests that test reports the files YAML cannot scan or construct and goes on with the others"""
+        valid = os.path.abspath("tests/test_data/cremma-medieval.yml")
+        with self.runner.isolated_filesystem():
+            with open("scanner.yml", "w") as f:
+                f.write('title: "Unclosed\nurl: @\n')
+            with open("constructor.yml", "w") as f:
+                f.write("title: !unknown Tag\n")
+            rs = self.invoke(["test", "--version", "2021-10-15", "scanner.yml", "constructor.yml", valid])
+        self.assertIsInstance(rs.exception, SystemExit)
+        self.assertNotEqual(rs.exit_code, 0)
+        self.assertIn("☒ File `scanner.yml` testing failed", rs.output)
+        self.assertIn("☒ File `constructor.yml` testing failed", rs.output)
+        self.assertIn("33.33% of schema passed (1/3)", rs.output)
+
     def test_update_volume(self):
         """[CLI] Tests that update volume does the right thing"""
         rs = self.invoke(
@@ -57,3 +98,77 @@ class TestCLI(TestCase):
                 _sort_metrics([{'metric': 'characters', 'count': 481735}, {'metric': 'files', 'count': 30},
                  {'metric': 'lines', 'count': 19000}, {'metric': 'regions', 'count': 1785}])
             )
+
+    def test_update_characters(self):
+        """[CLI] Tests that update volume merges the characters of records, except for the 2021-10-15 schema"""
+        with self.runner.isolated_filesystem():
+            for version in ("2021-10-15", "2023-06-27"):
+                with open(f"{version}.yml", "w") as f:
+                    f.write(f"schema: https://htr-united.github.io/schema/{version}/schema.json\n"
+                            "volume:\n  - metric: lines\n    count: 10\n")
+            with open("metrics.json", "w") as f:
+                json.dump({"volume": [{"metric": "lines", "count": 12}], "characters": {"a": 3}}, f)
+
+            for version, characters in (("2021-10-15", None), ("2023-06-27", {"a": 3})):
+                rs = self.invoke(["update-volumes", f"{version}.yml", "metrics.json", "--inplace"])
+                self.assertEqual(rs.exit_code, 0, rs.output)
+                self.assertEqual(parse_yaml(f"{version}.yml").get("characters"), characters)
+
+    def test_upgrade(self):
+        """[CLI] Tests that upgrade details the changes made to each file"""
+        with open("tests/test_data/cremma-medieval.yml") as f:
+            content = f.read()
+        with self.runner.isolated_filesystem():
+            with open("record.yml", "w") as f:
+                f.write(content)
+            rs = self.invoke(["upgrade", "record.yml"])
+            self.assertEqual(rs.exit_code, 0)
+            self.assertIn("Upgrading from 2021-10-15 to 2022-04-15", rs.output)
+            self.assertIn("Upgrading from 2022-04-15 to 2023-06-27", rs.output)
+            self.assertEqual(parse_yaml("record.yml")["schema"],
+                             "https://htr-united.github.io/schema/2023-06-27/schema.json")
+
+    def test_update_volumes_batch(self):
+        """[CLI] Tests that update-volumes-batch updates every pair of files and reports the combined changes"""
+        with open("tests/test_data/cremma-medieval.yml") as f:
+            content = f.read()
+        with self.runner.isolated_filesystem():
+            os.makedirs("records/nested")
+            for name in ("records/first", "records/nested/second"):
+                with open(f"{name}.yml", "w") as f:
+                    f.write(content)
+                with open(f"{name}.json", "w") as f:
+                    json.dump({"volume": [{"metric": "lines", "count": 18400},
+                                          {"metric": "regions", "count": 1790}]}, f)
+            with open("records/broken.yml", "w") as f:
+                f.write(content)
+            with open("records/broken.json", "w") as f:
+                f.write("{")
+            with open("records/unpaired.yml", "w") as f:
+                f.write(content)
+
+            rs = self.invoke(["update-volumes-batch", "records", "--inplace", "-j", "2"])
+            self.assertNotEqual(rs.exit_code, 0)
+            self.assertIn("☒ File `records/broken.yml` could not be updated", rs.output)
+            self.assertIn("2 files updated, 1 failed", rs.output)
+            self.assertIn("> The category `lines` increased by 30", rs.output)
+            self.assertIn("> The category `regions` decreased by 10", rs.output)
+            for name in ("records/first", "records/nested/second"):
+                self.assertEqual(
+                    _sort_metrics(parse_yaml(f"{name}.yml")["volume"]),
+                    [{'metric': 'characters', 'count': 481735}, {'metric': 'lines', 'count': 18400},
+                     {'metric': 'regions', 'count': 1790}]
+                )
+            # Failed updates leave their file untouched, and no temporary file behind
+            with open("records/broken.yml") as f:
+                self.assertEqual(f.read(), content)
+            self.assertEqual(sorted(os.listdir("records")),
+                             ["broken.json", "broken.yml", "first.json", "first.yml", "nested", "unpaired.yml"])
+
+            with open("manifest.json", "w") as f:
+                json.dump([{"catalog": "records/unpaired.yml", "metrics": "records/first.json"}], f)
+            rs = self.invoke(["update-volumes-batch", "manifest.json"])
+            self.assertEqual(rs.exit_code, 0)
+            self.assertIn("1 files updated, 0 failed", rs.output)
+            self.assertEqual(parse_yaml("records/unpaired.auto-update.yml")["volume"][1],
+                             {'metric': 'lines', 'count': 18400})
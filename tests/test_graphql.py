@@ -0,0 +1,76 @@
+from unittest import TestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+from htruc.repos import RateLimitScheduler, get_htr_united_repos, get_github_repo_cff
+
+
+def _node(name, catalog=None, cff=None):
+    return {
+        "name": name, "nameWithOwner": f"htr-united/{name}", "url": f"https://github.com/htr-united/{name}",
+        "pushedAt": "2023-06-27T10:00:00Z",
+        "catalog": {"text": catalog} if catalog else None,
+        "cff0": None, "cff1": {"text": cff} if cff else None, "cff2": None
+    }
+
+
+class _StubGraphQL(BaseHTTPRequestHandler):
+    """ Stub GraphQL endpoint serving an organization over two pages """
+    queries = []
+    paths = []
+
+    def do_POST(self):
+        query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.queries.append(query["variables"])
+        self.paths.append(self.path)
+        with open("tests/test_data/cremma-medieval.yml") as f:
+            catalog = f.read()
+        if query["variables"]["cursor"] is None:
+            nodes, page_info = [_node("cremma-medieval", catalog, "cff-version: 1.2.0"), _node("htr-united")], \
+                {"hasNextPage": True, "endCursor": "page-2"}
+        else:
+            nodes, page_info = [_node("no-catalog")], {"hasNextPage": False, "endCursor": None}
+        body = json.dumps({"data": {"organization": {"repositories": {"pageInfo": page_info, "nodes": nodes}}}})
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class TestGraphQL(TestCase):
+    def setUp(self) -> None:
+        _StubGraphQL.queries, _StubGraphQL.paths = [], []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubGraphQL)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = RateLimitScheduler(["token"], base_url=f"http://127.0.0.1:{self.server.server_port}")
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_organization(self):
+        """[GraphQL] Tests that catalogs and citation files of an organization are retrieved through paged queries"""
+        citations = {}
+        repos = get_htr_united_repos(main_organization="htr-united", exclude=["htr-united"], client=self.client,
+                                     backend="graphql", citations=citations)
+        self.assertEqual(list(repos), ["htr-united/cremma-medieval"])
+        self.assertEqual(repos["htr-united/cremma-medieval"]["title"], "Cremma Medieval")
+        self.assertEqual([query["cursor"] for query in _StubGraphQL.queries], [None, "page-2"])
+        self.assertEqual(
+            get_github_repo_cff("https://github.com/HTR-United/cremma-medieval", client=self.client,
+                                prefetched=citations),
+            "cff-version: 1.2.0"
+        )
+        self.assertEqual(len(_StubGraphQL.queries), 2)
+
+    def test_enterprise(self):
+        """[GraphQL] Tests that queries go to the GraphQL endpoint derived from the base URL of the client"""
+        client = RateLimitScheduler(["token"], base_url=f"http://127.0.0.1:{self.server.server_port}/api/v3")
+        get_htr_united_repos(main_organization="htr-united", client=client, backend="graphql")
+        self.assertEqual(_StubGraphQL.paths, ["/api/graphql", "/api/graphql"])
+        get_htr_united_repos(main_organization="htr-united", client=self.client, backend="graphql")
+        self.assertEqual(_StubGraphQL.paths[2:], ["/graphql", "/graphql"])
@@ -0,0 +1,85 @@
+from unittest import TestCase, mock
+from dataclasses import dataclass
+from typing import Optional
+import datetime
+import os
+import shutil
+import subprocess
+import tempfile
+
+from htruc import catalog
+from htruc.catalog import get_all_catalogs
+from htruc.identity import repository_identity
+from htruc.metrics import BuildMetrics
+
+
+@dataclass
+class _Listed:
+    name: str
+    full_name: str
+    clone_url: str
+    pushed_at: Optional[datetime.datetime] = None
+
+
+def _git(*args, cwd=None):
+    subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd, check=True, capture_output=True
+    )
+
+
+class TestRepositoryIdentity(TestCase):
+    def test_spellings(self):
+        """[Identity] Tests that the spellings of a same Github repository share their identity"""
+        spellings = [
+            "https://github.com/HTR-United/cremma-medieval", "http://github.com/htr-united/cremma-medieval/",
+            "https://www.github.com/htr-united/Cremma-Medieval.git", "github.com/htr-united/cremma-medieval",
+            "git@github.com:HTR-United/cremma-medieval.git", "HTR-United/cremma-medieval",
+            "https://user@github.com/htr-united/cremma-medieval#readme"
+        ]
+        self.assertEqual({repository_identity(spelling) for spelling in spellings},
+                         {"github.com/htr-united/cremma-medieval"})
+        self.assertNotEqual(repository_identity("https://gitlab.com/Owner/Repo"),
+                            repository_identity("https://gitlab.com/owner/repo"))
+
+    def test_build(self):
+        """[Identity] Tests that a repository found locally, under another spelling and in two organizations is
+        fetched once and kept once"""
+        with tempfile.TemporaryDirectory() as directory:
+            records = os.path.join(directory, "records")
+            os.makedirs(records)
+            shutil.copy("tests/test_data/cremma-medieval.yml", records)
+            with open("tests/test_data/cremma-medieval.yml") as f:
+                content = f.read()
+            with open(os.path.join(records, "other-spelling.yml"), "w") as f:
+                f.write(content.replace("https://github.com/HTR-United/cremma-medieval",
+                                        "https://github.com/htr-united/cremma-medieval.git/"))
+
+            # The remote repository has updated metrics
+            origin, work = os.path.join(directory, "origin.git"), os.path.join(directory, "work")
+            _git("init", "--quiet", "--bare", "--initial-branch=main", origin)
+            _git("clone", "--quiet", origin, work)
+            with open(os.path.join(work, "htr-united.yml"), "w") as f:
+                f.write(content.replace("{count: 18385, metric: \"lines\"}", "{count: 20000, metric: \"lines\"}"))
+            _git("add", ".", cwd=work)
+            _git("commit", "--quiet", "-m", "Metrics", cwd=work)
+            _git("push", "--quiet", "origin", "main", cwd=work)
+
+            listed = {
+                "htr-united": [_Listed("cremma-medieval", "HTR-United/cremma-medieval", f"file://{origin}")],
+                "other": [_Listed("cremma-medieval", "htr-united/Cremma-Medieval", f"file://{origin}")]
+            }
+            metrics = BuildMetrics()
+            with mock.patch.object(catalog, "list_htr_united_repos",
+                                   lambda main_organization, **kwargs: listed[main_organization.lower()]):
+                out = get_all_catalogs(
+                    local_directory=records, organizations=("htr-united", "other", "HTR-United"),
+                    remote_backend="git", mirror_directory=os.path.join(directory, "mirrors"), metrics=metrics
+                )
+
+        self.assertEqual(list(out), ["https://github.com/HTR-United/cremma-medieval"])
+        lines = [volume["count"] for volume in out["https://github.com/HTR-United/cremma-medieval"]["volume"]
+                 if volume["metric"] == "lines"]
+        self.assertEqual(lines, [20000])
+        self.assertEqual(metrics.counters["mirrors.cloned"], 1)
+        self.assertEqual(metrics.counters["records.processed"], 1)
@@ -0,0 +1,58 @@
+from unittest import TestCase
+from click.testing import CliRunner
+import json
+import random
+
+from htruc.cli import cli
+from htruc.index import CatalogIndex, IntervalTree
+
+
+class TestCatalogIndex(TestCase):
+    def test_interval_tree(self):
+        """[Index] Tests that the interval tree finds the same overlaps as a linear scan"""
+        rng = random.Random(42)
+        intervals = []
+        for position in range(500):
+            start = rng.randint(800, 1900)
+            intervals.append((f"r{position}", start, start + rng.randint(0, 200)))
+        tree = IntervalTree(intervals)
+        for _ in range(200):
+            start = rng.randint(700, 2000)
+            end = start + rng.randint(0, 300)
+            self.assertEqual(
+                sorted(tree.overlapping(start, end)),
+                sorted(key for key, first, last in intervals if first <= end and last >= start)
+            )
+
+    def test_combined_search(self):
+        """[Index] Tests that filters are combined, and that the index is exposed by htruc search"""
+        catalog = {
+            f"https://github.com/htr-united/repo-{position}": {
+                "url": f"https://github.com/htr-united/repo-{position}",
+                "title": f"Repo {position}",
+                "language": [["fro", "lat", "fra"][position % 3]],
+                "script": [{"iso": "Latn"} if position % 2 else {"iso": "Grek"}],
+                "format": "Page-XML" if position % 5 else "Alto-XML",
+                "license": [{"name": "CC-BY 4.0", "url": "https://creativecommons.org/licenses/by/4.0/"}],
+                "time": {"notBefore": 1000 + position * 10, "notAfter": 1050 + position * 10}
+            }
+            for position in range(60)
+        }
+        index = CatalogIndex(catalog)
+        expected = sorted(
+            key for key, record in catalog.items()
+            if record["script"][0]["iso"] == "Latn" and record["format"] == "Page-XML"
+            and record["time"]["notBefore"] <= 1400 and record["time"]["notAfter"] >= 1200
+        )
+        self.assertEqual(index.search(scripts=["Latn"], formats=["Page-XML"], start=1200, end=1400), expected)
+        self.assertEqual(index.search(licenses=["CC-BY 4.0"]), sorted(catalog))
+        self.assertEqual(index.search(languages=["grc"]), [])
+
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            with open("catalog.json", "w") as f:
+                json.dump({f"repo-{position:05}": record for position, record in enumerate(catalog.values())}, f)
+            result = runner.invoke(cli, ["search", "catalog.json", "--script", "Latn", "--format", "Page-XML",
+                                         "--start", "1200", "--end", "1400"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(sorted(line.split("\t")[0] for line in result.output.splitlines()), expected)
@@ -0,0 +1,98 @@
+from unittest import TestCase, mock
+from dataclasses import dataclass
+import datetime
+import os
+import shutil
+import tempfile
+
+from htruc import catalog
+from htruc.catalog import get_all_catalogs
+
+
+@dataclass
+class _Listed:
+    """ Repository as listed by the REST API """
+    name: str
+    full_name: str
+    pushed_at: datetime.datetime
+
+
+class TestManifest(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.records = os.path.join(self.directory.name, "records")
+        os.makedirs(self.records)
+        for file in ("cremma-medieval.yml", "example.yaml"):
+            shutil.copy(os.path.join("tests/test_data", file), self.records)
+        self.manifest = os.path.join(self.directory.name, "manifest.json")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def build(self):
+        processed = []
+        clean = catalog._clean_a_dict
+
+        def record_and_clean(records, **kwargs):
+            processed.extend(records)
+            return clean(records, **kwargs)
+
+        with mock.patch.object(catalog, "_clean_a_dict", record_and_clean):
+            out = get_all_catalogs(local_directory=self.records, get_distant=False, manifest=self.manifest)
+        return out, processed
+
+    def test_incremental_build(self):
+        """[Manifest] Tests that only changed sources are processed again"""
+        first, processed = self.build()
+        self.assertEqual(list(first), ["https://github.com/HTR-United/cremma-medieval"])
+        self.assertEqual(len(processed), 2)
+
+        second, processed = self.build()
+        self.assertEqual(second, first)
+        self.assertEqual(processed, [])
+
+        with open(os.path.join(self.records, "cremma-medieval.yml"), "a") as f:
+            f.write("\nproject-name: 'CREMMA'\n")
+        third, processed = self.build()
+        self.assertEqual(processed, ["https://github.com/HTR-United/cremma-medieval"])
+        self.assertEqual(third["https://github.com/HTR-United/cremma-medieval"]["project-name"], "CREMMA")
+
+        os.remove(os.path.join(self.records, "cremma-medieval.yml"))
+        fourth, processed = self.build()
+        self.assertEqual(fourth, {})
+        self.assertEqual(processed, [])
+
+    def test_remote_without_catalog(self):
+        """[Manifest] Tests that unchanged repositories without htr-united.yml are not fetched again, unlike the ones
+        which failed"""
+        pushed_at = datetime.datetime(2023, 1, 1)
+        listed = [_Listed(name, f"orga-a/{name}", pushed_at) for name in ("record", "without", "failing")]
+        fetched = []
+
+        def listing(main_organization, **kwargs):
+            return listed
+
+        def fetching(repos, missing=None, **kwargs):
+            for repo in repos:
+                fetched.append(repo.full_name)
+                if repo.name == "record":
+                    yield repo.full_name, {"url": f"https://github.com/{repo.full_name}"}
+                elif repo.name == "without":
+                    missing.add(repo.full_name)
+
+        def build():
+            fetched.clear()
+            with mock.patch.object(catalog, "list_htr_united_repos", listing), \
+                    mock.patch.object(catalog, "iter_htr_united_repos", fetching):
+                return get_all_catalogs(organizations="orga-a", keep_valid_only=False, manifest=self.manifest)
+
+        first = build()
+        self.assertEqual(first, {"orga-a/record": {"url": "https://github.com/orga-a/record"}})
+        self.assertEqual(fetched, ["orga-a/record", "orga-a/without", "orga-a/failing"])
+
+        self.assertEqual(build(), first)
+        self.assertEqual(fetched, ["orga-a/failing"])
+
+        listed[1] = _Listed("without", "orga-a/without", datetime.datetime(2023, 2, 1))
+        self.assertEqual(build(), first)
+        self.assertEqual(fetched, ["orga-a/without", "orga-a/failing"])
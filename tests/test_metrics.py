@@ -0,0 +1,29 @@
+from unittest import TestCase
+from click.testing import CliRunner
+import json
+import os
+import shutil
+
+from htruc.cli import cli
+
+
+class TestMetrics(TestCase):
+    def test_make_report(self):
+        """[Metrics] Tests that make --metrics-out reports the stages and the rejected records"""
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            os.makedirs("catalog")
+            shutil.copy(os.path.join(os.path.dirname(__file__), "test_data", "cremma-medieval.yml"), "catalog/")
+            with open("catalog/invalid.yml", "w") as f:
+                f.write("schema: https://htr-united.github.io/schema/2021-10-15/schema.json\n"
+                        "url: https://github.com/htr-united/invalid\n")
+            result = runner.invoke(cli, ["make", "catalog", "--no-remote", "--no-citation", "--no-auto-upgrade",
+                                         "--json", "catalog.json", "--metrics-out", "report.json"])
+            self.assertEqual(result.exit_code, 0, result.output)
+            with open("report.json") as f:
+                report = json.load(f)
+        self.assertEqual(set(report["stages"]), {"local", "validation", "yaml", "json"})
+        self.assertEqual(report["counters"], {"records.local": 2, "records.processed": 2, "records.reused": 0,
+                                              "records.rejected": 1})
+        self.assertEqual(report["hosts"], {})
+        self.assertGreater(report["peak_memory"], 0)
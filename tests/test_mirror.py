@@ -0,0 +1,93 @@
+from unittest import TestCase
+from dataclasses import dataclass
+from typing import Optional
+import datetime
+import os
+import subprocess
+import tempfile
+
+from htruc.metrics import BuildMetrics
+from htruc.repos import get_htr_united_repos, get_github_repo_cff, mirror_repository
+
+
+@dataclass
+class _Listed:
+    """ Repository as listed by the REST API, pointing to a local bare repository """
+    name: str
+    full_name: str
+    clone_url: str
+    pushed_at: Optional[datetime.datetime] = None
+
+
+def _git(*args, cwd=None):
+    subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd, check=True, capture_output=True
+    )
+
+
+class TestGitMirror(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.mirrors = os.path.join(self.directory.name, "mirrors")
+        with open("tests/test_data/cremma-medieval.yml") as f:
+            self.catalog = f.read()
+        self.listed = [
+            self._origin("cremma-medieval", {"htr-united.yml": self.catalog, "Citation.cff": "cff-version: 1.2.0\n"}),
+            self._origin("no-catalog", {"README.md": "Nothing here\n"}),
+        ]
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _origin(self, name: str, files) -> _Listed:
+        """ Creates a bare repository with a commit of files """
+        origin = os.path.join(self.directory.name, "origins", f"{name}.git")
+        work = os.path.join(self.directory.name, "work", name)
+        _git("init", "--quiet", "--bare", "--initial-branch=main", origin)
+        _git("clone", "--quiet", origin, work)
+        self._commit(work, files)
+        return _Listed(name, f"htr-united/{name}", f"file://{origin}")
+
+    def _commit(self, work: str, files):
+        for filename, content in files.items():
+            with open(os.path.join(work, filename), "w") as f:
+                f.write(content)
+        _git("add", ".", cwd=work)
+        _git("commit", "--quiet", "-m", "Update", cwd=work)
+        _git("push", "--quiet", "origin", "main", cwd=work)
+
+    def test_fetch(self):
+        """[Mirror] Tests that the git backend reads the catalog and citation files from mirrors it keeps up to date"""
+        metrics, citations = BuildMetrics(), {}
+        fetched = get_htr_united_repos(repos=self.listed, backend="git", mirror_directory=self.mirrors,
+                                       citations=citations, metrics=metrics, jobs=2)
+        self.assertEqual(list(fetched), ["htr-united/cremma-medieval"])
+        self.assertEqual(fetched["htr-united/cremma-medieval"]["title"], "Cremma Medieval")
+        self.assertEqual(citations, {
+            "htr-united/cremma-medieval": "cff-version: 1.2.0\n", "htr-united/no-catalog": None
+        })
+        self.assertEqual(
+            get_github_repo_cff("https://github.com/htr-united/cremma-medieval.git", prefetched=citations),
+            "cff-version: 1.2.0\n"
+        )
+        self.assertEqual(sorted(os.listdir(self.mirrors)),
+                         ["htr-united_cremma-medieval.git", "htr-united_no-catalog.git"])
+        self.assertEqual(metrics.counters["mirrors.cloned"], 2)
+
+        # A new commit is retrieved by a fetch of the existing mirror
+        self._commit(os.path.join(self.directory.name, "work", "cremma-medieval"),
+                     {"htr-united.yml": self.catalog.replace("Cremma Medieval", "Cremma Medieval 2")})
+        fetched = get_htr_united_repos(repos=self.listed[:1], backend="git", mirror_directory=self.mirrors,
+                                       metrics=metrics)
+        self.assertEqual(fetched["htr-united/cremma-medieval"]["title"], "Cremma Medieval 2")
+        self.assertEqual(metrics.counters["mirrors.cloned"], 2)
+        self.assertEqual(metrics.counters["mirrors.fetched"], 1)
+
+    def test_unreachable(self):
+        """[Mirror] Tests that a repository which cannot be cloned is skipped"""
+        missing = _Listed("missing", "htr-united/missing", f"file://{self.directory.name}/origins/missing.git")
+        self.assertIsNone(mirror_repository(missing, self.mirrors))
+        self.assertFalse(os.path.exists(os.path.join(self.mirrors, "htr-united_missing.git")))
+        fetched = get_htr_united_repos(repos=[missing, self.listed[0]], backend="git", mirror_directory=self.mirrors)
+        self.assertEqual(list(fetched), ["htr-united/cremma-medieval"])
@@ -0,0 +1,76 @@
+from unittest import TestCase
+import threading
+import time
+
+from htruc.pipeline import Pipeline, Stage
+
+
+class TestPipeline(TestCase):
+    def test_stages_overlap(self):
+        """[Pipeline] Tests that records go to the next stage without waiting for the whole source"""
+        def slow(item):
+            time.sleep(0.05)
+            return item
+
+        start = time.monotonic()
+        out = list(Pipeline(Stage("first", slow), Stage("second", slow)).run(
+            (str(i), {"value": i}) for i in range(6)
+        ))
+        # Sequential passes would take 12 * 0.05s, overlapping stages 7 * 0.05s
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(sorted(key for key, _ in out), [str(i) for i in range(6)])
+
+    def test_depth(self):
+        """[Pipeline] Tests that the source is consumed as the stages make room for new records"""
+        read, done = [0], threading.Event()
+
+        def source():
+            for i in range(100):
+                read[0] += 1
+                yield str(i), {}
+
+        def blocked(item):
+            done.wait()
+            return item
+
+        out = []
+        consumer = threading.Thread(
+            target=lambda: out.extend(Pipeline(Stage("blocked", blocked, workers=2), depth=4).run(source()))
+        )
+        consumer.start()
+        time.sleep(0.2)
+        # 4 records in the stage, 4 in its queue, one held by its dispatcher and one by the feeder
+        self.assertLessEqual(read[0], 10)
+        done.set()
+        consumer.join()
+        self.assertEqual(len(out), 100)
+
+    def test_errors(self):
+        """[Pipeline] Tests that an exception in a stage stops the pipeline and is raised to the consumer"""
+        def fail(item):
+            if item[0] == "3":
+                raise ValueError("Broken record")
+            return item
+
+        with self.assertRaises(ValueError):
+            list(Pipeline(Stage("fail", fail)).run((str(i), {}) for i in range(1000)))
+
+    def test_dispatch_errors(self):
+        """[Pipeline] Tests that an exception raised while dispatching records to lanes is raised to the consumer"""
+        with self.assertRaises(KeyError):
+            list(Pipeline(Stage("lane", lambda item: item, lane=lambda item: item[1]["lane"])).run([("a", {})]))
+        with self.assertRaises(ZeroDivisionError):
+            list(Pipeline(Stage("workers", lambda item: item, workers=lambda lane: 1 // 0)).run([("a", {})]))
+
+    def test_batch(self):
+        """[Pipeline] Tests that a batch stage gets lists of the waiting records and keeps the ones it returns"""
+        batches = []
+
+        def even(items):
+            batches.append(len(items))
+            return [item for item in items if item[1]["value"] % 2 == 0]
+
+        out = list(Pipeline(Stage("even", even, batch=8), depth=16).run((str(i), {"value": i}) for i in range(50)))
+        self.assertEqual(sorted(int(key) for key, _ in out), list(range(0, 50, 2)))
+        self.assertEqual(sum(batches), 50)
+        self.assertLessEqual(max(batches), 8)
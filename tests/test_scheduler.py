@@ -0,0 +1,116 @@
+from unittest import TestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+from htruc.repos import RateLimitScheduler, get_github_repo_yaml, list_htr_united_repos
+
+
+class _FakeGithub(BaseHTTPRequestHandler):
+    """ Fake Github API: the `exhausted` token is always rate limited, the `once` token is rate limited on its first
+    request only, the `flaky` token gets a server error on its first request and the `forbidden` token is always
+    refused without being rate limited """
+    requests_seen = []
+
+    def _send(self, status, body, remaining):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("X-RateLimit-Limit", "5000")
+        self.send_header("X-RateLimit-Remaining", str(remaining))
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        if status == 403 and remaining == 0:
+            self.send_header("Retry-After", "0.2")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        token = self.headers.get("Authorization", "").split()[-1]
+        self.requests_seen.append((token, self.path))
+        if token == "exhausted" or (token == "once" and len(self.requests_seen) == 1):
+            return self._send(403, json.dumps({"message": "API rate limit exceeded for user"}), 0)
+        if token == "flaky" and len(self.requests_seen) == 1:
+            return self._send(502, "Bad gateway", 4999)
+        if token == "forbidden":
+            return self._send(403, json.dumps({"message": "Resource not accessible"}), 4999)
+        if self.path.startswith("/orgs/htr-united/repos"):
+            return self._send(200, json.dumps([
+                {"name": name, "full_name": f"htr-united/{name}", "clone_url": f"https://github.com/htr-united/{name}"}
+                for name in ("cremma-medieval", "htr-united")
+            ]), 4998)
+        if self.path.startswith("/orgs/htr-united"):
+            return self._send(200, json.dumps({"login": "htr-united", "url": f"{self.server.url}/orgs/htr-united",
+                                               "repos_url": f"{self.server.url}/orgs/htr-united/repos"}), 4999)
+        with open("tests/test_data/cremma-medieval.yml") as f:
+            return self._send(200, f.read(), 4999)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestScheduler(TestCase):
+    def setUp(self) -> None:
+        _FakeGithub.requests_seen = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeGithub)
+        self.server.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def scheduler(self, *tokens, **kwargs) -> RateLimitScheduler:
+        return RateLimitScheduler(tokens, base_url=self.server.url, **kwargs)
+
+    def test_rotation(self):
+        """[Scheduler] Tests that a rate limited token is set aside for another one"""
+        scheduler = self.scheduler("exhausted", "fresh")
+        record = get_github_repo_yaml("https://github.com/htr-united/cremma-medieval", client=scheduler)
+        self.assertEqual(record["title"], "Cremma Medieval")
+        self.assertEqual(scheduler.waited, 0)
+        self.assertEqual(scheduler.clients[1].requester.rate_limiting, (4999, 5000))
+
+        # The exhausted token is not tried again before its reset
+        get_github_repo_yaml("https://github.com/htr-united/cremma-medieval", client=scheduler)
+        self.assertEqual([token for token, _ in _FakeGithub.requests_seen], ["exhausted", "fresh", "fresh"])
+
+    def test_backoff(self):
+        """[Scheduler] Tests that a rate limited request is retried after the reset instead of being dropped"""
+        scheduler = self.scheduler("once")
+        record = get_github_repo_yaml("https://github.com/htr-united/cremma-medieval", client=scheduler)
+        self.assertEqual(record["title"], "Cremma Medieval")
+        self.assertGreater(scheduler.waited, 0)
+        self.assertEqual(len(_FakeGithub.requests_seen), 2)
+
+    def test_listing(self):
+        """[Scheduler] Tests that organization listings go through the scheduler"""
+        repos = list_htr_united_repos(main_organization="htr-united", exclude=["htr-united"],
+                                      client=self.scheduler("once"))
+        self.assertEqual([repo.full_name for repo in repos], ["htr-united/cremma-medieval"])
+
+    def test_server_error(self):
+        """[Scheduler] Tests that a server error is retried after a backoff"""
+        delays = []
+        scheduler = self.scheduler("flaky", sleep=delays.append)
+        record = get_github_repo_yaml("https://github.com/htr-united/cremma-medieval", client=scheduler)
+        self.assertEqual(record["title"], "Cremma Medieval")
+        self.assertEqual(delays, [1])
+        self.assertEqual(len(_FakeGithub.requests_seen), 2)
+
+    def test_refused(self):
+        """[Scheduler] Tests that a refused request is logged with its status instead of passing for a missing file"""
+        with self.assertLogs("htruc.repos._github", level="WARNING") as logs:
+            record = get_github_repo_yaml("https://github.com/htr-united/cremma-medieval",
+                                          client=self.scheduler("forbidden"))
+        self.assertIsNone(record)
+        self.assertIn("status 403", logs.output[0])
+
+    def test_retries_exceeded(self):
+        """[Scheduler] Tests that a repository still rate limited after every retry is logged and skipped"""
+        with self.assertLogs("htruc.repos._github", level="WARNING") as logs:
+            record = get_github_repo_yaml("https://github.com/htr-united/cremma-medieval",
+                                          client=self.scheduler("exhausted", max_retries=2))
+        self.assertIsNone(record)
+        self.assertIn("htr-united/cremma-medieval", logs.output[-1])
+        self.assertEqual(len(_FakeGithub.requests_seen), 2)
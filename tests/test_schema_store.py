@@ -0,0 +1,125 @@
+from unittest import TestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import tempfile
+import threading
+import os
+
+from click.testing import CliRunner
+
+from htruc.cli import cli
+from htruc import validator
+from htruc.schemas import store, UpgradeOrder, UpgradeFunction
+from htruc.utils import parse_yaml
+
+
+# A version which is neither bundled nor stored
+Unreleased = "https://htr-united.github.io/schema/2030-01-01/schema.json"
+
+
+class _SchemaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # Every version is served the bundled schema
+        with open(os.path.join(store.Bundled, "2021-10-15.json"), "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSchemaStore(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.environ = mock.patch.dict(os.environ, {"HTRUC_SCHEMA_DIR": self.directory.name})
+        self.environ.start()
+        os.environ.pop("HTRUC_OFFLINE", None)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _SchemaHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = mock.patch.object(
+            store, "SchemaURL", f"http://127.0.0.1:{self.server.server_port}/schema/{{version}}/schema.json"
+        )
+        self.url.start()
+
+    def tearDown(self) -> None:
+        self.url.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        self.environ.stop()
+        self.directory.cleanup()
+
+    def test_offline(self):
+        """[SchemaStore] Tests that offline mode uses bundled schemas and fails on the other ones without download"""
+        self.assertEqual(
+            store.schema_path("2021-10-15", offline=True), os.path.join(store.Bundled, "2021-10-15.json")
+        )
+        with self.assertRaises(store.SchemaUnavailable):
+            store.schema_path(Unreleased, offline=True)
+        os.environ["HTRUC_OFFLINE"] = "1"
+        # Every supported version is bundled
+        self.assertEqual(store.warm(), {
+            version: os.path.join(store.Bundled, f"{version}.json")
+            for version in ("2021-10-15", "2022-04-15", "2023-06-27")
+        })
+        self.assertEqual(store.warm([Unreleased]), {"2030-01-01": None})
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_bundled(self):
+        """[SchemaStore] Tests that records upgraded to each bundled version are valid against it"""
+        record = parse_yaml("tests/test_data/cremma-medieval.yml")
+        for previous, version in zip((None, *UpgradeOrder), UpgradeOrder):
+            if previous:
+                record = UpgradeFunction[previous](record, verbose=False)
+            self.assertEqual(record["schema"], version)
+            self.assertTrue(store.schema_path(version, offline=True).startswith(store.Bundled))
+            self.assertEqual(list(validator.get_validator_for_uri(version, offline=True).iter_errors(record)), [])
+
+    def test_warm(self):
+        """[SchemaStore] Tests that warm downloads the missing schemas into the user store for offline use"""
+        self.assertTrue(all(path.startswith(store.Bundled) for path in store.warm().values()))
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+        paths = store.warm([Unreleased])
+        self.assertEqual(os.listdir(self.directory.name), ["2030-01-01.json"])
+        self.assertEqual(store.schema_path("2030-01-01", offline=True), paths["2030-01-01"])
+        self.assertEqual(store.load_schema(paths["2030-01-01"])["title"], "GroundTruthRepository")
+
+        # A forced download goes to the store and is then preferred to the bundled schema
+        bundled = validator.get_validator_for_uri(UpgradeOrder[0])
+        forced = store.schema_path("2021-10-15", force_download=True)
+        self.assertEqual(forced, os.path.join(self.directory.name, "2021-10-15.json"))
+        self.assertEqual(store.schema_path("2021-10-15", offline=True), forced)
+        # Validators compiled before the download are not used anymore
+        self.assertIsNot(validator.get_validator_for_uri(UpgradeOrder[0]), bundled)
+        self.assertIs(validator.get_validator(forced), validator.get_validator_for_uri(UpgradeOrder[0]))
+
+    def test_cli(self):
+        """[SchemaStore] Tests that `htruc --offline` fails fast on a missing schema, and succeeds once warmed"""
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            with open("record.yml", "w") as f:
+                f.write(f"schema: {Unreleased}\ntitle: Test\n")
+            result = runner.invoke(cli, ["--offline", "test", "record.yml"])
+            self.assertNotEqual(result.exit_code, 0)
+            self.assertIn("Schema 2030-01-01 is not available offline", result.output)
+
+            os.makedirs("catalog")
+            os.rename("record.yml", "catalog/record.yml")
+            result = runner.invoke(cli, ["--offline", "make", "catalog", "--no-remote", "--no-citation"])
+            self.assertIsInstance(result.exception, store.SchemaUnavailable)
+            os.rename("catalog/record.yml", "record.yml")
+
+            result = runner.invoke(cli, ["--offline", "schemas", "warm"])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertIn(os.path.join(store.Bundled, "2023-06-27.json"), result.output)
+
+            # --offline does not leak into the following runs
+            self.assertNotIn("HTRUC_OFFLINE", os.environ)
+            store.warm([Unreleased])
+
+            # The record is invalid, but it is tested
+            result = runner.invoke(cli, ["--offline", "test", "record.yml"])
+            self.assertIn("☒ File `record.yml` testing failed", result.output)
@@ -0,0 +1,77 @@
+from unittest import TestCase
+from typing import List, Tuple
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+# Cumulated import time allowed for the CLI commands used in pre-commit hooks, as a multiple of the import time of
+#   click alone measured on the same machine: an absolute budget would fail on loaded machines. Loading PyGithub or
+#   pandas on top of what validation needs goes over it.
+ImportBudget = 4
+# Each measure is the best of a few runs, which leaves out most of the noise of the machine
+Runs = 3
+# Modules which only `make` and its statistics need
+HeavyModules = ("pandas", "numpy", "github", "cffconvert", "requests", "matplotlib")
+
+_Runner = """
+import json
+import sys
+from htruc.cli import cli
+try:
+    cli(sys.argv[1:])
+except SystemExit:
+    pass
+print(json.dumps(sorted(module for module in {heavy} if module in sys.modules)))
+"""
+
+
+def _run(code: str, *args: str) -> Tuple[str, float]:
+    """ Runs code in a new interpreter, returns its output and its cumulated import time """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code, *args],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    import_time = 0
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:"):
+            _, cumulative, name = line.split("|")
+            # Top level imports only, nested ones are part of their cumulated time
+            if cumulative.strip().isdigit() and not name.startswith("  "):
+                import_time += int(cumulative) / 1e6
+    return process.stdout, import_time
+
+
+def _run_command(*args: str) -> Tuple[List[str], float]:
+    """ Runs the CLI in new interpreters, returns the heavy modules it loaded and its best cumulated import time """
+    runs = [_run(_Runner.format(heavy=HeavyModules), *args) for _ in range(Runs)]
+    return json.loads(runs[0][0].splitlines()[-1]), min(import_time for _, import_time in runs)
+
+
+class TestStartup(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.budget = ImportBudget * min(_run("import click")[1] for _ in range(Runs))
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_test_command(self):
+        """[Startup] Tests that `htruc test` only loads what validation needs, within the import budget"""
+        modules, import_time = _run_command("test", "tests/test_data/cremma-medieval.yml")
+        self.assertEqual(modules, [])
+        self.assertLess(import_time, self.budget)
+
+    def test_upgrade_command(self):
+        """[Startup] Tests that `htruc upgrade` only loads what upgrading needs, within the import budget"""
+        path = os.path.join(self.directory.name, "record.yml")
+        shutil.copy("tests/test_data/cremma-medieval.yml", path)
+        modules, import_time = _run_command("upgrade", path)
+        self.assertEqual(modules, [])
+        self.assertLess(import_time, self.budget)
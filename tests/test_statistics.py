@@ -0,0 +1,48 @@
+from unittest import TestCase
+import copy
+
+from pandas.api.types import is_integer_dtype, is_string_dtype, is_object_dtype, CategoricalDtype
+
+from htruc.catalog import get_statistics, group_per_year
+from htruc.utils import parse_yaml
+
+
+class TestStatistics(TestCase):
+    def setUp(self) -> None:
+        record = parse_yaml("tests/test_data/cremma-medieval.yml")
+        other = copy.deepcopy(record)
+        other["title"] = "Other"
+        self.catalog = {
+            record["url"]: record,
+            "other": other,
+            "no-time": {"title": "No time", "volume": [{"metric": "lines", "count": 1}]},
+            "no-format": {"title": "No format", "time": {"notBefore": "1200", "notAfter": "1300"},
+                          "script-type": "only-typed", "volume": []}
+        }
+
+    def test_columns(self):
+        """[Statistics] Tests the types of the columns and the records which are skipped"""
+        df = get_statistics(self.catalog)
+        self.assertEqual(len(df), 6)
+        for column in ("uri", "title", "format", "script-type"):
+            self.assertTrue(is_string_dtype(df[column]) or is_object_dtype(df[column]), column)
+        self.assertIsInstance(df["metric"].dtype, CategoricalDtype)
+        for column in ("start", "end", "count"):
+            self.assertTrue(is_integer_dtype(df[column]), column)
+        self.assertEqual(df["count"].tolist()[:3], [18385, 1795, 481735])
+        self.assertEqual(df.attrs["skipped"], [
+            {"uri": "no-time", "error": "KeyError('time')"},
+            {"uri": "no-format", "error": "KeyError('format')"}
+        ])
+
+    def test_sum(self):
+        """[Statistics] Tests that statistics can be summed per metric, as documented"""
+        summed = get_statistics(self.catalog).groupby(by="metric").sum()
+        self.assertEqual(summed.loc["lines", "count"], 2 * 18385)
+        self.assertEqual(group_per_year(get_statistics(self.catalog))["lines"].max(), 2 * 18385)
+
+    def test_malformed(self):
+        """[Statistics] Tests that values which are not numbers are not silently skipped"""
+        self.catalog["other"]["time"]["notBefore"] = "12th century"
+        with self.assertRaises(ValueError):
+            get_statistics(self.catalog)
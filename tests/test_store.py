@@ -0,0 +1,43 @@
+from unittest import TestCase
+from click.testing import CliRunner
+import os
+import tempfile
+
+from htruc.cli import cli
+from htruc.schemas import recursive_update
+from htruc.store import write_sqlite_catalog, query_catalog
+from htruc.utils import parse_yaml
+
+
+class TestStore(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "catalog.sqlite")
+        medieval, _ = recursive_update(parse_yaml("tests/test_data/cremma-medieval.yml"))
+        typed = parse_yaml("tests/test_data/example.yaml")
+        typed["time"] = {"notBefore": 1900, "notAfter": 1950}
+        self.catalog = {medieval["url"]: medieval, typed["url"]: typed}
+        write_sqlite_catalog(self.catalog.items(), self.path)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def keys(self, **filters):
+        return [key for key, _ in query_catalog(self.path, **filters)]
+
+    def test_filters(self):
+        """[Store] Tests that filters are combined and match any of their values"""
+        medieval, typed = "https://github.com/HTR-United/cremma-medieval", "https://github.com/HTR-United/dahncorpus"
+        self.assertEqual(self.keys(), [medieval, typed])
+        self.assertEqual(self.keys(scripts=["Latn"], start=1300, end=1500), [medieval])
+        self.assertEqual(self.keys(languages=["fra", "fro"], formats=["ALTO"]), [typed])
+        self.assertEqual(self.keys(start=1401), [typed])
+        self.assertEqual(self.keys(scripts=["Grek"]), [])
+        self.assertEqual(dict(query_catalog(self.path, urls=[medieval]))[medieval]["volume"],
+                         self.catalog[medieval]["volume"])
+
+    def test_cli(self):
+        """[Store] Tests that htruc query prints the matching records"""
+        result = CliRunner().invoke(cli, ["query", self.path, "--language", "fro", "--end", "1300"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, "https://github.com/HTR-United/cremma-medieval\tCremma Medieval\n")
@@ -0,0 +1,25 @@
+from unittest import TestCase
+
+from htruc.utils import get_local_or_download
+from htruc.validator import run
+from htruc.schemas import recursive_update
+from benchmarks.synthetic import generate_records, generate_catalog
+
+
+class TestSynthetic(TestCase):
+    def test_validity(self):
+        """[Synthetic] Tests that generated records are valid unless asked otherwise"""
+        schema = get_local_or_download("2021-10-15")
+        self.assertTrue(all(status.status for status in run(generate_records(50), schema_path=schema)))
+        self.assertFalse(any(status.status for status in run(generate_records(20, invalid_ratio=1.),
+                                                             schema_path=schema)))
+
+    def test_schemas(self):
+        """[Synthetic] Tests that records of older schemas upgrade to the records of the newer ones"""
+        self.assertEqual(
+            [recursive_update(record)[0] for record in generate_records(10, schema="2022-04-15", seed=3)],
+            generate_records(10, schema="2023-06-27", seed=3)
+        )
+        catalog = generate_catalog(10)
+        self.assertEqual(len(catalog), 10)
+        self.assertEqual(generate_catalog(10), catalog)
@@ -0,0 +1,58 @@
+from unittest import TestCase, mock
+import threading
+import time
+
+from htruc import catalog
+from htruc.pipeline import Pipeline
+from htruc.throttle import HostThrottle
+
+
+class TestThrottle(TestCase):
+    def test_concurrency_and_delay(self):
+        """[Throttle] Tests that per host concurrency and delays are enforced"""
+        throttle = HostThrottle({"doi.org": (2, 0.05)})
+        running, peak, starts = [0], [0], []
+        lock = threading.Lock()
+
+        def request():
+            with throttle("https://doi.org/10.1/abc"):
+                with lock:
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+                    starts.append(time.monotonic())
+                time.sleep(0.02)
+                with lock:
+                    running[0] -= 1
+
+        threads = [threading.Thread(target=request) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(peak[0], 2)
+        starts = sorted(starts)
+        self.assertTrue(all(b - a >= 0.045 for a, b in zip(starts, starts[1:])))
+
+    def test_slow_host_does_not_block_others(self):
+        """[Throttle] Tests that citation lookups of a slow host do not hold up the others"""
+        records = {f"doi-{i}": {"url": f"https://doi.org/10.1/{i}"} for i in range(4)}
+        records.update({f"gh-{i}": {"url": f"https://github.com/htr-united/{i}"} for i in range(4)})
+        done = {}
+
+        def lookup(record, **kwargs):
+            if "doi.org" in record["url"]:
+                time.sleep(0.3)
+            done[record["url"]] = time.monotonic()
+            return {"_bibtex": record["url"]}
+
+        stages = catalog.catalog_stages(
+            keep_valid_only=False, citation_cff=True, throttle=HostThrottle({"doi.org": (1, 0)})
+        )
+        start = time.monotonic()
+        with mock.patch.object(catalog, "_get_bibtex_and_apa", lookup):
+            out = dict(Pipeline(*stages).run(records.items()))
+        self.assertEqual(set(out), set(records))
+        self.assertTrue(all(out[key]["_bibtex"] == out[key]["url"] for key in out))
+        self.assertTrue(all(
+            done[url] - start < 0.25 for url in done if "github.com" in url
+        ))
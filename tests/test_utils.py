@@ -0,0 +1,33 @@
+from unittest import TestCase
+import io
+
+from ruamel.yaml.comments import CommentedMap
+
+from htruc.utils import parse_yaml, threaded_map
+from htruc.writers import write_yaml_catalog
+from benchmarks.synthetic import generate_records
+
+
+class TestParseYAML(TestCase):
+    def test_modes(self):
+        """[ParseYAML] Tests that the safe and round-trip modes parse the same data, as plain or commented types"""
+        with open("tests/test_data/cremma-medieval.yml") as f:
+            content = f.read()
+        safe, round_trip = parse_yaml(content), parse_yaml(content, round_trip=True)
+        self.assertEqual(safe, round_trip)
+        self.assertIs(type(safe), dict)
+        self.assertIs(type(safe["volume"]), list)
+        self.assertIsInstance(round_trip, CommentedMap)
+
+    def test_threads(self):
+        """[ParseYAML] Tests that loaders reused by concurrent threads parse each document correctly"""
+        records = generate_records(200, schema="2023-06-27", seed=3)
+        texts = []
+        for record in records:
+            dumped = io.StringIO()
+            write_yaml_catalog([record], dumped)
+            texts.append(dumped.getvalue())
+        for round_trip in (False, True):
+            parsed = list(threaded_map(lambda text: parse_yaml(text, round_trip=round_trip)[0], texts, jobs=8))
+            self.assertEqual([record["url"] for record in parsed], [record["url"] for record in records])
+            self.assertEqual(parsed, records)
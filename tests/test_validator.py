@@ -0,0 +1,37 @@
+from unittest import TestCase, mock
+
+from htruc import validator
+from htruc.utils import parse_yaml
+
+
+class TestValidator(TestCase):
+    def setUp(self) -> None:
+        validator.get_validator.cache_clear()
+        validator.get_validator_for_uri.cache_clear()
+        with open("tests/test_data/cremma-medieval.yml") as f:
+            self.record = parse_yaml(f)
+
+    def tearDown(self) -> None:
+        validator.get_validator.cache_clear()
+        validator.get_validator_for_uri.cache_clear()
+
+    def validate(self, schema_path: str, offline: bool = None):
+        """ Validates 50 records, returns their statuses and the number of schemas compiled """
+        with mock.patch.object(validator, "Draft7Validator", wraps=validator.Draft7Validator) as compile_schema:
+            statuses = list(validator.run([dict(self.record) for _ in range(50)], schema_path=schema_path,
+                                          offline=offline))
+        return statuses, compile_schema.call_count
+
+    def test_compiled_once(self):
+        """[Validator] Tests that the schema is compiled once for all the records it validates"""
+        statuses, compiled = self.validate("./htruc/schemas/2021-10-15.json")
+        self.assertEqual(len(statuses), 50)
+        self.assertTrue(all(status.status for status in statuses))
+        self.assertEqual(compiled, 1)
+
+    def test_compiled_once_per_uri(self):
+        """[Validator] Tests that the schema records refer to is compiled once for all of them"""
+        statuses, compiled = self.validate("auto", offline=True)
+        self.assertEqual(len(statuses), 50)
+        self.assertTrue(all(status.status for status in statuses))
+        self.assertEqual(compiled, 1)
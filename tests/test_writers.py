@@ -0,0 +1,40 @@
+from unittest import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from htruc.utils import parse_yaml, dump_yaml
+from htruc.writers import open_output, write_yaml_catalog, write_json_catalog
+
+
+class TestWriters(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def records(self):
+        return [parse_yaml("tests/test_data/cremma-medieval.yml"), parse_yaml("tests/test_data/example.yaml")]
+
+    def test_yaml_same_as_full_dump(self):
+        """[Writers] Tests that streaming records gives the same YAML as dumping the whole sorted list"""
+        expected, streamed = io.StringIO(), io.StringIO()
+        dump_yaml(self.records(), expected, sort_keys=False)
+        self.assertEqual(write_yaml_catalog(iter(self.records()), streamed), 2)
+        self.assertEqual(streamed.getvalue(), expected.getvalue())
+
+        empty = io.StringIO()
+        write_yaml_catalog([], empty)
+        self.assertEqual(empty.getvalue(), "[]\n")
+
+    def test_json_gzip(self):
+        """[Writers] Tests that the JSON catalog is valid, identical to json.dump and compressed for .gz paths"""
+        catalog = {f"repo-{index:05}": record for index, record in enumerate(self.records())}
+        path = os.path.join(self.directory.name, "catalog.json.gz")
+        with open_output(path) as f:
+            write_json_catalog(catalog.items(), f)
+        with gzip.open(path, "rt") as f:
+            self.assertEqual(f.read(), json.dumps(catalog))